@@ -0,0 +1,116 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from feeds.cache import FEED_GENERATION_KEY, USER_FEEDS_KEY, USER_GENERATION_KEY, get_generations
+from feeds.models import Source
+
+
+def get_user_generations(user_id) -> list:
+    """
+    generations of everything the user can see: generation of the user and generations of all feeds they subscribe to.
+    Feed ids of the user are cached too, under the user generation, so generations are read without the database.
+
+    @param user_id: id of the user
+    @return: list of generations, the user generation first
+    """
+    user_key = USER_GENERATION_KEY.format(user_id)
+    user_generation = get_generations([user_key])[user_key]
+    feeds_key = USER_FEEDS_KEY.format(user_id, user_generation)
+    feed_ids = cache.get(feeds_key)
+    if feed_ids is None:
+        feed_ids = sorted(Source.objects.filter(user_id=user_id).values_list("feed_id", flat=True))
+        cache.set(feeds_key, feed_ids, timeout=settings.API_RESPONSE_CACHE_TIMEOUT)
+    feed_keys = [FEED_GENERATION_KEY.format(feed_id) for feed_id in feed_ids]
+    feed_generations = get_generations(feed_keys) if feed_keys else {}
+    return [user_generation, *map(feed_generations.get, feed_keys)]
+
+
+class ConditionalResponseMixin(object):
+    """
+    answers conditional requests with 304 Not Modified, before the response body is built.
+    Validators are computed by the view from data it already has, e.g. generations or updated_at.
+    """
+
+    def conditional_response(self, request, etag, last_modified, get_response):
+        """
+        @param etag: strong entity tag of the response, unquoted
+        @param last_modified: timestamp of the last modification in seconds, or None
+        @param get_response: callable building the response, called only if the client does not have it already
+        @return: Response
+        """
+        etag = quote_etag(etag)
+        if self.is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = get_response()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        # responses are per user, clients revalidate them on every poll
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @staticmethod
+    def is_not_modified(request, etag, last_modified) -> bool:
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+        if if_none_match:
+            # If-Modified-Since is ignored when If-None-Match is present
+            return if_none_match.strip() == "*" or etag in parse_etags(if_none_match)
+        if_modified_since = parse_http_date_safe(request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+        return if_modified_since is not None and last_modified is not None and last_modified <= if_modified_since
+
+
+class CachedResponseMixin(ConditionalResponseMixin):
+    """
+    caches data of list and retrieve responses per user, in the shared cache, so repeated polls skip the database
+    between feed refreshes. Cache keys and ETags are derived from generations of the user, see get_user_generations,
+    so responses are invalidated by bumping generations instead of deleting keys,
+    and conditional requests are answered without building the response at all.
+    Responses of anonymous users are neither cached nor validated.
+    """
+
+    cache_key_prefix = "api:response"
+
+    def get_response_digest(self, request, generations) -> str:
+        version = ".".join(str(generation) for generation in generations)
+        # accepted format is part of the digest, so browsable API and JSON responses do not mix,
+        # and so is the host, which next links are built from
+        return hashlib.sha1(
+            f"{version}|{request.accepted_renderer.format}|{request.build_absolute_uri()}".encode("utf-8")
+        ).hexdigest()
+
+    def dispatch_cached(self, handler, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        generations = get_user_generations(request.user.id)
+        digest = self.get_response_digest(request, generations)
+        # generations are taken from the clock in nanoseconds
+        last_modified = max(generations) // 10**9
+        key = f"{self.cache_key_prefix}:{self.basename}:{request.user.id}:{digest}"
+
+        def get_response():
+            if not settings.API_RESPONSE_CACHE_TIMEOUT:
+                return handler(request, *args, **kwargs)
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+            response = handler(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data, timeout=settings.API_RESPONSE_CACHE_TIMEOUT)
+            return response
+
+        return self.conditional_response(request, digest, last_modified, get_response)
+
+    def list(self, request, *args, **kwargs):
+        return self.dispatch_cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.dispatch_cached(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+from django_filters import rest_framework as filters
+from rest_framework.filters import BaseFilterBackend
+
+from feeds.models import FeedEntry
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    filters by the search query parameter against stored search_vector of the model, backed by its GIN index.
+    Matches are annotated with search_rank, which pagination orders them by.
+    """
+
+    search_param = "search"
+    rank_field = "search_rank"
+
+    def get_search_query(self, request):
+        query = request.query_params.get(self.search_param, "").strip()
+        if query:
+            return SearchQuery(query, config=settings.FEEDS_SEARCH_CONFIG)
+        return None
+
+    def filter_queryset(self, request, queryset, view):
+        search_query = self.get_search_query(request)
+        if search_query is None:
+            return queryset
+        # rank is cast from real to double precision, so it survives the round trip through pagination cursor exactly
+        rank = Cast(SearchRank(F("search_vector"), search_query), FloatField())
+        return queryset.filter(search_vector=search_query).annotate(**{self.rank_field: rank})
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.search_param,
+                "required": False,
+                "in": "query",
+                "description": "Full text search in title, summary and author, results are ranked by relevance",
+                "schema": {"type": "string"},
+            }
+        ]
+
+
+class FeedEntryFilter(filters.FilterSet):
+    """
+    read state and source name belong to the subscription of the user, which the queryset is already joined with,
+    see FeedEntryViewSet.get_queryset, so they are not matched against subscriptions of other users.
+    """
+
+    read = filters.BooleanFilter(help_text="Has been read")
+    feed__source__name__icontains = filters.CharFilter(
+        method="filter_source_name", help_text="Name of your source contains"
+    )
+    published_after = filters.IsoDateTimeFilter(
+        field_name="published", lookup_expr="gte", help_text="Published at or after, ISO 8601"
+    )
+    published_before = filters.IsoDateTimeFilter(
+        field_name="published", lookup_expr="lt", help_text="Published before, ISO 8601"
+    )
+
+    class Meta:
+        model = FeedEntry
+        fields = ["feed"]
+
+    def filter_source_name(self, queryset, name, value):
+        user_id = self.request.user.id if self.request else None
+        return queryset.filter(feed__sources__user_id=user_id, feed__sources__name__icontains=value)
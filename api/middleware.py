@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+
+from feeds.profiling import profile, profile_sampled
+
+
+class ProfilingMiddleware(object):
+    """
+    profiles API requests, see feeds.profiling: a fraction of them set by API_PROFILE_FRACTION,
+    and single requests sent with the X-Profile header matching API_PROFILE_TOKEN.
+    Id of the profile is sent back in the X-Profile-Id header. Bodies of streaming responses, e.g. exports,
+    are produced after the profile is saved, so they are not covered by it.
+    """
+
+    path_prefix = "/api/"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith(self.path_prefix):
+            return self.get_response(request)
+        name = f"{request.method} {request.get_full_path()}"
+        if self.is_requested(request):
+            with profile("request", name) as run:
+                response = self.get_response(request)
+        else:
+            with profile_sampled(settings.API_PROFILE_FRACTION, "request", name) as run:
+                response = self.get_response(request)
+        if run is not None and run.id is not None:
+            response["X-Profile-Id"] = run.id
+        return response
+
+    @staticmethod
+    def is_requested(request) -> bool:
+        token = request.META.get("HTTP_X_PROFILE")
+        return bool(token and settings.API_PROFILE_TOKEN and constant_time_compare(token, settings.API_PROFILE_TOKEN))
@@ -0,0 +1,147 @@
+import base64
+import json
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from api.filters import FullTextSearchFilter
+
+
+class RawEntriesPagination(LimitOffsetPagination):
+    """
+    slices raw entries of a feed on the server, so only the requested page is serialized and sent.
+    """
+
+    default_limit = 50
+    max_limit = 500
+
+
+class KeysetPagination(BasePagination):
+    """
+    cursor pagination ordered by (ordering field, id), both descending.
+    The cursor holds values of the last row sent, next page starts right after it with a row value comparison,
+    which is an index range scan, so every page costs the same as the first one no matter how deep it is.
+    Unlike offset pagination, rows inserted meanwhile do not shift pages.
+
+    Rows with null ordering_field come first, as postgres sorts nulls first in descending order,
+    so a matching (..., ordering_field DESC, id DESC) index is used for both ordering and filtering.
+    Ordering fields are datetimes, except for numeric_ordering_fields, e.g. computed ranks.
+    """
+
+    ordering_field = None
+    numeric_ordering_fields = ()
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_ordering_field(self, queryset) -> str:
+        return self.ordering_field
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.current_ordering_field = self.get_ordering_field(queryset)
+        queryset = queryset.order_by(f"-{self.current_ordering_field}", "-id")
+        position = self.decode_cursor(request, self.current_ordering_field)
+        if position is not None:
+            queryset = self.filter_after(queryset, *position)
+
+        # one row more than needed, to know if there is a next page
+        page = list(queryset[: self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[: self.page_size]
+        return self.page
+
+    def filter_after(self, queryset, value, pk):
+        """
+        @param queryset: queryset ordered by ordering field and id
+        @param value: ordering field value of the last row sent
+        @param pk: id of the last row sent
+        @return: queryset of rows placed after the last row sent
+        """
+        field = self.current_ordering_field
+        if value is None:
+            return queryset.filter(Q(**{f"{field}__isnull": True}, id__lt=pk) | Q(**{f"{field}__isnull": False}))
+        if field in queryset.query.annotations:
+            # computed values, e.g. search rank, are not indexed anyway
+            return queryset.filter(Q(**{f"{field}__lt": value}) | Q(**{field: value}, id__lt=pk))
+        table = connection.ops.quote_name(queryset.model._meta.db_table)
+        column = connection.ops.quote_name(queryset.model._meta.get_field(field).column)
+        return queryset.extra(where=[f"({table}.{column}, {table}.id) < (%s, %s)"], params=[value, pk])
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, request, field):
+        """
+        @param field: current ordering field, the cursor value must be of its type,
+        e.g. a cursor of entries ordered by date is not valid for search results ordered by rank
+        @return: tuple of ordering_field value and id of the last row sent, None on the first page
+        @raise: NotFound if the cursor is not valid
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            if field in self.numeric_ordering_fields:
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    raise TypeError(encoded)
+            elif value is not None:
+                value = parse_datetime(value)
+                if value is None:
+                    raise ValueError(encoded)
+            return value, int(pk)
+        except (TypeError, ValueError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj) -> str:
+        value = getattr(obj, self.current_ordering_field)
+        position = [value.isoformat() if isinstance(value, datetime) else value, obj.id]
+        return base64.urlsafe_b64encode(json.dumps(position).encode("ascii")).decode("ascii")
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([("next", self.get_next_link()), ("results", data)]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {"next": {"type": "string", "nullable": True}, "results": schema},
+        }
+
+
+class FeedEntryPagination(KeysetPagination):
+    """
+    entries are ordered by publication date, search results by their rank.
+    """
+
+    ordering_field = "published"
+    numeric_ordering_fields = (FullTextSearchFilter.rank_field,)
+
+    def get_ordering_field(self, queryset) -> str:
+        if FullTextSearchFilter.rank_field in queryset.query.annotations:
+            return FullTextSearchFilter.rank_field
+        return self.ordering_field
+
+
+class FeedPagination(KeysetPagination):
+    ordering_field = "updated_at"
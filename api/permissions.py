@@ -4,6 +4,7 @@ from rest_framework import permissions
 class IsOwnerOrReadOnly(permissions.BasePermission):
     """
     Custom permission to only allow owners of an object to edit it.
+    Ids are compared, so the owner is not loaded from the database.
     """
 
     def has_object_permission(self, request, view, obj):
@@ -13,4 +14,4 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
             return True
 
         # # Write permissions are only allowed to the owner of the model.
-        return obj.user == request.user
+        return obj.user_id == request.user.id
@@ -0,0 +1,111 @@
+import csv
+from datetime import datetime
+
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+class CompactJSONRenderer(JSONRenderer):
+    """
+    JSON without indentation, selected with ?format=compact or Accept: application/vnd.feeds.compact+json.
+    Encoded with orjson, types it does not know are encoded by the standard JSON encoder.
+    """
+
+    media_type = "application/vnd.feeds.compact+json"
+    format = "compact"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return orjson.dumps(data, default=self.encode_default, option=orjson.OPT_UTC_Z)
+
+    def encode_default(self, obj):
+        # types orjson does not know, e.g. lazy translations and decimals, are left to the standard encoder
+        return self.encoder_class().default(obj)
+
+
+class NDJSONRenderer(CompactJSONRenderer):
+    """
+    newline delimited JSON, one row per line, so exports are parsed by clients line by line as they arrive.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return b"".join(self.stream(data if isinstance(data, list) else [data]))
+
+    def stream(self, rows, fields=None):
+        """
+        @param rows: iterable of dicts, consumed lazily
+        @param fields: not used, rows keep their own keys
+        @return: generator of encoded lines
+        """
+        for row in rows:
+            yield super().render(row) + b"\n"
+
+
+class Echo(object):
+    """
+    file-like object handing written lines back, so csv.writer output is streamed instead of buffered.
+    """
+
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return ""
+        rows = data if isinstance(data, list) else [data]
+        return "".join(self.stream(rows, list(rows[0]) if rows else []))
+
+    def stream(self, rows, fields):
+        """
+        @param rows: iterable of dicts, consumed lazily
+        @param fields: keys of rows, in the order of columns
+        @return: generator of lines, header first
+        """
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow([self.format_value(row[field]) for field in fields])
+
+    @staticmethod
+    def format_value(value):
+        return value.isoformat() if isinstance(value, datetime) else value
+
+
+class CompactListMixin(object):
+    """
+    list responses in the compact format are built from values_list() rows instead of model instances and serializers,
+    which skips reverse() of every hyperlink and per field serializer calls.
+    Related objects are plain ids and datetimes are in UTC, other fields are the same as in the default format.
+    """
+
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, CompactJSONRenderer]
+    # pairs of (name in the response, field or annotation of the queryset)
+    compact_fields = ()
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != CompactJSONRenderer.format:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        names, lookups = zip(*self.compact_fields)
+        if self.paginator is None:
+            return Response([dict(zip(names, row)) for row in queryset.values_list(*lookups)])
+        # keyset pagination reads the cursor from the ordering field of the last row, it is dropped by zip()
+        ordering_field = self.paginator.get_ordering_field(queryset)
+        if ordering_field not in lookups:
+            lookups += (ordering_field,)
+        page = self.paginate_queryset(queryset.values_list(*lookups, named=True))
+        return self.get_paginated_response([dict(zip(names, row)) for row in page])
@@ -1,21 +1,66 @@
+from django.db import transaction
+from django_celery_beat.models import IntervalSchedule
 from rest_framework import serializers
 
+from feeds.importers import parse_subscriptions
 from feeds.models import Feed, FeedEntry, Source
+from feeds.tasks import FetchFeedTask
 
 
 class SourceSerializer(serializers.ModelSerializer):
     user = serializers.HiddenField(default=None)
     id = serializers.HyperlinkedRelatedField(view_name="sources-detail", read_only=True)
+    feed = serializers.HyperlinkedRelatedField(view_name="feeds-detail", read_only=True)
+    computed_fetch_interval = serializers.DurationField(
+        source="feed.computed_fetch_interval",
+        read_only=True,
+        help_text="Interval estimated from the publish rate of the feed in adaptive mode",
+    )
 
     class Meta:
         model = Source
-        fields = ["user", "id", "name", "url", "fetch_interval"]
+        fields = [
+            "user",
+            "id",
+            "name",
+            "url",
+            "feed",
+            "fetch_interval",
+            "adaptive_fetch_interval",
+            "computed_fetch_interval",
+            "max_entries",
+        ]
         extra_kwargs = {
             "name": {"help_text": "Name of your feed source"},
             "url": {"help_text": "Valid url to feed source"},
             "fetch_interval": {"help_text": "How often your feed will be updated"},
+            "adaptive_fetch_interval": {
+                "help_text": "Fetch less often if the feed publishes rarely, fetch_interval is the shortest interval"
+            },
+            "max_entries": {"help_text": "Store only this many entries, first in the feed, per fetch"},
         }
 
+    def validate_url(self, value):
+        request = self.context.get("request")
+        user_id = request.user.id if request else None
+        subscriptions = Source.objects.filter(user_id=user_id, feed__feed_url=Feed.normalize_url(value))
+        if self.instance is not None:
+            subscriptions = subscriptions.exclude(id=self.instance.id)
+        if subscriptions.exists():
+            raise serializers.ValidationError("You are already subscribed to this feed")
+        return value
+
+    @staticmethod
+    def queue_fetch(instance):
+        """
+        fetch the feed of saved instance in the background, once it is committed, so the request does not wait for it.
+        Feeds already fetched for other subscribers are not fetched again, unless their last fetch failed.
+        Progress can be followed with the status action.
+        """
+        feed = instance.feed
+        if feed.fetch_status != feed.FETCH_DONE:
+            transaction.on_commit(lambda: FetchFeedTask().apply_async((feed.id,)))
+
     def create(self, validated_data):
         """
         main purpose of thi overwritten method is to add request.user to the Source model
@@ -28,27 +73,49 @@ class SourceSerializer(serializers.ModelSerializer):
             validated_data.update({"user": request.user})
         instance = Source(**validated_data)
         instance.save()
+        self.queue_fetch(instance)
         return instance
 
+    def update(self, instance, validated_data):
+        previous_feed_id = instance.feed_id
+        instance = super().update(instance, validated_data)
+        if instance.feed_id != previous_feed_id:
+            self.queue_fetch(instance)
+        return instance
+
+
+class SourcesImportSerializer(serializers.Serializer):
+    """
+    OPML or CSV document of feeds to subscribe to at once, all of them with the same fetch interval.
+    Validated file is a list of (name, url) tuples, urls are validated by SubscriptionsImport.
+    """
+
+    file = serializers.FileField(help_text="OPML document, or CSV with url and optional name columns")
+    fetch_interval = serializers.PrimaryKeyRelatedField(
+        queryset=IntervalSchedule.objects.all(), help_text="How often your feeds will be updated"
+    )
+
+    def validate_file(self, value):
+        try:
+            return parse_subscriptions(value.read())
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+
 
 class FeedSetSerializer(serializers.HyperlinkedModelSerializer):
     id = serializers.HyperlinkedRelatedField(view_name="feeds-detail", read_only=True)
-    source = serializers.HyperlinkedRelatedField(view_name="sources-detail", read_only=True)
+    # subscription of the user, the feed itself is shared with other subscribers
+    source = serializers.HyperlinkedRelatedField(view_name="sources-detail", read_only=True, source="subscription_id")
 
     class Meta:
         model = Feed
         fields = ["id", "source", "title", "link", "summary", "tag_line", "url", "published"]
 
 
-class RawEntriesSetSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Feed
-        fields = ["entries"]
-
-
 class FeedEntriesSetSerializer(serializers.HyperlinkedModelSerializer):
     id = serializers.HyperlinkedRelatedField(view_name="feed-entries-detail", read_only=True)
     feed = serializers.HyperlinkedRelatedField(view_name="feeds-detail", read_only=True)
+    read = serializers.BooleanField(read_only=True, help_text="Has been read")
 
     class Meta:
         model = FeedEntry
@@ -65,3 +132,36 @@ class FeedEntriesSetSerializer(serializers.HyperlinkedModelSerializer):
             "author",
             "copyright",
         ]
+
+
+class MarkEntriesSerializer(serializers.Serializer):
+    """
+    selection of entries to mark read or unread at once. Selectors are combined,
+    on top of filters given as query parameters, e.g. ?feed=1&search=... marks every matching entry.
+    """
+
+    read = serializers.BooleanField(help_text="State to set")
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, max_length=10000, help_text="Ids of entries"
+    )
+    feed = serializers.IntegerField(required=False, help_text="Id of the feed of entries")
+    until_id = serializers.IntegerField(required=False, help_text="Only entries up to this entry id, inclusive")
+    until_published = serializers.DateTimeField(
+        required=False, help_text="Only entries published at or before this date"
+    )
+
+    def filter_queryset(self, queryset):
+        """
+        @param queryset: entries the user may mark, annotated with their read state
+        @return: selected entries which are not in the requested state yet
+        """
+        data = self.validated_data
+        if "ids" in data:
+            queryset = queryset.filter(id__in=data["ids"])
+        if "feed" in data:
+            queryset = queryset.filter(feed_id=data["feed"])
+        if "until_id" in data:
+            queryset = queryset.filter(id__lte=data["until_id"])
+        if "until_published" in data:
+            queryset = queryset.filter(published__lte=data["until_published"])
+        return queryset.exclude(read=data["read"])
@@ -3,8 +3,9 @@ from unittest import mock
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase
 
-from feeds.models import Source
-from feeds.tests import BaseTestCase
+from api.permissions import IsOwnerOrReadOnly
+from feeds.models import FeedEntry, Source
+from feeds.tests import BaseTestCase, run_on_commit_immediately
 
 
 class SerializersTestCase(APITestCase, BaseTestCase):
@@ -14,10 +15,10 @@ class SerializersTestCase(APITestCase, BaseTestCase):
         self.post_data = self.create_source_data(fetch_interval=self.first_interval.id, user="")
         self.client.force_login(self.user)
 
-    @mock.patch("feeds.models.Source.aggregated_data", new_callable=mock.PropertyMock)
-    def test_source_serializer_create(self, mock_aggregated_data):
+    @mock.patch("feeds.parsers.RssAggregator.parse")
+    def test_source_serializer_create(self, mock_parse):
         # mock methods to accept data from file not from url
-        mock_aggregated_data.return_value = self.aggregated_data
+        mock_parse.return_value = self.parsed_data
         post_data = self.create_source_data(fetch_interval=self.first_interval.id, user="", name="different_name")
 
         # POST data to create new Source instance for first_user
@@ -26,3 +27,60 @@ class SerializersTestCase(APITestCase, BaseTestCase):
         source = Source.objects.get(user=self.user)
 
         self.assertTrue(source.user_id == self.user.id)
+
+    @mock.patch("feeds.tasks.FetchFeedTask.apply_async")
+    @mock.patch("feeds.parsers.RssAggregator.parse")
+    def test_source_serializer_create_non_blocking(self, mock_parse, mock_apply_async):
+        # TestCase transaction is never committed, so the fetch is not queued yet
+        response = self.client.post(self.url_list, self.post_data)
+        self.assertEqual(response.status_code, 201)
+        source = Source.objects.get(user=self.user)
+        self.assertEqual(source.feed.fetch_status, source.feed.FETCH_PENDING)
+        mock_parse.assert_not_called()
+        mock_apply_async.assert_not_called()
+        self.assertFalse(FeedEntry.objects.exists())
+
+        # the fetch is queued once the source is committed
+        post_data = self.create_source_data(fetch_interval=self.first_interval.id, user="", url="https://google.org")
+        with run_on_commit_immediately():
+            response = self.client.post(self.url_list, post_data)
+        self.assertEqual(response.status_code, 201)
+        mock_apply_async.assert_called_once()
+        mock_parse.assert_not_called()
+
+        # feed already fetched for another subscriber is not fetched again
+        source = Source.objects.get(url="https://google.org")
+        source.feed.fetch_status = source.feed.FETCH_DONE
+        source.feed.save(update_fields=["fetch_status"])
+        self.client.force_login(self.user_second)
+        with run_on_commit_immediately():
+            response = self.client.post(self.url_list, post_data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Source.objects.get(user=self.user_second).feed, source.feed)
+        mock_apply_async.assert_called_once()
+
+    @mock.patch("feeds.parsers.RssAggregator.parse")
+    def test_source_serializer_adaptive_fetch_interval(self, mock_parse):
+        mock_parse.return_value = self.parsed_data
+        post_data = self.create_source_data(fetch_interval=self.first_interval.id, user="")
+        post_data.update({"adaptive_fetch_interval": True, "computed_fetch_interval": "00:01:00"})
+        response = self.client.post(self.url_list, post_data)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.data["adaptive_fetch_interval"])
+        # computed interval is read only
+        self.assertIsNone(response.data["computed_fetch_interval"])
+
+
+class PermissionsTestCase(BaseTestCase):
+    def test_is_owner_or_read_only(self):
+        source = Source.objects.create(**self.create_source_data(fetch_interval=self.first_interval, user=self.user))
+        permission = IsOwnerOrReadOnly()
+        for user, method, allowed in [
+            (self.user, "PATCH", True),
+            (self.user_second, "PATCH", False),
+            (self.user_second, "GET", True),
+        ]:
+            request = mock.Mock(user=user, method=method)
+            # owner is compared by id, without loading it
+            with self.assertNumQueries(0):
+                self.assertEqual(permission.has_object_permission(request, mock.Mock(spec=[]), source), allowed)
@@ -3,7 +3,7 @@ from django.utils.html import format_html
 from rest_framework import routers
 from rest_framework.schemas import get_schema_view
 
-from feeds.views import FeedEntryViewSet, FeedViewSet, SourceViewSet
+from feeds.views import FeedEntryViewSet, FeedViewSet, ProfileViewSet, SourceViewSet
 
 
 class DjangoRSSScraper(routers.APIRootView):
@@ -29,6 +29,7 @@ router_v1 = DocumentedRouter()
 router_v1.register(r"feeds", FeedViewSet, basename="feeds")
 router_v1.register(r"feed-entries", FeedEntryViewSet, basename="feed-entries")
 router_v1.register(r"sources", SourceViewSet, basename="sources")
+router_v1.register(r"profiles", ProfileViewSet, basename="profiles")
 
 urlpatterns = [
     path("v1/", include(router_v1.urls)),
@@ -3,6 +3,7 @@ from __future__ import absolute_import, unicode_literals
 import os
 
 import celery
+from celery import signals
 from django.conf import settings
 
 # set the default Django settings module for the 'celery' program.
@@ -15,3 +16,12 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_rss_scraper.settings")
 app = celery.Celery("django_rss_scraper")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
+
+
+@signals.worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    # metrics files of a pool process are kept in PROMETHEUS_MULTIPROC_DIR, live values of its gauges are not
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 import os
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -55,6 +56,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "api.middleware.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "django_rss_scraper.urls"
@@ -125,12 +127,18 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# shared by all workers, holds API responses and generation counters which version them
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "unique-snowflake",
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": os.environ.get("CACHE_URL", "redis://redis:6379/3"),
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        },
     }
 }
+# seconds API responses are cached for, they are invalidated by feed refreshes before that, 0 disables the cache
+API_RESPONSE_CACHE_TIMEOUT = int(os.environ.get("API_RESPONSE_CACHE_TIMEOUT", 60 * 60))
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.1/topics/i18n/
@@ -225,6 +233,42 @@ CELERY_TASK_PUBLISH_RETRY_POLICY = {"max_retries": 5, "interval_start": 0, "inte
 
 X_FRAME_OPTIONS = "SAMEORIGIN"
 
+# Feeds fetching
+FEEDS_FETCH_CONCURRENCY = int(os.environ.get("FEEDS_FETCH_CONCURRENCY", 100))
+FEEDS_FETCH_PER_HOST_CONCURRENCY = int(os.environ.get("FEEDS_FETCH_PER_HOST_CONCURRENCY", 4))
+FEEDS_FETCH_TIMEOUT = int(os.environ.get("FEEDS_FETCH_TIMEOUT", 30))  # seconds
+# queue of ParseFeedTask consumed by CPU bound workers, feeds are parsed by download workers if not set
+FEEDS_PARSE_QUEUE = os.environ.get("FEEDS_PARSE_QUEUE")
+# feeds claimed by a single FetchFeedsBatchTask, and by a single run of DispatchDueSourcesTask
+FEEDS_SWEEP_BATCH_SIZE = int(os.environ.get("FEEDS_SWEEP_BATCH_SIZE", 200))
+FEEDS_SWEEP_MAX_SOURCES = int(os.environ.get("FEEDS_SWEEP_MAX_SOURCES", 20000))
+# adaptive fetch interval of a feed never exceeds the ceiling, and is estimated from its most recent entries
+FEEDS_ADAPTIVE_FETCH_INTERVAL_CEILING = timedelta(
+    hours=int(os.environ.get("FEEDS_ADAPTIVE_FETCH_INTERVAL_CEILING_HOURS", 72))
+)
+FEEDS_ADAPTIVE_FETCH_INTERVAL_SAMPLE = 20
+# downloaded bodies larger than the threshold (bytes) are parsed incrementally, entries are persisted in batches
+FEEDS_STREAMING_THRESHOLD = int(os.environ.get("FEEDS_STREAMING_THRESHOLD", 1024 * 1024))
+FEEDS_ENTRIES_BATCH_SIZE = int(os.environ.get("FEEDS_ENTRIES_BATCH_SIZE", 500))
+# seconds decoded raw entries of a feed are cached for, between requests of their pages
+FEEDS_PAYLOAD_CACHE_TIMEOUT = int(os.environ.get("FEEDS_PAYLOAD_CACHE_TIMEOUT", 10 * 60))
+# entries stored per fetch of a source without its own limit, not limited if not set
+FEEDS_MAX_ENTRIES = int(os.environ["FEEDS_MAX_ENTRIES"]) if os.environ.get("FEEDS_MAX_ENTRIES") else None
+# first fetches of feeds created by an import are spread evenly over this window
+FEEDS_IMPORT_STAGGER = timedelta(seconds=int(os.environ.get("FEEDS_IMPORT_STAGGER_SECONDS", 600)))
+FEEDS_IMPORT_BATCH_SIZE = int(os.environ.get("FEEDS_IMPORT_BATCH_SIZE", 1000))
+# text search configuration of entries, "simple" does not stem words, so it fits feeds in any language
+FEEDS_SEARCH_CONFIG = os.environ.get("FEEDS_SEARCH_CONFIG", "simple")
+# fraction of FetchFeedTask runs profiled, 0 disables profiling of fetches
+FEEDS_PROFILE_FETCH_FRACTION = float(os.environ.get("FEEDS_PROFILE_FETCH_FRACTION", 0))
+
+# Profiling, profiles are shared by web and worker processes, only the most recent PROFILE_MAX_FILES are kept
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", 200))
+# fraction of API requests profiled, and token of the X-Profile header profiling a single request, both off by default
+API_PROFILE_FRACTION = float(os.environ.get("API_PROFILE_FRACTION", 0))
+API_PROFILE_TOKEN = os.environ.get("API_PROFILE_TOKEN")
+
 try:
     from .local import *  # NOSONAR # noqa
 except ImportError:
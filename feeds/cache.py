@@ -0,0 +1,50 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+FEED_GENERATION_KEY = "feeds:generation:feed:{}"
+USER_GENERATION_KEY = "feeds:generation:user:{}"
+USER_FEEDS_KEY = "feeds:user:{}:feeds:{}"
+PAYLOAD_ENTRIES_KEY = "feeds:payload:{}:entries"
+
+
+def new_generation() -> int:
+    """
+    generations are taken from the clock instead of incrementing a counter, so a generation evicted from the cache
+    and started again never repeats a generation of responses cached before.
+    """
+    return time.time_ns()
+
+
+def get_generations(keys) -> dict:
+    """
+    @param keys: generation keys
+    @return: dict of generations by key, missing generations are started
+    """
+    generations = cache.get_many(keys)
+    missing = {key: new_generation() for key in keys if key not in generations}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        generations.update(missing)
+    return generations
+
+
+def bump_generation(key):
+    cache.set(key, new_generation(), timeout=None)
+
+
+def bump_feed_generation(feed_id):
+    """
+    invalidate cached responses which include the feed, for all its subscribers, once the transaction is committed.
+    """
+    transaction.on_commit(lambda: bump_generation(FEED_GENERATION_KEY.format(feed_id)))
+
+
+def bump_user_generation(user_id):
+    """
+    invalidate cached responses of the user, e.g. after changes of subscriptions or read state,
+    once the transaction is committed.
+    """
+    if user_id is not None:
+        transaction.on_commit(lambda: bump_generation(USER_GENERATION_KEY.format(user_id)))
@@ -0,0 +1,170 @@
+import asyncio
+import time
+from collections import defaultdict
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+
+import aiohttp
+import feedparser
+from django.conf import settings
+
+from feeds import metrics
+from feeds.parsers import FetchResult, parse_response
+
+
+class AsyncFeedFetcher(object):
+    """
+    downloads many feeds concurrently within a single event loop,
+    so one worker process is not blocked by the network round trip of each feed.
+    Downloaded bodies are mapped with RssAggregator, persistence is left to the caller.
+
+    Downloading (I/O bound) and parsing (CPU bound) are separate stages, sized independently:
+    download stage by concurrency limits, parse stage by the executor passed to fetch_many.
+
+    @param concurrency: maximum number of downloads in flight
+    @param per_host_concurrency: maximum number of downloads in flight to a single host
+    @param timeout: total time in seconds allowed for a single download
+    """
+
+    def __init__(self, concurrency=None, per_host_concurrency=None, timeout=None):
+        self.concurrency = concurrency or settings.FEEDS_FETCH_CONCURRENCY
+        self.per_host_concurrency = per_host_concurrency or settings.FEEDS_FETCH_PER_HOST_CONCURRENCY
+        self.timeout = timeout or settings.FEEDS_FETCH_TIMEOUT
+
+    def download_many(self, feeds) -> list:
+        """
+        download stage only.
+
+        @param feeds: iterable of Feed instances, their validators are sent with each request
+        @return: list of (feed, (status, headers, body)) tuples in order of feeds,
+        with URLError in place of the response if the feed could not be downloaded
+        """
+        feeds = list(feeds)
+        return list(zip(feeds, asyncio.run(self._fetch_many(feeds))))
+
+    def fetch_many(self, feeds, parse_executor=None) -> list:
+        """
+        download and parse stages.
+
+        @param feeds: iterable of Feed instances, their validators are sent with each request
+        @param parse_executor: concurrent.futures.Executor, e.g. ProcessPoolExecutor, each body is handed over to it
+        as soon as it is downloaded, while other downloads go on. Without executor, bodies are parsed in this process
+        once all downloads are done, so parsing does not hold up the event loop.
+        @return: list of (feed, FetchResult) tuples in order of feeds, with URLError in place of FetchResult
+        if the feed could not be downloaded, or the exception raised while it was mapped, e.g. for an html page,
+        so a single broken feed does not fail the others
+        """
+        feeds = list(feeds)
+        results = []
+        for feed, response in zip(feeds, asyncio.run(self._fetch_many(feeds, parse_executor))):
+            if isinstance(response, tuple):
+                try:
+                    response = parse_response(*response)
+                except Exception as e:
+                    response = e
+            results.append((feed, response))
+        return results
+
+    async def _fetch_many(self, feeds, parse_executor=None):
+        # limits are applied before the request starts, so time spent waiting for a slot is not counted by timeout
+        semaphore = asyncio.Semaphore(self.concurrency)
+        host_semaphores = defaultdict(lambda: asyncio.Semaphore(self.per_host_concurrency))
+        connector = aiohttp.TCPConnector(limit=0)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        headers = {"User-Agent": feedparser.USER_AGENT}
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout, headers=headers, trace_configs=[self._dns_trace_config()]
+        ) as session:
+            return await asyncio.gather(
+                *[self._fetch(session, feed, semaphore, host_semaphores, parse_executor) for feed in feeds]
+            )
+
+    async def _fetch(self, session, feed, semaphore, host_semaphores, parse_executor):
+        headers = {}
+        if feed.etag:
+            headers["If-None-Match"] = feed.etag
+        if feed.last_modified:
+            headers["If-Modified-Since"] = feed.last_modified
+        try:
+            async with host_semaphores[urlsplit(feed.feed_url).hostname], semaphore:
+                start = time.perf_counter()
+                status, response_headers, body = await self._download(session, feed, headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            metrics.observe_download(time.perf_counter() - start, outcome=metrics.ERROR)
+            return URLError(e)
+        metrics.observe_download(time.perf_counter() - start, body, self.get_outcome(status))
+        if status >= 400:
+            return URLError(f"{feed.feed_url} responded with {status}")
+        if parse_executor is None:
+            return status, response_headers, body
+        # download slot has already been released, so other downloads go on while this one is parsed
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(parse_executor, parse_response, status, response_headers, body)
+        except Exception as e:
+            return e
+
+    @staticmethod
+    def get_outcome(status) -> str:
+        """
+        @return: outcome label of metrics for http status of a download
+        """
+        if status == FetchResult.NOT_MODIFIED:
+            return metrics.NOT_MODIFIED
+        return metrics.ERROR if status >= 400 else metrics.OK
+
+    @staticmethod
+    def _dns_trace_config():
+        """
+        observes time spent resolving hosts, which is a part of download time
+        """
+
+        async def on_start(session, context, params):
+            context.dns_started = time.perf_counter()
+
+        async def on_end(session, context, params):
+            metrics.DNS_SECONDS.observe(time.perf_counter() - context.dns_started)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_dns_resolvehost_start.append(on_start)
+        trace_config.on_dns_resolvehost_end.append(on_end)
+        return trace_config
+
+    async def _download(self, session, feed, headers):
+        """
+        @return: tuple of status, headers and body of the response
+        """
+        async with session.get(feed.feed_url, headers=headers) as response:
+            return response.status, dict(response.headers), await response.read()
+
+
+def download_feed(feed, timeout=None):
+    """
+    download a single feed in the calling thread, with the same request as AsyncFeedFetcher.
+
+    @param feed: Feed instance, its validators are sent with the request
+    @param timeout: time in seconds allowed for the download, FEEDS_FETCH_TIMEOUT by default
+    @return: tuple of status, headers and body of the response, 304 responses have an empty body
+    @raise: URLError if the feed could not be downloaded
+    """
+    headers = {"User-Agent": feedparser.USER_AGENT}
+    if feed.etag:
+        headers["If-None-Match"] = feed.etag
+    if feed.last_modified:
+        headers["If-Modified-Since"] = feed.last_modified
+    request = Request(feed.feed_url, headers=headers)
+    start = time.perf_counter()
+    try:
+        with urlopen(request, timeout=timeout or settings.FEEDS_FETCH_TIMEOUT) as response:
+            status, response_headers, body = response.status, dict(response.headers), response.read()
+    except HTTPError as e:
+        status, response_headers, body = e.code, dict(e.headers), b""
+    except (OSError, ValueError) as e:
+        # timeouts and connection errors, and urls urllib can not open
+        metrics.observe_download(time.perf_counter() - start, outcome=metrics.ERROR)
+        raise URLError(e)
+    metrics.observe_download(time.perf_counter() - start, body, AsyncFeedFetcher.get_outcome(status))
+    if status >= 400:
+        raise URLError(f"{feed.feed_url} responded with {status}")
+    return status, response_headers, body
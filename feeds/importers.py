@@ -0,0 +1,182 @@
+import csv
+import io
+from datetime import timedelta
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import transaction
+from django.db.models import Case, DateTimeField, DurationField, F, Value, When
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from feeds.cache import bump_user_generation
+from feeds.models import Feed, Source
+
+
+def parse_opml(content) -> list:
+    """
+    @param content: OPML document, bytes or str
+    @return: list of (name, url) tuples of outlines with xmlUrl, outlines nested in categories included
+    @raise: ValueError if the document is not valid XML
+    """
+    try:
+        # XML declaration must come first
+        root = ElementTree.fromstring(content.lstrip())
+    except ElementTree.ParseError as e:
+        raise ValueError(f"Invalid OPML document: {e}")
+    return [
+        (outline.get("title") or outline.get("text"), outline.get("xmlUrl"))
+        for outline in root.iter("outline")
+        if outline.get("xmlUrl")
+    ]
+
+
+def parse_csv(content) -> list:
+    """
+    @param content: CSV document with a header row, url column is required, name or title column is optional
+    @return: list of (name, url) tuples
+    @raise: ValueError if the document has no url column
+    """
+    if isinstance(content, bytes):
+        content = content.decode("utf-8-sig")
+    reader = csv.DictReader(io.StringIO(content))
+    fields = {field.strip().lower(): field for field in reader.fieldnames or []}
+    if "url" not in fields:
+        raise ValueError("CSV document has no url column")
+    name_field = fields.get("name") or fields.get("title")
+    return [(row.get(name_field) if name_field else None, row[fields["url"]]) for row in reader if row[fields["url"]]]
+
+
+def parse_subscriptions(content) -> list:
+    """
+    @param content: OPML or CSV document, told apart by the first character
+    @return: list of (name, url) tuples
+    """
+    head = content.lstrip()[:1]
+    if head in (b"<", "<"):
+        return parse_opml(content)
+    return parse_csv(content)
+
+
+class SubscriptionsImport(object):
+    """
+    subscribes a user to many feeds at once, with a few bulk statements instead of saving sources one by one.
+    Urls are validated and deduplicated by their normalized form, feeds the user is already subscribed to are skipped.
+    Feeds which do not exist yet are created pending, with their first fetches spread over FEEDS_IMPORT_STAGGER,
+    so DispatchDueSourcesTask picks them up gradually instead of all at once.
+
+    @param user: User subscribing to feeds
+    @param fetch_interval: IntervalSchedule of all the imported sources
+    """
+
+    url_validator = URLValidator()
+    max_length = Source._meta.get_field("url").max_length
+
+    def __init__(self, user, fetch_interval):
+        self.user = user
+        self.fetch_interval = fetch_interval
+        self.created = 0
+        self.duplicates = 0
+        self.subscribed = 0
+        self.invalid = []
+
+    def get_result(self) -> dict:
+        return {
+            "created": self.created,
+            "duplicates": self.duplicates,
+            "already_subscribed": self.subscribed,
+            "invalid": self.invalid,
+        }
+
+    def clean(self, items) -> dict:
+        """
+        @param items: iterable of (name, url) tuples
+        @return: dict of (name, url) tuples by normalized url, first occurrence of a url wins
+        """
+        subscriptions = {}
+        for name, url in items:
+            url = (url or "").strip()
+            try:
+                self.url_validator(url)
+            except ValidationError:
+                self.invalid.append(url)
+                continue
+            feed_url = Feed.normalize_url(url)
+            if len(url) > self.max_length or len(feed_url) > self.max_length:
+                self.invalid.append(url)
+            elif feed_url in subscriptions:
+                self.duplicates += 1
+            else:
+                subscriptions[feed_url] = ((name or "").strip()[: self.max_length] or url, url)
+        return subscriptions
+
+    def run(self, items) -> dict:
+        """
+        @param items: iterable of (name, url) tuples, e.g. from parse_subscriptions
+        @return: dict with numbers of created sources, duplicate and already subscribed urls, and list of invalid urls
+        """
+        subscriptions = self.clean(items)
+        now = timezone.now()
+        interval = timedelta(**{self.fetch_interval.period: self.fetch_interval.every})
+        batch_size = settings.FEEDS_IMPORT_BATCH_SIZE
+        with transaction.atomic():
+            for feed_url in Source.objects.filter(user=self.user, feed__feed_url__in=list(subscriptions)).values_list(
+                "feed__feed_url", flat=True
+            ):
+                del subscriptions[feed_url]
+                self.subscribed += 1
+            if not subscriptions:
+                return self.get_result()
+
+            existing = set(Feed.objects.filter(feed_url__in=list(subscriptions)).values_list("feed_url", flat=True))
+            new_urls = [feed_url for feed_url in subscriptions if feed_url not in existing]
+            step = settings.FEEDS_IMPORT_STAGGER / max(len(new_urls), 1)
+            # a single subscription sets fetch policy of a new feed, see Feed.update_subscriptions
+            Feed.objects.bulk_create(
+                (
+                    Feed(
+                        feed_url=feed_url,
+                        fetch_status=Feed.FETCH_PENDING,
+                        fetch_interval=interval,
+                        next_fetch_at=now + step * num,
+                    )
+                    for num, feed_url in enumerate(new_urls)
+                ),
+                batch_size=batch_size,
+                ignore_conflicts=True,
+            )
+            feed_ids = dict(Feed.objects.filter(feed_url__in=list(subscriptions)).values_list("feed_url", "id"))
+            sources = Source.objects.bulk_create(
+                (
+                    Source(
+                        user=self.user,
+                        name=name,
+                        url=url,
+                        feed_id=feed_ids[feed_url],
+                        fetch_interval=self.fetch_interval,
+                    )
+                    for feed_url, (name, url) in subscriptions.items()
+                ),
+                batch_size=batch_size,
+            )
+            self.created = len(sources)
+
+            # feeds shared with other subscribers follow the policy of imported sources, which are neither adaptive
+            # nor limited, and are fetched at least as often as they want. Failed feeds, possibly backed off,
+            # are fetched right away, so new subscribers do not wait for them.
+            next_fetch_at = now + interval
+            Feed.objects.filter(feed_url__in=list(existing)).update(
+                fetch_interval=Least(F("fetch_interval"), Value(interval, output_field=DurationField())),
+                adaptive_fetch_interval=False,
+                max_entries=None,
+                next_fetch_at=Case(
+                    When(fetch_status=Feed.FETCH_FAILED, then=Value(now)),
+                    # postgres LEAST skips nulls
+                    default=Least(F("next_fetch_at"), Value(next_fetch_at, output_field=DateTimeField())),
+                    output_field=DateTimeField(),
+                ),
+            )
+            bump_user_generation(self.user.id)
+        return self.get_result()
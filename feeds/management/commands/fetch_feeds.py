@@ -0,0 +1,193 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.error import URLError
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from feeds.fetchers import AsyncFeedFetcher, download_feed
+from feeds.models import Feed
+from feeds.parsers import parse_response
+from feeds.tasks import FetchFeedTask
+
+
+def percentile(values, fraction):
+    """
+    @param values: sorted list of numbers
+    @param fraction: e.g. 0.99 for the 99th percentile
+    @return: nearest rank percentile, None if there are no values
+    """
+    if not values:
+        return None
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+class TimedFeedFetcher(AsyncFeedFetcher):
+    """
+    keeps download time of each feed, without time spent waiting for a download slot.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.download_times = {}
+
+    async def _download(self, session, feed, headers):
+        start = time.perf_counter()
+        try:
+            return await super()._download(session, feed, headers)
+        finally:
+            self.download_times[feed.id] = time.perf_counter() - start
+
+
+class FetchReport(object):
+    """
+    throughput of a fetch_feeds run, latency of a feed covers its download, parse and persist stages.
+    """
+
+    def __init__(self):
+        self.latencies = []
+        self.bytes = 0
+        self.inserted = 0
+        self.updated = 0
+        self.not_modified = 0
+        self.failed = []
+        self.elapsed = 0
+
+    def add(self, latency, body_size, inserted, updated, not_modified):
+        self.latencies.append(latency)
+        self.bytes += body_size
+        self.inserted += inserted
+        self.updated += updated
+        self.not_modified += not_modified
+
+    def lines(self) -> list:
+        count = len(self.latencies) + len(self.failed)
+        latencies = sorted(self.latencies)
+        rate = count / self.elapsed if self.elapsed else 0
+        lines = [
+            f"Fetched {count} feeds in {self.elapsed:.2f}s: {rate:.1f} feeds/s",
+            f"Downloaded {self.bytes} bytes: {self.bytes / self.elapsed if self.elapsed else 0:.0f} bytes/s",
+            f"Entries inserted: {self.inserted}, updated: {self.updated}",
+            f"Feeds not modified: {self.not_modified}, failed: {len(self.failed)}",
+        ]
+        if latencies:
+            lines.append(
+                f"Latency per feed: p50 {percentile(latencies, 0.5):.3f}s, p99 {percentile(latencies, 0.99):.3f}s, "
+                f"max {latencies[-1]:.3f}s"
+            )
+        return lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh all feeds, or a subset of them, in this process and print a throughput report. "
+        "Feeds are downloaded concurrently and persisted the same way as by FetchFeedTask."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--feed", type=int, nargs="+", dest="feed_ids", help="Ids of feeds to refresh")
+        parser.add_argument("--user", help="Refresh only feeds the user is subscribed to")
+        parser.add_argument("--due", action="store_true", help="Refresh only feeds due for a refresh")
+        parser.add_argument("--skip-failed", action="store_true", help="Skip feeds whose fetches failed for good")
+        parser.add_argument("--limit", type=int, help="Refresh at most this many feeds, due first")
+        parser.add_argument(
+            "--mode",
+            choices=["async", "threads"],
+            default="async",
+            help="Download feeds within a single event loop, or with a pool of threads",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.FEEDS_FETCH_CONCURRENCY,
+            help="Maximum number of downloads in flight",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.FEEDS_SWEEP_BATCH_SIZE,
+            help="Feeds downloaded before they are persisted, bounds memory held by downloaded bodies",
+        )
+
+    def handle(self, *args, **options):
+        feed_ids = self.get_feed_ids(options)
+        report = FetchReport()
+        start = time.perf_counter()
+        for offset in range(0, len(feed_ids), options["batch_size"]):
+            feeds = list(Feed.objects.filter(id__in=feed_ids[offset : offset + options["batch_size"]]))
+            if options["mode"] == "threads":
+                self.fetch_with_threads(feeds, options["concurrency"], report)
+            else:
+                self.fetch_async(feeds, options["concurrency"], report)
+        report.elapsed = time.perf_counter() - start
+
+        if options["verbosity"] > 1:
+            for feed, exc in report.failed:
+                self.stderr.write(f"Failed {feed.feed_url}: {exc}")
+        for line in report.lines():
+            self.stdout.write(line)
+
+    def get_feed_ids(self, options) -> list:
+        feeds = Feed.objects.all()
+        if options["feed_ids"]:
+            feeds = feeds.filter(id__in=options["feed_ids"])
+        if options["user"]:
+            if not User.objects.filter(username=options["user"]).exists():
+                raise CommandError(f"User {options['user']} does not exist")
+            feeds = feeds.filter(sources__user__username=options["user"])
+        if options["due"]:
+            feeds = feeds.filter(next_fetch_at__lte=timezone.now())
+        if options["skip_failed"]:
+            feeds = feeds.exclude(fetch_status=Feed.FETCH_FAILED)
+        feed_ids = feeds.order_by("next_fetch_at", "id").values_list("id", flat=True)
+        if options["limit"]:
+            feed_ids = feed_ids[: options["limit"]]
+        return list(feed_ids)
+
+    def fetch_async(self, feeds, concurrency, report):
+        fetcher = TimedFeedFetcher(concurrency=concurrency)
+        for feed, response in fetcher.download_many(feeds):
+            self.persist(feed, response, fetcher.download_times.get(feed.id, 0), report)
+
+    def fetch_with_threads(self, feeds, concurrency, report):
+        """
+        downloads run in the pool, each feed is persisted by this thread as soon as it is downloaded,
+        so database work is not spread over connections of the pool.
+        """
+
+        def download(feed):
+            start = time.perf_counter()
+            try:
+                response = download_feed(feed)
+            except URLError as e:
+                response = e
+            return feed, response, time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in as_completed([executor.submit(download, feed) for feed in feeds]):
+                self.persist(*future.result(), report)
+
+    def persist(self, feed, response, download_time, report):
+        """
+        parse a downloaded response and persist the feed with FetchFeedTask, failures are only reported,
+        e.g. for a body which is not a feed or a field too long for its column, so a single feed never stops the run.
+
+        @param response: tuple of status, headers and body, or URLError if the feed could not be downloaded
+        @param download_time: download time of the feed in seconds
+        """
+        start = time.perf_counter()
+        try:
+            if isinstance(response, Exception):
+                raise response
+            fetch_result = parse_response(*response)
+            with transaction.atomic():
+                inserted, updated = FetchFeedTask().run_task_operations(feed, fetch_result)
+        except Exception as e:
+            report.failed.append((feed, e))
+            return
+        latency = download_time + time.perf_counter() - start
+        report.add(latency, len(response[2]), inserted, updated, fetch_result.not_modified)
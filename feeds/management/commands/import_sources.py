@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django_celery_beat.models import IntervalSchedule
+
+from feeds.importers import SubscriptionsImport, parse_subscriptions
+
+
+class Command(BaseCommand):
+    help = "Subscribe a user to all feeds of an OPML or CSV document, new feeds are fetched gradually by the sweeper."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="OPML document, or CSV with url and optional name columns")
+        parser.add_argument("--user", required=True, help="Username of the subscriber")
+        parser.add_argument("--every", type=int, default=1, help="Fetch interval of imported sources")
+        parser.add_argument(
+            "--period",
+            default=IntervalSchedule.HOURS,
+            choices=[period for period, _ in IntervalSchedule.PERIOD_CHOICES],
+            help="Unit of the fetch interval",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist")
+        try:
+            with open(options["path"], "rb") as document:
+                items = parse_subscriptions(document.read())
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+        fetch_interval = IntervalSchedule.objects.get_or_create(every=options["every"], period=options["period"])[0]
+        result = SubscriptionsImport(user, fetch_interval).run(items)
+        for url in result["invalid"]:
+            self.stderr.write(f"Invalid url: {url}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {result['created']} sources, skipped {result['duplicates']} duplicate "
+                f"and {result['already_subscribed']} already subscribed urls, {len(result['invalid'])} invalid urls"
+            )
+        )
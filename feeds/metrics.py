@@ -0,0 +1,147 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connection
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# outcome label of fetch metrics
+OK = "ok"
+NOT_MODIFIED = "not_modified"
+ERROR = "error"
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+DNS_SECONDS = Histogram(
+    "feeds_fetch_dns_seconds", "Time spent resolving hosts of feeds downloaded concurrently", buckets=SECONDS_BUCKETS
+)
+DOWNLOAD_SECONDS = Histogram(
+    "feeds_fetch_download_seconds",
+    "Time spent downloading a feed, including parsing for feeds downloaded by feedparser",
+    ["outcome"],
+    buckets=SECONDS_BUCKETS,
+)
+BODY_BYTES = Histogram(
+    "feeds_fetch_body_bytes", "Size of downloaded feed documents", ["outcome"], buckets=BYTES_BUCKETS
+)
+PARSE_SECONDS = Histogram(
+    "feeds_fetch_parse_seconds", "Time spent parsing a downloaded feed document", ["outcome"], buckets=SECONDS_BUCKETS
+)
+MAP_SECONDS = Histogram(
+    "feeds_fetch_map_seconds",
+    "Time spent mapping a feed and its entries to models",
+    ["outcome"],
+    buckets=SECONDS_BUCKETS,
+)
+DB_SECONDS = Histogram(
+    "feeds_fetch_db_seconds", "Time spent in database queries persisting a feed", ["outcome"], buckets=SECONDS_BUCKETS
+)
+ENTRIES = Counter("feeds_fetch_entries", "Entries of fetched feeds, by what became of them", ["state"])
+FETCHES = Counter("feeds_fetches", "Persisted fetches of feeds", ["outcome"])
+RETRIES = Counter("feeds_fetch_retries", "Fetches scheduled again after an error")
+FAILURES = Counter("feeds_fetch_failures", "Feeds marked failed after their retries ran out")
+
+
+def observe_download(seconds, body=None, outcome=OK):
+    DOWNLOAD_SECONDS.labels(outcome).observe(seconds)
+    if body is not None:
+        BODY_BYTES.labels(outcome).observe(len(body))
+
+
+class FetchMetrics(object):
+    """
+    stage times of a single fetch while it is persisted. Stages report to the metrics of the current context,
+    see measure_map and count_entries_seen, and histograms are observed once per fetch, not once per entry.
+    """
+
+    current = ContextVar("fetch_metrics", default=None)
+
+    def __init__(self):
+        self.outcome = OK
+        self.map_seconds = 0
+        self.db_seconds = 0
+        self.entries_seen = 0
+        self.entries_inserted = 0
+        self.entries_updated = 0
+
+    @classmethod
+    @contextmanager
+    def collect(cls):
+        """
+        measure stages of the fetch persisted within the block, observed as an error if the block raises.
+        The caller sets outcome of a successful fetch, ok by default.
+        """
+        metrics = cls()
+        token = cls.current.set(metrics)
+        try:
+            with connection.execute_wrapper(metrics.execute):
+                yield metrics
+        except Exception:
+            metrics.outcome = ERROR
+            raise
+        finally:
+            cls.current.reset(token)
+            metrics.observe()
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - start
+
+    def observe(self):
+        MAP_SECONDS.labels(self.outcome).observe(self.map_seconds)
+        DB_SECONDS.labels(self.outcome).observe(self.db_seconds)
+        ENTRIES.labels("seen").inc(self.entries_seen)
+        ENTRIES.labels("inserted").inc(self.entries_inserted)
+        ENTRIES.labels("updated").inc(self.entries_updated)
+        FETCHES.labels(self.outcome).inc()
+
+
+@contextmanager
+def measure_map():
+    metrics = FetchMetrics.current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.map_seconds += time.perf_counter() - start
+
+
+def count_entries_seen(count):
+    metrics = FetchMetrics.current.get()
+    if metrics is not None:
+        metrics.entries_seen += count
+
+
+def get_registry() -> CollectorRegistry:
+    """
+    @return: registry of this process, or of all processes writing to PROMETHEUS_MULTIPROC_DIR if it is set,
+    so metrics of celery workers are exposed by the web app
+    """
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics():
+    """
+    @return: tuple of body and content type of metrics in Prometheus text format
+    """
+    return generate_latest(get_registry()), CONTENT_TYPE_LATEST
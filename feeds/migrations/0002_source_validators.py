@@ -0,0 +1,23 @@
+# Generated by Django 3.0.14 on 2026-10-18 08:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='source',
+            name='etag',
+            field=models.CharField(max_length=255, null=True, verbose_name='ETag of the last fetch'),
+        ),
+        migrations.AddField(
+            model_name='source',
+            name='last_modified',
+            field=models.CharField(max_length=255, null=True, verbose_name='Last-Modified of the last fetch'),
+        ),
+    ]
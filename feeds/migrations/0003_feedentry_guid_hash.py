@@ -0,0 +1,61 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:02
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_values(*values):
+    joined = "\x1f".join("" if value is None else str(value) for value in values)
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()
+
+
+def populate_hashes(apps, schema_editor):
+    """
+    compute identity and content hashes of existing entries and remove duplicates created by repeated fetches,
+    keeping the oldest entry (flagged as read if any of its duplicates was).
+    """
+    feed_entry = apps.get_model("feeds", "FeedEntry")
+    content_fields = ["title", "link", "summary", "url", "published", "modified", "author", "copyright"]
+    seen = {}
+    duplicate_ids = []
+    read_ids = []
+    changed_obj_list = []
+    for obj in feed_entry.objects.order_by("feed_id", "id").iterator():
+        obj.guid_hash = hash_values(obj.url or obj.link or obj.title)
+        obj.content_hash = hash_values(*[getattr(obj, field) for field in content_fields])
+        key = (obj.feed_id, obj.guid_hash)
+        if key in seen:
+            duplicate_ids.append(obj.id)
+            if obj.read:
+                read_ids.append(seen[key])
+            continue
+        seen[key] = obj.id
+        changed_obj_list.append(obj)
+        if len(changed_obj_list) >= 1000:
+            feed_entry.objects.bulk_update(changed_obj_list, ["guid_hash", "content_hash"])
+            changed_obj_list = []
+    feed_entry.objects.bulk_update(changed_obj_list, ["guid_hash", "content_hash"])
+    feed_entry.objects.filter(id__in=read_ids).update(read=True)
+    feed_entry.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0002_source_validators'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedentry',
+            name='guid_hash',
+            field=models.CharField(max_length=40, null=True, verbose_name='Identity within the feed'),
+        ),
+        migrations.AddField(
+            model_name='feedentry',
+            name='content_hash',
+            field=models.CharField(default='', max_length=40, verbose_name='Content hash'),
+        ),
+        migrations.RunPython(populate_hashes, migrations.RunPython.noop),
+    ]
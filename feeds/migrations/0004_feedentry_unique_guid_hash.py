@@ -0,0 +1,22 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0003_feedentry_guid_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='feedentry',
+            name='guid_hash',
+            field=models.CharField(max_length=40, verbose_name='Identity within the feed'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('feed', 'guid_hash'), name='feeds_feedentry_feed_guid_hash_uniq'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:40
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def replace_periodic_tasks(apps, schema_editor):
+    """
+    make existing sources due and replace their periodic tasks with a single DispatchDueSourcesTask sweeper.
+    """
+    source = apps.get_model("feeds", "Source")
+    interval_schedule = apps.get_model("django_celery_beat", "IntervalSchedule")
+    periodic_task = apps.get_model("django_celery_beat", "PeriodicTask")
+    periodic_tasks = apps.get_model("django_celery_beat", "PeriodicTasks")
+
+    source.objects.update(next_fetch_at=timezone.now())
+    periodic_task.objects.filter(task="feeds.tasks.FetchFeedTask").delete()
+    interval, _ = interval_schedule.objects.get_or_create(every=1, period="minutes")
+    periodic_task.objects.update_or_create(
+        name="Dispatch due sources",
+        defaults={"task": "feeds.tasks.DispatchDueSourcesTask", "interval": interval},
+    )
+    # let running beat know the schedule has changed
+    periodic_tasks.objects.update_or_create(ident=1, defaults={"last_update": timezone.now()})
+
+
+def restore_periodic_tasks(apps, schema_editor):
+    source = apps.get_model("feeds", "Source")
+    periodic_task = apps.get_model("django_celery_beat", "PeriodicTask")
+
+    periodic_task.objects.filter(task="feeds.tasks.DispatchDueSourcesTask").delete()
+    for obj in source.objects.exclude(fetch_status__in=[0, 2]):
+        periodic_task.objects.update_or_create(
+            name="_".join([obj.name, str(obj.id)]),
+            task="feeds.tasks.FetchFeedTask",
+            args=[obj.id],
+            defaults={"interval_id": obj.fetch_interval_id},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_celery_beat', '0012_periodictask_expire_seconds'),
+        ('feeds', '0004_feedentry_unique_guid_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='source',
+            name='next_fetch_at',
+            field=models.DateTimeField(db_index=True, null=True, verbose_name='Next fetch at'),
+        ),
+        migrations.RunPython(replace_periodic_tasks, restore_periodic_tasks),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.0.14 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0005_source_next_fetch_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='source',
+            name='adaptive_fetch_interval',
+            field=models.BooleanField(default=False, verbose_name='Adapt fetch interval to publish rate'),
+        ),
+        migrations.AddField(
+            model_name='source',
+            name='computed_fetch_interval',
+            field=models.DurationField(null=True, verbose_name='Computed fetch interval'),
+        ),
+        migrations.AddField(
+            model_name='source',
+            name='empty_fetches_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Consecutive fetches with nothing new'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0006_source_adaptive_fetch_interval'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='source',
+            name='max_entries',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Maximum entries stored per fetch'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 3.0.14 on 2026-10-18 12:10
+
+import hashlib
+import json
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_entries_to_payloads(apps, schema_editor):
+    Feed = apps.get_model('feeds', 'Feed')
+    FeedPayload = apps.get_model('feeds', 'FeedPayload')
+    for feed in Feed.objects.only('id', 'entries').iterator():
+        if not feed.entries:
+            continue
+        serialized = json.dumps(feed.entries, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        payload, _ = FeedPayload.objects.get_or_create(
+            digest=hashlib.sha1(serialized).hexdigest(),
+            defaults={'data': zlib.compress(serialized), 'entries_count': len(feed.entries)},
+        )
+        Feed.objects.filter(id=feed.id).update(raw_payload=payload)
+
+
+def move_payloads_to_entries(apps, schema_editor):
+    Feed = apps.get_model('feeds', 'Feed')
+    for feed in Feed.objects.filter(raw_payload__isnull=False).select_related('raw_payload').iterator():
+        entries = json.loads(zlib.decompress(bytes(feed.raw_payload.data)))
+        Feed.objects.filter(id=feed.id).update(entries=entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0007_source_max_entries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedPayload',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=40, unique=True, verbose_name='Content digest')),
+                ('data', models.BinaryField(verbose_name='Compressed data')),
+                ('entries_count', models.PositiveIntegerField(default=0, verbose_name='Entries count')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+            ],
+            options={
+                'verbose_name': 'Feed payload',
+                'verbose_name_plural': 'Feed payloads',
+            },
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='raw_payload',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='feeds', to='feeds.FeedPayload', verbose_name='Raw entries'),
+        ),
+        migrations.RunPython(move_entries_to_payloads, move_payloads_to_entries),
+        migrations.RemoveField(
+            model_name='feed',
+            name='entries',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.0.14 on 2026-10-18 12:40
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # indexes are built without locking writes to large tables
+    atomic = False
+
+    dependencies = [
+        ('feeds', '0008_feedpayload'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='feed',
+            index=models.Index(fields=['-updated_at', '-id'], name='feeds_feed_updated_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='feedentry',
+            index=models.Index(fields=['feed', '-published', '-id'], name='feeds_entry_feed_pub_id_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.0.14 on 2026-10-18 13:15
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+BATCH_SIZE = 10000
+
+
+def populate_search_vector(apps, schema_editor):
+    FeedEntry = apps.get_model('feeds', 'FeedEntry')
+    config = settings.FEEDS_SEARCH_CONFIG
+    search_vector = (
+        SearchVector('title', weight='A', config=config)
+        + SearchVector('summary', weight='B', config=config)
+        + SearchVector('author', weight='C', config=config)
+    )
+    # migration is not atomic, so each batch is committed on its own and locks are held briefly
+    last_id = 0
+    while True:
+        ids = list(FeedEntry.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+        FeedEntry.objects.filter(id__gte=ids[0], id__lte=ids[-1]).update(search_vector=search_vector)
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('feeds', '0009_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedentry',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(null=True, verbose_name='Full text search document'),
+        ),
+        migrations.RunPython(populate_search_vector, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='feedentry',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='feeds_entry_search_idx'),
+        ),
+    ]
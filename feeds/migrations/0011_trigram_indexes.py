@@ -0,0 +1,21 @@
+# Generated by Django 3.0.14 on 2026-10-18 13:50
+
+from django.db import migrations
+
+from feeds.operations import CreatePgTrgmExtension, CreateTrigramIndex
+
+
+class Migration(migrations.Migration):
+    # indexes are built without locking writes to large tables
+    atomic = False
+
+    dependencies = [
+        ('feeds', '0010_feedentry_search_vector'),
+    ]
+
+    operations = [
+        CreatePgTrgmExtension(),
+        CreateTrigramIndex(model_name='source', field_name='name', name='feeds_source_name_trgm_idx'),
+        CreateTrigramIndex(model_name='feed', field_name='title', name='feeds_feed_title_trgm_idx'),
+        CreateTrigramIndex(model_name='feed', field_name='summary', name='feeds_feed_summary_trgm_idx'),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 3.0.14 on 2026-10-18 14:40
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0011_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='feed',
+            name='source',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, to='feeds.Source'),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='feed_url',
+            field=models.CharField(max_length=255, null=True, verbose_name='Normalized url to the xml feed'),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='fetch_status',
+            field=models.SmallIntegerField(choices=[(0, 'Failed'), (1, 'Done'), (2, 'Pending')], default=1, verbose_name='Fetch status'),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='etag',
+            field=models.CharField(max_length=255, null=True, verbose_name='ETag of the last fetch'),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='last_modified',
+            field=models.CharField(max_length=255, null=True, verbose_name='Last-Modified of the last fetch'),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='next_fetch_at',
+            field=models.DateTimeField(db_index=True, null=True, verbose_name='Next fetch at'),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='fetch_interval',
+            field=models.DurationField(default=datetime.timedelta(seconds=3600), verbose_name='Shortest fetch interval of subscribers'),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='adaptive_fetch_interval',
+            field=models.BooleanField(default=False, verbose_name='Adapt fetch interval to publish rate'),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='computed_fetch_interval',
+            field=models.DurationField(null=True, verbose_name='Computed fetch interval'),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='empty_fetches_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Consecutive fetches with nothing new'),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='max_entries',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Maximum entries stored per fetch'),
+        ),
+        migrations.AddField(
+            model_name='source',
+            name='feed',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sources', to='feeds.Feed', verbose_name='Feed'),
+        ),
+        migrations.CreateModel(
+            name='ReadMark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_marks', to='feeds.FeedEntry')),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_marks', to='feeds.Source')),
+            ],
+            options={
+                'verbose_name': 'Read mark',
+                'verbose_name_plural': 'Read marks',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='readmark',
+            constraint=models.UniqueConstraint(fields=('source', 'entry'), name='feeds_readmark_source_entry_uniq'),
+        ),
+    ]
@@ -0,0 +1,142 @@
+# Generated by Django 3.0.14 on 2026-10-18 14:40
+
+import datetime
+from collections import defaultdict
+from urllib.parse import urlsplit, urlunsplit
+
+from django.db import migrations
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    # copy of Feed.normalize_url at the time of the migration
+    url = url.strip()
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return url
+    netloc = parts.hostname
+    if parts.port and parts.port != DEFAULT_PORTS[scheme]:
+        netloc = f'{netloc}:{parts.port}'
+    if parts.username:
+        userinfo = parts.username + (f':{parts.password}' if parts.password else '')
+        netloc = f'{userinfo}@{netloc}'
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+def share_feeds(apps, schema_editor):
+    """
+    sources with the same normalized url get a single feed. The most recently refreshed feed is kept,
+    entries of the other ones are merged into it by guid hash. Read entries become read marks of their source,
+    and duplicate sources of a user are merged into the first one.
+    """
+    Source = apps.get_model('feeds', 'Source')
+    Feed = apps.get_model('feeds', 'Feed')
+    FeedEntry = apps.get_model('feeds', 'FeedEntry')
+    ReadMark = apps.get_model('feeds', 'ReadMark')
+
+    groups = defaultdict(list)
+    for source in Source.objects.select_related('fetch_interval').order_by('id'):
+        groups[normalize_url(source.url)].append(source)
+
+    for feed_url, sources in groups.items():
+        feeds = {feed.source_id: feed for feed in Feed.objects.filter(source__in=sources)}
+        read_entries = [
+            (source_id, entry_id)
+            for source_id, entry_id in FeedEntry.objects.filter(feed__source__in=sources, read=True).values_list(
+                'feed__source_id', 'id'
+            )
+        ]
+        Feed.objects.filter(id__in=[feed.id for feed in feeds.values()]).update(source=None)
+        if feeds:
+            canonical = max(feeds.values(), key=lambda feed: feed.updated_at)
+        else:
+            canonical = Feed.objects.create()
+
+        entry_ids = {}
+        canonical_entries = dict(FeedEntry.objects.filter(feed=canonical).values_list('guid_hash', 'id'))
+        for feed in feeds.values():
+            if feed.id == canonical.id:
+                continue
+            duplicate_ids = []
+            for entry_id, guid_hash in FeedEntry.objects.filter(feed=feed).values_list('id', 'guid_hash'):
+                if guid_hash in canonical_entries:
+                    entry_ids[entry_id] = canonical_entries[guid_hash]
+                    duplicate_ids.append(entry_id)
+                else:
+                    canonical_entries[guid_hash] = entry_id
+            FeedEntry.objects.filter(id__in=duplicate_ids).delete()
+            FeedEntry.objects.filter(feed=feed).update(feed=canonical)
+            feed.delete()
+
+        subscriptions = {}
+        kept_source_ids = {}
+        for source in sources:
+            kept_source_ids[source.id] = subscriptions.setdefault(source.user_id, source).id
+        ReadMark.objects.bulk_create(
+            [
+                ReadMark(source_id=kept_source_ids[source_id], entry_id=entry_ids.get(entry_id, entry_id))
+                for source_id, entry_id in read_entries
+            ],
+            ignore_conflicts=True,
+        )
+        Source.objects.filter(id__in=set(kept_source_ids) - set(kept_source_ids.values())).delete()
+
+        subscribers = list(subscriptions.values())
+        fetched_by = next((source for source in sources if feeds.get(source.id) == canonical), sources[0])
+        next_fetch_dates = [source.next_fetch_at for source in subscribers if source.next_fetch_at]
+        max_entries = [source.max_entries for source in subscribers]
+        canonical.source = None
+        canonical.feed_url = feed_url
+        canonical.fetch_status = fetched_by.fetch_status
+        canonical.etag = fetched_by.etag
+        canonical.last_modified = fetched_by.last_modified
+        canonical.computed_fetch_interval = fetched_by.computed_fetch_interval
+        canonical.empty_fetches_count = fetched_by.empty_fetches_count
+        canonical.next_fetch_at = min(next_fetch_dates, default=None)
+        canonical.fetch_interval = min(
+            datetime.timedelta(**{source.fetch_interval.period: source.fetch_interval.every}) for source in subscribers
+        )
+        canonical.adaptive_fetch_interval = all(source.adaptive_fetch_interval for source in subscribers)
+        canonical.max_entries = None if None in max_entries else max(max_entries)
+        canonical.save()
+        Source.objects.filter(id__in=[source.id for source in subscribers]).update(feed=canonical)
+
+
+def unshare_feeds(apps, schema_editor):
+    """
+    first source of a feed gets the feed with its entries and read state back,
+    other sources get an empty feed, filled by their next fetch.
+    """
+    Source = apps.get_model('feeds', 'Source')
+    Feed = apps.get_model('feeds', 'Feed')
+    FeedEntry = apps.get_model('feeds', 'FeedEntry')
+
+    Feed.objects.filter(sources__isnull=True).delete()
+    for feed in Feed.objects.all():
+        for index, source in enumerate(Source.objects.filter(feed=feed).order_by('id')):
+            if index == 0:
+                Feed.objects.filter(id=feed.id).update(source=source)
+                FeedEntry.objects.filter(feed=feed, read_marks__source=source).update(read=True)
+            else:
+                Feed.objects.create(source=source, title=feed.title, link=feed.link, url=feed.url)
+            Source.objects.filter(id=source.id).update(
+                fetch_status=feed.fetch_status,
+                etag=feed.etag if index == 0 else None,
+                last_modified=feed.last_modified if index == 0 else None,
+                next_fetch_at=feed.next_fetch_at,
+                computed_fetch_interval=feed.computed_fetch_interval,
+                empty_fetches_count=feed.empty_fetches_count,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0012_shared_feeds'),
+    ]
+
+    operations = [
+        migrations.RunPython(share_feeds, unshare_feeds),
+    ]
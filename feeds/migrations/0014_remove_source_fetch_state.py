@@ -0,0 +1,60 @@
+# Generated by Django 3.0.14 on 2026-10-18 14:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0013_shared_feeds_data'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='feed',
+            name='source',
+        ),
+        migrations.RemoveField(
+            model_name='feedentry',
+            name='read',
+        ),
+        migrations.RemoveField(
+            model_name='source',
+            name='computed_fetch_interval',
+        ),
+        migrations.RemoveField(
+            model_name='source',
+            name='empty_fetches_count',
+        ),
+        migrations.RemoveField(
+            model_name='source',
+            name='etag',
+        ),
+        migrations.RemoveField(
+            model_name='source',
+            name='fetch_status',
+        ),
+        migrations.RemoveField(
+            model_name='source',
+            name='last_modified',
+        ),
+        migrations.RemoveField(
+            model_name='source',
+            name='next_fetch_at',
+        ),
+        migrations.AlterField(
+            model_name='feed',
+            name='feed_url',
+            field=models.CharField(max_length=255, unique=True, verbose_name='Normalized url to the xml feed'),
+        ),
+        migrations.AlterField(
+            model_name='source',
+            name='feed',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='sources', to='feeds.Feed', verbose_name='Feed'),
+        ),
+        migrations.AddConstraint(
+            model_name='source',
+            constraint=models.UniqueConstraint(fields=('user', 'feed'), name='feeds_source_user_feed_uniq'),
+        ),
+    ]
@@ -1,9 +1,26 @@
+import hashlib
+import json
+import zlib
+from datetime import timedelta
+from itertools import islice
+from urllib.parse import urlsplit, urlunsplit
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.contrib.postgres.fields import JSONField
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.core.cache import cache
+from django.db import connection, models
+from django.db.models import Exists, OuterRef
+from django.db.models.signals import post_delete
+from django.db.models.sql import InsertQuery
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import gettext as _
 
-from feeds.parsers import RssAggregator
+from feeds.cache import PAYLOAD_ENTRIES_KEY, bump_feed_generation, bump_user_generation
+from feeds.metrics import count_entries_seen, measure_map
+from feeds.parsers import FetchResult, RssAggregator
 
 
 class TimestampedMixin(models.Model):
@@ -38,64 +55,136 @@ class RSSMixin(object):
 
 class Source(TimestampedMixin, RSSMixin):
     """
-    Source of RSS Feed.
+    Subscription of a user to a feed, holding its name and read state of the feed entries.
+    Subscriptions with the same normalized url share a single feed, which is fetched once for all of them.
 
-    @save: post_save signal to create django_celery_beat.PeriodicTask
-    with interval populated to the model instance.
+    @save: subscribes to the feed of the url and updates fetch policy of the feed.
+    Saving does not fetch the feed, see Feed.refresh.
     """
 
-    FETCH_FAILED = 0
-    FETCH_DONE = 1
-    FETCH_PENDING = 2
-    FETCH_CHOICES = [
-        (FETCH_FAILED, _("Failed")),
-        (FETCH_DONE, _("Done")),
-        (FETCH_PENDING, _("Pending")),
-    ]
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
     name = models.CharField(_("Name"), db_index=True, max_length=255)
     url = models.URLField(_("url to the xml feed"), db_index=True, max_length=255)
+    feed = models.ForeignKey("Feed", on_delete=models.PROTECT, related_name="sources", verbose_name=_("Feed"))
     fetch_interval = models.ForeignKey("django_celery_beat.IntervalSchedule", on_delete=models.PROTECT)
-    fetch_status = models.SmallIntegerField(_("Fetch status"), choices=FETCH_CHOICES, default=FETCH_DONE)
+    adaptive_fetch_interval = models.BooleanField(_("Adapt fetch interval to publish rate"), default=False)
+    max_entries = models.PositiveIntegerField(_("Maximum entries stored per fetch"), null=True, blank=True)
 
     class Meta:
         verbose_name = _("Source")
         verbose_name_plural = _("Sources")
+        constraints = [
+            models.UniqueConstraint(fields=["user", "feed"], name="feeds_source_user_feed_uniq"),
+        ]
 
     def __str__(self):
         return self.name
 
-    def _create_feed_data(self, aggregated_data):
-        result = {
-            "source_id": self.id,
-            "title": aggregated_data.title,
-            "link": aggregated_data.url,
-            "summary": aggregated_data.description,
-            "tag_line": aggregated_data.tagline,
-            "url": aggregated_data.guid or aggregated_data.url,
-            "published": aggregated_data.issued_parsed,
-            "modified": aggregated_data.modified_parsed,
-            "entries": aggregated_data.items,
-        }
-        return result
-
-    @property
-    def aggregated_data(self):
-        aggregated_data = self.get_aggregated_data(url=self.url)
-        return aggregated_data
-
-    def update_or_create_feed(self):
-        feed_data = self._create_feed_data(self.aggregated_data)
-        Feed.objects.update_or_create(source_id=self.id, defaults={**feed_data})
+    def get_fetch_interval(self) -> timedelta:
+        """
+        @return: interval chosen by the user
+        """
+        return timedelta(**{self.fetch_interval.period: self.fetch_interval.every})
 
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        previous_feed = None
+        if update_fields is None:
+            feed_url = Feed.normalize_url(self.url)
+            if self.feed_id is None or self.feed.feed_url != feed_url:
+                previous_feed = self.feed if self.feed_id else None
+                # a new feed is pending until its first fetch
+                self.feed = Feed.objects.get_or_create(
+                    feed_url=feed_url, defaults={"fetch_status": Feed.FETCH_PENDING}
+                )[0]
         super(Source, self).save(force_insert, force_update, using, update_fields)
-        if update_fields != ["fetch_status"]:
-            self.update_or_create_feed()
+        if update_fields is None:
+            if previous_feed is not None:
+                # read state of the previous feed is not meaningful anymore
+                self.read_marks.filter(entry__feed_id=previous_feed.id).delete()
+                previous_feed.update_subscriptions()
+            self.feed.update_subscriptions()
+            bump_user_generation(self.user_id)
+
+
+class FeedPayload(models.Model):
+    """
+    Raw entries of a feed as parsed by feedparser, zlib compressed json.
+    Payloads are addressed by digest of their content, so a refresh which did not change the feed writes nothing,
+    and feeds with identical content share a single payload.
+    """
+
+    digest = models.CharField(_("Content digest"), max_length=40, unique=True)
+    data = models.BinaryField(_("Compressed data"))
+    entries_count = models.PositiveIntegerField(_("Entries count"), default=0)
+    created_at = models.DateTimeField(_("Created at"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Feed payload")
+        verbose_name_plural = _("Feed payloads")
+
+    def __str__(self):
+        return self.digest
+
+    @staticmethod
+    def serialize(entries) -> bytes:
+        return json.dumps(entries, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+    @classmethod
+    def store(cls, entries):
+        """
+        @param entries: list of feedparser entries
+        @return: FeedPayload of the entries, created only if no payload has the same content yet
+        """
+        serialized = cls.serialize(entries)
+        digest = hashlib.sha1(serialized).hexdigest()
+        payload = cls.objects.filter(digest=digest).only("id", "digest").first()
+        if payload is None:
+            payload, _ = cls.objects.get_or_create(
+                digest=digest, defaults={"data": zlib.compress(serialized), "entries_count": len(entries)}
+            )
+        return payload
+
+    def load(self) -> list:
+        """
+        @return: list of raw entries
+        """
+        return json.loads(zlib.decompress(bytes(self.data)))
+
+    def load_cached(self) -> list:
+        """
+        load raw entries once per digest, decoded entries are kept in the cache for FEEDS_PAYLOAD_CACHE_TIMEOUT.
+        Content of a digest never changes, so they are never invalidated, and data is not read from the database
+        on a cache hit if it is deferred.
+        @return: list of raw entries
+        """
+        key = PAYLOAD_ENTRIES_KEY.format(self.digest)
+        entries = cache.get(key)
+        if entries is None:
+            entries = self.load()
+            cache.set(key, entries, timeout=settings.FEEDS_PAYLOAD_CACHE_TIMEOUT)
+        return entries
 
 
 class Feed(TimestampedMixin, RSSMixin):
-    source = models.OneToOneField(Source, on_delete=models.CASCADE)
+    """
+    Channel fetched from a single normalized url and shared by all its subscriptions.
+    Fetch policy follows the subscriptions: shortest interval chosen by subscribers, adaptive only if all of them
+    opted in, and the most entries any of them wants to store.
+    """
+
+    FETCH_FAILED = 0
+    FETCH_DONE = 1
+    FETCH_PENDING = 2
+    FETCH_CHOICES = [
+        (FETCH_FAILED, _("Failed")),
+        (FETCH_DONE, _("Done")),
+        (FETCH_PENDING, _("Pending")),
+    ]
+    FETCH_STATS_FIELDS = ["empty_fetches_count", "computed_fetch_interval", "next_fetch_at"]
+    FETCH_POLICY_FIELDS = ["fetch_interval", "adaptive_fetch_interval", "max_entries", "next_fetch_at"]
+    DEFAULT_PORTS = {"http": 80, "https": 443}
+
+    feed_url = models.CharField(_("Normalized url to the xml feed"), max_length=255, unique=True)
     title = models.CharField(_("Title"), db_index=True, max_length=255, null=True)
     link = models.URLField(_("Link"), db_index=True, max_length=255, null=True)
     summary = models.TextField(_("Summary"), null=True)
@@ -103,15 +192,211 @@ class Feed(TimestampedMixin, RSSMixin):
     url = models.CharField(_("Url"), max_length=512, null=True)
     published = models.DateTimeField(_("Publication date"), null=True)
     modified = models.DateTimeField(_("Modification date"), null=True)
-    entries = JSONField(_("Entries"), default=dict)
+    raw_payload = models.ForeignKey(
+        FeedPayload,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="feeds",
+        verbose_name=_("Raw entries"),
+    )
+    fetch_status = models.SmallIntegerField(_("Fetch status"), choices=FETCH_CHOICES, default=FETCH_DONE)
+    etag = models.CharField(_("ETag of the last fetch"), max_length=255, null=True)
+    last_modified = models.CharField(_("Last-Modified of the last fetch"), max_length=255, null=True)
+    next_fetch_at = models.DateTimeField(_("Next fetch at"), db_index=True, null=True)
+    fetch_interval = models.DurationField(_("Shortest fetch interval of subscribers"), default=timedelta(hours=1))
+    adaptive_fetch_interval = models.BooleanField(_("Adapt fetch interval to publish rate"), default=False)
+    computed_fetch_interval = models.DurationField(_("Computed fetch interval"), null=True)
+    empty_fetches_count = models.PositiveIntegerField(_("Consecutive fetches with nothing new"), default=0)
+    max_entries = models.PositiveIntegerField(_("Maximum entries stored per fetch"), null=True, blank=True)
 
     class Meta:
         verbose_name = _("Feed")
         verbose_name_plural = _("Feeds")
         ordering = ["-updated_at"]
+        indexes = [
+            # keyset pagination of feeds, see api.pagination.FeedPagination
+            models.Index(fields=["-updated_at", "-id"], name="feeds_feed_updated_id_idx"),
+        ]
 
     def __str__(self):
-        return f"{self.source.name} feed"
+        return self.title or self.feed_url
+
+    @classmethod
+    def normalize_url(cls, url) -> str:
+        """
+        @param url: url of the xml feed as given by the user
+        @return: url with lowercase scheme and host, without default port and fragment, other urls are only stripped
+        """
+        url = url.strip()
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in cls.DEFAULT_PORTS or not parts.hostname:
+            return url
+        netloc = parts.hostname
+        if parts.port and parts.port != cls.DEFAULT_PORTS[scheme]:
+            netloc = f"{netloc}:{parts.port}"
+        if parts.username:
+            userinfo = parts.username + (f":{parts.password}" if parts.password else "")
+            netloc = f"{userinfo}@{netloc}"
+        return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+    def _create_feed_data(self, aggregated_data):
+        result = {
+            "title": aggregated_data.title,
+            "link": aggregated_data.url,
+            "summary": aggregated_data.description,
+            "tag_line": aggregated_data.tagline,
+            "url": aggregated_data.guid or aggregated_data.url,
+            "published": aggregated_data.issued_parsed,
+            "modified": aggregated_data.modified_parsed,
+        }
+        return result
+
+    def fetch(self) -> FetchResult:
+        """
+        download and parse the feed once, conditionally on validators stored by the previous fetch.
+        """
+        return FetchResult.fetch(self.feed_url, etag=self.etag, modified=self.last_modified)
+
+    def refresh(self, fetch_result=None):
+        """
+        persist the feed and its entries from a single download.
+        updated_at is moved, and cached responses including the feed are invalidated,
+        only if the feed itself or any of its entries has changed.
+
+        @param fetch_result: FetchResult, the feed is fetched if not provided
+        @return: tuple of inserted and updated entries count, (0, 0) if the feed has not been modified
+        """
+        if fetch_result is None:
+            fetch_result = self.fetch()
+        if fetch_result.not_modified:
+            return 0, 0
+        with measure_map():
+            aggregated_data = fetch_result.aggregated_data
+            feed_data = self._create_feed_data(aggregated_data)
+        changed_fields = [field for field, value in feed_data.items() if getattr(self, field) != value]
+        for field in changed_fields:
+            setattr(self, field, feed_data[field])
+        self.etag = fetch_result.etag
+        self.last_modified = fetch_result.modified
+        # entries parsed by StreamingFeedParser are not kept in memory, so their raw copy is not stored
+        if isinstance(aggregated_data.items, list):
+            self.store_raw_entries(aggregated_data.items[: self.get_max_entries()])
+        inserted, updated = self.update_or_create_entries(aggregated_data, self.get_max_entries())
+        if changed_fields or inserted or updated:
+            changed_fields.append("updated_at")
+            bump_feed_generation(self.id)
+        self.save(update_fields=[*changed_fields, "etag", "last_modified"])
+        return inserted, updated
+
+    def update_subscriptions(self):
+        """
+        update fetch policy from subscriptions of the feed, a feed without subscriptions is deleted with its entries.
+        The next fetch is moved earlier if a subscriber wants the feed more often.
+        """
+        subscriptions = list(
+            self.sources.values_list(
+                "fetch_interval__every", "fetch_interval__period", "adaptive_fetch_interval", "max_entries"
+            ).distinct()
+        )
+        if not subscriptions:
+            self.delete()
+            return
+        self.fetch_interval = min(timedelta(**{period: every}) for every, period, _, _ in subscriptions)
+        self.adaptive_fetch_interval = all(adaptive for _, _, adaptive, _ in subscriptions)
+        max_entries = [max_entries for _, _, _, max_entries in subscriptions]
+        self.max_entries = None if None in max_entries else max(max_entries)
+        next_fetch_at = timezone.now() + self.get_fetch_interval()
+        if self.next_fetch_at is None or next_fetch_at < self.next_fetch_at:
+            self.next_fetch_at = next_fetch_at
+        self.save(update_fields=self.FETCH_POLICY_FIELDS)
+
+    def get_max_entries(self):
+        """
+        @return: maximum number of entries stored per fetch, None if not limited
+        """
+        return self.max_entries or settings.FEEDS_MAX_ENTRIES
+
+    def get_fetch_interval(self) -> timedelta:
+        """
+        @return: computed interval in adaptive mode, shortest interval chosen by subscribers otherwise
+        """
+        if self.adaptive_fetch_interval and self.computed_fetch_interval:
+            return self.computed_fetch_interval
+        return self.fetch_interval
+
+    def schedule_next_fetch(self, now=None):
+        self.next_fetch_at = (now or timezone.now()) + self.get_fetch_interval()
+
+    def compute_fetch_interval(self, published_dates) -> timedelta:
+        """
+        estimate how often the feed should be fetched, polling about twice per median gap between publications,
+        doubled for each consecutive fetch which found nothing new.
+        Shortest interval chosen by subscribers is the floor, FEEDS_ADAPTIVE_FETCH_INTERVAL_CEILING is the cap.
+
+        @param published_dates: publication dates of the most recent entries
+        @return: timedelta
+        """
+        floor = self.fetch_interval
+        ceiling = max(settings.FEEDS_ADAPTIVE_FETCH_INTERVAL_CEILING, floor)
+        published_dates = sorted(published_dates, reverse=True)
+        gaps = sorted(newer - older for newer, older in zip(published_dates, published_dates[1:]))
+        interval = gaps[len(gaps) // 2] / 2 if gaps else floor
+        interval *= 2 ** min(self.empty_fetches_count, 10)
+        return min(max(interval, floor), ceiling)
+
+    def record_fetch(self, inserted_count):
+        """
+        update empty fetches counter and, in adaptive mode, computed fetch interval and the next fetch.
+        Caller is responsible for saving FETCH_STATS_FIELDS.
+
+        @param inserted_count: number of entries inserted by the fetch
+        """
+        self.empty_fetches_count = 0 if inserted_count else self.empty_fetches_count + 1
+        if self.adaptive_fetch_interval:
+            published_dates = (
+                FeedEntry.objects.filter(feed_id=self.id, published__isnull=False)
+                .order_by("-published")
+                .values_list("published", flat=True)[: settings.FEEDS_ADAPTIVE_FETCH_INTERVAL_SAMPLE]
+            )
+            self.computed_fetch_interval = self.compute_fetch_interval(published_dates)
+            self.schedule_next_fetch()
+
+    def record_failure(self):
+        """
+        mark the feed failed and back off: a failed fetch counts as a fetch with nothing new, and the next fetch is
+        delayed by fetch interval doubled for each of them, up to FEEDS_ADAPTIVE_FETCH_INTERVAL_CEILING.
+        Failed feeds are still fetched, so they recover once their host is back.
+        Caller is responsible for saving fetch_status and FETCH_STATS_FIELDS.
+        """
+        self.fetch_status = self.FETCH_FAILED
+        self.empty_fetches_count += 1
+        interval = self.get_fetch_interval()
+        ceiling = max(settings.FEEDS_ADAPTIVE_FETCH_INTERVAL_CEILING, interval)
+        self.next_fetch_at = timezone.now() + min(interval * 2 ** min(self.empty_fetches_count, 10), ceiling)
+
+    def store_raw_entries(self, entries):
+        """
+        point the feed at payload of raw entries. Nothing is written if the entries have not changed,
+        a payload which is not used by any feed anymore is deleted.
+
+        @param entries: list of feedparser entries
+        """
+        payload = FeedPayload.store(entries)
+        if payload.id == self.raw_payload_id:
+            return
+        previous_payload_id = self.raw_payload_id
+        self.raw_payload = payload
+        Feed.objects.filter(id=self.id).update(raw_payload=payload)
+        if previous_payload_id:
+            FeedPayload.objects.filter(id=previous_payload_id, feeds__isnull=True).delete()
+
+    def get_raw_entries(self) -> list:
+        """
+        @return: list of raw entries stored by the last fetch which changed them
+        """
+        return self.raw_payload.load_cached() if self.raw_payload_id else []
 
     def _create_entry_data(self, aggregated_data):
         result = {
@@ -125,28 +410,72 @@ class Feed(TimestampedMixin, RSSMixin):
             "author": aggregated_data.author,
             "copyright": aggregated_data.copyright,
         }
+        result["guid_hash"] = FeedEntry.hash_values(result["url"] or result["link"] or result["title"])
+        result["content_hash"] = FeedEntry.hash_values(*[result[field] for field in FeedEntry.CONTENT_FIELDS])
         return result
 
-    def update_or_create_entries(self):
-        entry_obj_list = []
-        data = self.source.aggregated_data
-        feed_entries = data.items
-        for entry in feed_entries:
-            aggregated_data = self.get_aggregated_data(parsed_data=entry)
-            entry_data = self._create_entry_data(aggregated_data)
-            obj = FeedEntry(**entry_data)
-            entry_obj_list.append(obj)
-        if entry_obj_list:
-            FeedEntry.objects.bulk_create(entry_obj_list)
+    def update_or_create_entries(self, aggregated_data, max_entries=None):
+        """
+        insert entries which are new to the feed and update existing ones only if their content has changed.
+        Entries are mapped and persisted in batches of FEEDS_ENTRIES_BATCH_SIZE, so streamed entries are never
+        held in memory all at once.
 
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        super(Feed, self).save(force_insert, force_update, using, update_fields)
-        self.update_or_create_entries()
+        @param aggregated_data: RssAggregator of the whole feed, already fetched
+        @param max_entries: only this many entries, first in the document, are stored if provided
+        @return: tuple of inserted and updated entries count
+        """
+        inserted = updated = 0
+        items = islice(aggregated_data.items or [], max_entries)
+        while True:
+            entries_data = {}
+            with measure_map():
+                for entry in islice(items, settings.FEEDS_ENTRIES_BATCH_SIZE):
+                    entry_aggregated_data = self.get_aggregated_data(parsed_data=entry)
+                    entry_data = self._create_entry_data(entry_aggregated_data)
+                    entries_data[entry_data["guid_hash"]] = entry_data
+            count_entries_seen(len(entries_data))
+            if not entries_data:
+                return inserted, updated
+            batch_inserted, batch_updated = self._update_or_create_entries_batch(entries_data)
+            inserted += batch_inserted
+            updated += batch_updated
+
+    def _update_or_create_entries_batch(self, entries_data):
+        """
+        @param entries_data: dict of entry data keyed by guid hash
+        @return: tuple of inserted and updated entries count
+        """
+        existing = {
+            guid_hash: (entry_id, content_hash)
+            for guid_hash, entry_id, content_hash in FeedEntry.objects.filter(
+                feed_id=self.id, guid_hash__in=entries_data.keys()
+            ).values_list("guid_hash", "id", "content_hash")
+        }
+        new_obj_list = []
+        changed_obj_list = []
+        for guid_hash, entry_data in entries_data.items():
+            if guid_hash not in existing:
+                new_obj_list.append(FeedEntry(**entry_data))
+            elif existing[guid_hash][1] != entry_data["content_hash"]:
+                changed_obj_list.append(FeedEntry(id=existing[guid_hash][0], **entry_data))
+        inserted = FeedEntry.insert_ignoring_conflicts(new_obj_list) if new_obj_list else 0
+        if changed_obj_list:
+            FeedEntry.objects.bulk_update(changed_obj_list, FeedEntry.CONTENT_FIELDS + ["content_hash"])
+        if new_obj_list or changed_obj_list:
+            FeedEntry.objects.filter(
+                feed_id=self.id, guid_hash__in=[obj.guid_hash for obj in new_obj_list + changed_obj_list]
+            ).update(search_vector=FeedEntry.get_search_vector())
+        return inserted, len(changed_obj_list)
 
 
 class FeedEntry(models.Model):
+    """
+    Single item of the feed, identified within the feed by hash of its guid (or link, if guid is missing).
+    """
+
+    CONTENT_FIELDS = ["title", "link", "summary", "url", "published", "modified", "author", "copyright"]
+
     feed = models.ForeignKey(Feed, on_delete=models.CASCADE)
-    read = models.BooleanField(_("Has been read"), default=False)
     title = models.CharField(_("Title"), max_length=255, null=True)
     link = models.CharField(_("Link"), max_length=255, null=True)
     summary = models.TextField(_("Summary"), null=True)
@@ -155,10 +484,138 @@ class FeedEntry(models.Model):
     modified = models.DateTimeField(_("Modification date"), null=True)
     author = models.TextField(_("Author"), max_length=255, null=True)
     copyright = models.TextField(_("Copyright"), max_length=255, null=True)
+    guid_hash = models.CharField(_("Identity within the feed"), max_length=40)
+    content_hash = models.CharField(_("Content hash"), max_length=40, default="")
+    search_vector = SearchVectorField(_("Full text search document"), null=True)
 
     class Meta:
         verbose_name = _("Feed entry")
         verbose_name_plural = _("Feed entries")
+        constraints = [
+            models.UniqueConstraint(fields=["feed", "guid_hash"], name="feeds_feedentry_feed_guid_hash_uniq"),
+        ]
+        indexes = [
+            # keyset pagination of entries within user's feeds, see api.pagination.FeedEntryPagination
+            models.Index(fields=["feed", "-published", "-id"], name="feeds_entry_feed_pub_id_idx"),
+            GinIndex(fields=["search_vector"], name="feeds_entry_search_idx"),
+        ]
 
     def __str__(self):
-        return f"Entry {self.id} of {self.feed.source.name} source"
+        return f"Entry {self.id} of {self.feed} feed"
+
+    @staticmethod
+    def get_search_vector() -> SearchVector:
+        """
+        @return: expression of the full text search document, title ranks above summary, summary above author
+        """
+        config = settings.FEEDS_SEARCH_CONFIG
+        return (
+            SearchVector("title", weight="A", config=config)
+            + SearchVector("summary", weight="B", config=config)
+            + SearchVector("author", weight="C", config=config)
+        )
+
+    @classmethod
+    def insert_ignoring_conflicts(cls, objs) -> int:
+        """
+        same as bulk_create(objs, ignore_conflicts=True), but counts rows which have actually been inserted.
+        Entries a concurrent fetch of the same feed has inserted in the meantime are skipped and not counted.
+
+        @param objs: list of FeedEntry instances without primary keys
+        @return: number of inserted rows
+        """
+        fields = [field for field in cls._meta.concrete_fields if not isinstance(field, models.AutoField)]
+        query = InsertQuery(cls, ignore_conflicts=True)
+        query.insert_values(fields, objs)
+        inserted = 0
+        with connection.cursor() as cursor:
+            for sql, params in query.get_compiler(connection=connection).as_sql():
+                cursor.execute(sql, params)
+                inserted += cursor.rowcount
+        return inserted
+
+    @staticmethod
+    def hash_values(*values) -> str:
+        """
+        @param values: values of any type, None is hashed as an empty string
+        @return: sha1 hexdigest of joined values
+        """
+        joined = "\x1f".join("" if value is None else str(value) for value in values)
+        return hashlib.sha1(joined.encode("utf-8")).hexdigest()
+
+
+class ReadMark(models.Model):
+    """
+    read state of a feed entry within a subscription, entries without a mark are unread.
+    """
+
+    source = models.ForeignKey(Source, on_delete=models.CASCADE, related_name="read_marks")
+    entry = models.ForeignKey(FeedEntry, on_delete=models.CASCADE, related_name="read_marks")
+
+    class Meta:
+        verbose_name = _("Read mark")
+        verbose_name_plural = _("Read marks")
+        constraints = [
+            models.UniqueConstraint(fields=["source", "entry"], name="feeds_readmark_source_entry_uniq"),
+        ]
+
+    @classmethod
+    def is_read(cls) -> Exists:
+        """
+        @return: expression of the read state, for entries annotated with subscription_id of the user
+        """
+        return Exists(cls.objects.filter(source_id=OuterRef("subscription_id"), entry_id=OuterRef("pk")))
+
+    @classmethod
+    def mark_read(cls, user_id, entries) -> int:
+        """
+        mark entries read with a single INSERT ... SELECT statement.
+
+        @param user_id: id of the user
+        @param entries: FeedEntry queryset annotated with subscription_id of the user
+        @return: number of entries marked, entries which have already been read are not counted
+        """
+        bump_user_generation(user_id)
+        selected = entries.annotate(mark_entry_id=models.F("id")).values_list("subscription_id", "mark_entry_id")
+        sql, params = selected.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {cls._meta.db_table} (source_id, entry_id) {sql} ON CONFLICT DO NOTHING", params
+            )
+            return cursor.rowcount
+
+    @classmethod
+    def mark_unread(cls, user_id, entries) -> int:
+        """
+        mark entries unread with a single DELETE statement.
+
+        @param user_id: id of the user
+        @param entries: FeedEntry queryset
+        @return: number of entries marked, entries which have not been read are not counted
+        """
+        bump_user_generation(user_id)
+        deleted, _ = cls.objects.filter(source__user_id=user_id, entry_id__in=entries.values("id")).delete()
+        return deleted
+
+
+@receiver(post_delete, sender=Source)
+def update_unsubscribed_feed(sender, instance, **kwargs):
+    """
+    fetch policy of the feed follows its remaining subscriptions, a feed without subscriptions is deleted.
+    Also run for subscriptions deleted in bulk or by cascade, e.g. with their user.
+    """
+    # the feed is read again, as subscriptions deleted together share it and the first of them may delete it
+    feed = Feed.objects.filter(id=instance.feed_id).first()
+    if feed is not None:
+        feed.update_subscriptions()
+    bump_user_generation(instance.user_id)
+
+
+@receiver(post_delete, sender=Feed)
+def delete_unused_payload(sender, instance, **kwargs):
+    """
+    payload of a deleted feed is deleted too, unless another feed with the same entries still uses it.
+    Also run for feeds deleted in bulk, e.g. from the admin.
+    """
+    if instance.raw_payload_id:
+        FeedPayload.objects.filter(id=instance.raw_payload_id, feeds__isnull=True).delete()
@@ -0,0 +1,98 @@
+import logging
+
+from django.db import DatabaseError, transaction
+from django.db.migrations.operations.base import Operation
+
+logger = logging.getLogger()
+
+
+def pg_trgm_installed(connection) -> bool:
+    """
+    @param connection: database connection
+    @return: True if the database is postgres with pg_trgm extension installed
+    """
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+class CreatePgTrgmExtension(Operation):
+    """
+    installs pg_trgm if the database provides it and the user may install it.
+    Otherwise the migration goes on without it, trigram indexes are skipped and substring filters scan the table.
+    """
+
+    reversible = True
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql" or pg_trgm_installed(schema_editor.connection):
+            return
+        try:
+            # savepoint, so a failure does not break the rest of an atomic migration
+            with transaction.atomic(using=schema_editor.connection.alias):
+                schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except DatabaseError as e:
+            logger.warning("pg_trgm extension is not available, trigram indexes are skipped: %s", e)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        # other database objects may depend on the extension, so it is left installed
+        pass
+
+    def describe(self):
+        return "Creates pg_trgm extension if available"
+
+
+class CreateTrigramIndex(Operation):
+    """
+    GIN trigram index on UPPER(column), matching the expression Django uses for icontains lookups on postgres,
+    so '%...%' filters use the index instead of scanning the table. Built concurrently, skipped without pg_trgm.
+    The index is not part of model state, Django 3.0 indexes can not be defined on expressions.
+
+    @param model_name: name of the model
+    @param field_name: name of the text field
+    @param name: name of the index
+    """
+
+    reversible = True
+    reduces_to_sql = False
+
+    def __init__(self, model_name, field_name, name):
+        self.model_name = model_name
+        self.field_name = field_name
+        self.name = name
+
+    def deconstruct(self):
+        return (
+            self.__class__.__name__,
+            [],
+            {"model_name": self.model_name, "field_name": self.field_name, "name": self.name},
+        )
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not pg_trgm_installed(schema_editor.connection):
+            return
+        model = to_state.apps.get_model(app_label, self.model_name)
+        quote_name = schema_editor.quote_name
+        schema_editor.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON %s USING gin (UPPER(%s::text) gin_trgm_ops)"
+            % (
+                quote_name(self.name),
+                quote_name(model._meta.db_table),
+                quote_name(model._meta.get_field(self.field_name).column),
+            )
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            schema_editor.execute("DROP INDEX CONCURRENTLY IF EXISTS %s" % schema_editor.quote_name(self.name))
+
+    def describe(self):
+        return f"Creates trigram index {self.name} on {self.model_name}.{self.field_name}"
@@ -1,11 +1,19 @@
 import logging
+import time
+from io import BytesIO
 from time import mktime, struct_time
 from urllib.error import URLError
+from xml.etree import ElementTree
 
 import feedparser
 import pytz
+from django.conf import settings
 from django.utils import timezone
 from django.utils.translation import gettext_lazy
+from feedparser.datetimes import _parse_date
+from feedparser.sanitizer import _sanitize_html
+
+from feeds import metrics
 
 logger = logging.getLogger()
 
@@ -39,14 +47,16 @@ class RssAggregator(object):
         self.set_properties()
 
     @staticmethod
-    def parse(feed_url) -> feedparser.FeedParserDict:
+    def parse(feed_url, etag=None, modified=None) -> feedparser.FeedParserDict:
         """
         @param feed_url: valid rss source url.
-        @return: FeedParserDict
+        @param etag: ETag value returned by the previous fetch, sent as If-None-Match
+        @param modified: Last-Modified value returned by the previous fetch, sent as If-Modified-Since
+        @return: FeedParserDict, with status 304 and no entries if the feed has not changed
         @raise: URLError if parsed data is not available
         """
         try:
-            parsed_obj = feedparser.parse(feed_url)
+            parsed_obj = feedparser.parse(feed_url, etag=etag, modified=modified)
         except URLError as e:
             logger.error(gettext_lazy("Cannot fetch rss feed from source", exec=True))
             raise e
@@ -92,3 +102,240 @@ class RssAggregator(object):
                     attr_value = self.serialize_datetime(attr_value)
 
                 setattr(self, key, attr_value)
+
+
+class StreamingFeedParser(object):
+    """
+    incremental parser of large rss and atom documents.
+    Unlike feedparser.parse, entries are parsed one at a time while iterating over the parser,
+    and each element is discarded once mapped, so memory use does not grow with the number of entries.
+    @param body: raw document
+    """
+
+    ENTRY_TAGS = ["item", "entry"]
+    # element local name: feedparser key
+    TEXT_KEYS = {
+        "title": "title",
+        "link": "link",
+        "description": "summary",
+        "summary": "summary",
+        "content": "summary",
+        "subtitle": "subtitle",
+        "guid": "id",
+        "id": "id",
+        "pubDate": "published",
+        "published": "published",
+        "issued": "published",
+        "date": "published",
+        "updated": "updated",
+        "modified": "updated",
+        "lastBuildDate": "updated",
+        "author": "author",
+        "creator": "author",
+        "name": "author",
+        "rights": "rights",
+        "copyright": "rights",
+        "language": "language",
+    }
+    # feed level elements named differently than entry level ones
+    FEED_TAGS = {"description": "subtitle"}
+    # namespaces of mapped elements, elements of extensions like media rss are skipped, e.g. <media:content>
+    NAMESPACES = [
+        "",
+        "http://www.w3.org/2005/Atom",
+        "http://purl.org/atom/ns#",
+        "http://purl.org/rss/1.0/",
+        "http://my.netscape.com/rdf/simple/0.9/",
+        "http://purl.org/dc/elements/1.1/",
+        "http://purl.org/dc/terms/",
+        "http://www.itunes.com/dtds/podcast-1.0.dtd",
+    ]
+    DATE_KEYS = ["published", "updated"]
+    HTML_KEYS = ["summary", "subtitle"]
+
+    def __init__(self, body):
+        self.body = body
+
+    def parse(self) -> feedparser.FeedParserDict:
+        """
+        @return: FeedParserDict with feed metadata, and this parser as lazily parsed entries.
+        Documents which are not well-formed xml are parsed with feedparser, which is more forgiving.
+        """
+        try:
+            return feedparser.FeedParserDict(feed=self.parse_feed(), entries=self, bozo=0)
+        except ElementTree.ParseError:
+            return feedparser.parse(self.body)
+
+    def parse_feed(self) -> feedparser.FeedParserDict:
+        """
+        @return: FeedParserDict of the feed metadata, elements placed after the first entry are ignored
+        """
+        data = {}
+        path = []
+        for event, element in ElementTree.iterparse(BytesIO(self.body), events=("start", "end")):
+            tag = self.local_name(element.tag)
+            if event == "start":
+                if tag in self.ENTRY_TAGS:
+                    break
+                path.append(tag)
+                continue
+            path.pop()
+            # children of <rss><channel>, <rdf:RDF><channel> or <feed>, nested elements like <image><title> are skipped
+            if path in (["feed"], ["rss", "channel"], ["RDF", "channel"]):
+                self.set_value(data, self.FEED_TAGS.get(tag, tag), element)
+        return self.finish(data)
+
+    def __iter__(self):
+        parents = []
+        entry = None
+        entry_depth = 0
+        try:
+            for event, element in ElementTree.iterparse(BytesIO(self.body), events=("start", "end")):
+                tag = self.local_name(element.tag)
+                if event == "start":
+                    parents.append(element)
+                    if entry is None and tag in self.ENTRY_TAGS:
+                        entry = {}
+                        entry_depth = len(parents)
+                    continue
+                parents.pop()
+                if entry is None:
+                    continue
+                # only children of the entry are mapped, nested elements like <source><title> are skipped,
+                # except for <author><name> of atom entries
+                depth = len(parents) - entry_depth
+                if depth < 0:
+                    yield self.finish(entry)
+                    entry = None
+                    element.clear()
+                    if parents:
+                        parents[-1].remove(element)
+                elif depth == 0 or (depth == 1 and tag == "name" and self.local_name(parents[-1].tag) == "author"):
+                    self.set_value(entry, tag, element)
+        except ElementTree.ParseError as e:
+            # entries before the malformed part are kept, as feedparser does for bozo documents
+            logger.warning("Feed document is not well-formed: %s", e)
+
+    @staticmethod
+    def local_name(tag) -> str:
+        return tag.rsplit("}", 1)[-1]
+
+    @staticmethod
+    def namespace(tag) -> str:
+        return tag[1:].split("}", 1)[0] if tag.startswith("{") else ""
+
+    def set_value(self, data, tag, element):
+        if self.namespace(element.tag) not in self.NAMESPACES:
+            return
+        if tag == "link" and element.get("href"):
+            if element.get("rel", "alternate") == "alternate":
+                data.setdefault("link", element.get("href"))
+            return
+        key = self.TEXT_KEYS.get(tag)
+        if key and key not in data:
+            data[key] = (element.text or "").strip()
+
+    def finish(self, data) -> feedparser.FeedParserDict:
+        for key in self.HTML_KEYS:
+            if data.get(key):
+                data[key] = _sanitize_html(data[key], "utf-8", "text/html")
+        for key in self.DATE_KEYS:
+            if data.get(key):
+                data[f"{key}_parsed"] = _parse_date(data[key])
+        data.setdefault("title", None)
+        data.setdefault("link", None)
+        return feedparser.FeedParserDict(data)
+
+
+class FetchResult(object):
+    """
+    outcome of a single feed download.
+    The feed is downloaded and parsed once, then the same result is used to persist feed and its entries.
+    @param parsed_data: feedparser.FeedParserDict data
+    """
+
+    NOT_MODIFIED = 304
+
+    def __init__(self, parsed_data):
+        self.parsed_data = parsed_data
+        self.status = parsed_data.get("status")
+        self.etag = parsed_data.get("etag")
+        self.modified = parsed_data.get("modified")
+        self._aggregated_data = None
+
+    @classmethod
+    def from_response(cls, status, headers, body):
+        """
+        build result from a response downloaded outside of feedparser, e.g. by AsyncFeedFetcher.
+        Bodies larger than FEEDS_STREAMING_THRESHOLD are parsed with StreamingFeedParser.
+
+        @param status: http status code
+        @param headers: http response headers
+        @param body: raw response body
+        @return: FetchResult
+        """
+        headers = {key.lower(): value for key, value in headers.items()}
+        if status == cls.NOT_MODIFIED:
+            parsed_data = feedparser.FeedParserDict(entries=[])
+        elif len(body) > settings.FEEDS_STREAMING_THRESHOLD:
+            parsed_data = StreamingFeedParser(body).parse()
+        else:
+            parsed_data = feedparser.parse(body, response_headers=headers)
+        parsed_data["status"] = status
+        parsed_data["etag"] = headers.get("etag")
+        parsed_data["modified"] = headers.get("last-modified")
+        return cls(parsed_data)
+
+    @classmethod
+    def fetch(cls, feed_url, etag=None, modified=None):
+        """
+        @param feed_url: valid rss source url.
+        @param etag: ETag value returned by the previous fetch
+        @param modified: Last-Modified value returned by the previous fetch
+        @return: FetchResult
+        @raise: URLError if the feed could not be downloaded or the server responded with an error status,
+        the same as download_feed and AsyncFeedFetcher
+        """
+        start = time.perf_counter()
+        outcome = metrics.ERROR
+        try:
+            parsed_data = RssAggregator.parse(feed_url, etag=etag, modified=modified)
+            if parsed_data.get("status", 0) >= 400:
+                raise URLError(f"{feed_url} responded with {parsed_data.status}")
+            fetch_result = cls(parsed_data)
+            outcome = metrics.NOT_MODIFIED if fetch_result.not_modified else metrics.OK
+            return fetch_result
+        finally:
+            metrics.observe_download(time.perf_counter() - start, outcome=outcome)
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == self.NOT_MODIFIED
+
+    @property
+    def aggregated_data(self) -> RssAggregator:
+        if self._aggregated_data is None:
+            self._aggregated_data = RssAggregator(self.parsed_data)
+        return self._aggregated_data
+
+
+def parse_response(status, headers, body) -> FetchResult:
+    """
+    parse and map a downloaded response.
+    Module level function, so CPU bound parsing may be handed over to a process pool.
+
+    @param status: http status code
+    @param headers: http response headers
+    @param body: raw response body
+    @return: FetchResult with aggregated_data already mapped
+    """
+    start = time.perf_counter()
+    outcome = metrics.ERROR
+    try:
+        fetch_result = FetchResult.from_response(status, headers, body)
+        if not fetch_result.not_modified:
+            fetch_result._aggregated_data = RssAggregator(fetch_result.parsed_data)
+        outcome = metrics.NOT_MODIFIED if fetch_result.not_modified else metrics.OK
+        return fetch_result
+    finally:
+        metrics.PARSE_SECONDS.labels(outcome).observe(time.perf_counter() - start)
@@ -0,0 +1,159 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger()
+
+PROFILE_ID_RE = re.compile(r"^\d+-\d+-[a-z]+$")
+
+
+class ProfileStore(object):
+    """
+    bounded ring buffer of profiles on disk, shared by web and worker processes through PROFILE_DIR.
+    Each profile is a pstats file with a JSON file of its metadata next to it,
+    the oldest profiles are removed once there are more than max_profiles of them.
+
+    @param directory: directory of profiles, PROFILE_DIR by default
+    @param max_profiles: number of profiles kept, PROFILE_MAX_FILES by default
+    """
+
+    def __init__(self, directory=None, max_profiles=None):
+        self.directory = directory or settings.PROFILE_DIR
+        self.max_profiles = max_profiles or settings.PROFILE_MAX_FILES
+
+    def get_path(self, profile_id, extension="prof") -> str:
+        """
+        @raise: ValueError if profile_id is not an id of a profile, so it can not point outside of the directory
+        """
+        if not PROFILE_ID_RE.match(profile_id):
+            raise ValueError(f"Invalid profile id {profile_id}")
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def save(self, profiler, info) -> str:
+        """
+        @param profiler: cProfile.Profile, disabled
+        @param info: dict of metadata, kind of the profiled run is a part of the id
+        @return: id of the saved profile
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        # ids are ordered by time, pid keeps them unique across processes
+        profile_id = f"{time.time_ns()}-{os.getpid()}-{info['kind']}"
+        profiler.dump_stats(self.get_path(profile_id))
+        # metadata is written last and atomically, so listed profiles are complete
+        temp_path = self.get_path(profile_id, "json.tmp")
+        with open(temp_path, "w") as f:
+            json.dump({"id": profile_id, **info}, f)
+        os.replace(temp_path, self.get_path(profile_id, "json"))
+        self.prune()
+        return profile_id
+
+    def get_ids(self) -> list:
+        """
+        @return: ids of saved profiles, newest first
+        """
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        ids = [name[: -len(".json")] for name in names if name.endswith(".json")]
+        return sorted((profile_id for profile_id in ids if PROFILE_ID_RE.match(profile_id)), reverse=True)
+
+    def list(self) -> list:
+        """
+        @return: list of metadata dicts of saved profiles, newest first
+        """
+        profiles = []
+        for profile_id in self.get_ids():
+            try:
+                with open(self.get_path(profile_id, "json")) as f:
+                    profiles.append(json.load(f))
+            except FileNotFoundError:
+                # removed by another process in the meantime
+                continue
+        return profiles
+
+    def prune(self):
+        for profile_id in self.get_ids()[self.max_profiles :]:
+            for extension in ("json", "prof"):
+                try:
+                    os.remove(self.get_path(profile_id, extension))
+                except FileNotFoundError:
+                    pass
+
+
+class ProfiledRun(object):
+    """
+    metadata of a profiled block: wall time, and number of queries and time spent in them.
+    """
+
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+        self.id = None
+        self.queries = 0
+        self.sql_seconds = 0
+        self.seconds = 0
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_seconds += time.perf_counter() - start
+
+    def get_info(self) -> dict:
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "created_at": time.time(),
+            "seconds": self.seconds,
+            "queries": self.queries,
+            "sql_seconds": self.sql_seconds,
+        }
+
+
+@contextmanager
+def profile(kind, name, store=None):
+    """
+    profile the block with cProfile and save the profile to the store, also if the block raises.
+    A profile which can not be saved is only logged, so profiling never fails the profiled work.
+
+    @param kind: short lowercase word, e.g. "request" or "fetch"
+    @param name: what was profiled, e.g. method and path of a request
+    @return: yields ProfiledRun, its id is set once the profile is saved
+    """
+    run = ProfiledRun(kind, name)
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    with connection.execute_wrapper(run.execute):
+        profiler.enable()
+        try:
+            yield run
+        finally:
+            profiler.disable()
+            run.seconds = time.perf_counter() - start
+            try:
+                run.id = (store or ProfileStore()).save(profiler, run.get_info())
+            except OSError as e:
+                logger.warning("Profile of %s could not be saved: %s", name, e)
+
+
+@contextmanager
+def profile_sampled(fraction, kind, name):
+    """
+    profile the block with the given probability, see profile
+    """
+    if not fraction or random.random() >= fraction:
+        yield None
+        return
+    with profile(kind, name) as run:
+        yield run
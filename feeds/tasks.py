@@ -1,33 +1,179 @@
+import base64
+import logging
 from urllib.error import URLError
 
 from celery import task
 from celery.exceptions import MaxRetriesExceededError
+from django.conf import settings
 from django.db import transaction
+from django.utils import timezone
 
-from feeds.models import Source
+from feeds import metrics
+from feeds.fetchers import AsyncFeedFetcher
+from feeds.models import Feed
+from feeds.parsers import parse_response
+from feeds.profiling import profile_sampled
+
+logger = logging.getLogger()
 
 
 class FetchFeedTask(task.Task):
     default_retry_delay = 5 * 60  # retry task every 5 minutes
 
-    def run_task_operations(self, source):
-        source.update_or_create_feed()
-        source.fetch_status = source.FETCH_DONE
-        source.save(update_fields=["fetch_status"])
+    def run_task_operations(self, feed, fetch_result=None):
+        """
+        @return: tuple of inserted and updated entries count
+        """
+        if fetch_result is None:
+            fetch_result = feed.fetch()
+        with metrics.FetchMetrics.collect() as fetch_metrics:
+            inserted, updated = feed.refresh(fetch_result)
+            feed.record_fetch(inserted)
+            feed.fetch_status = feed.FETCH_DONE
+            feed.save(update_fields=["fetch_status", *feed.FETCH_STATS_FIELDS])
+            fetch_metrics.entries_inserted, fetch_metrics.entries_updated = inserted, updated
+            if fetch_result.not_modified:
+                fetch_metrics.outcome = metrics.NOT_MODIFIED
+        return inserted, updated
+
+    @staticmethod
+    def mark_failed(feed):
+        """
+        give up on the current refresh of the feed, it is fetched again later, see Feed.record_failure
+        """
+        metrics.FAILURES.inc()
+        feed.record_failure()
+        feed.save(update_fields=["fetch_status", *feed.FETCH_STATS_FIELDS])
 
-    def run(self, source_id, *args, **kwargs):
-        if source_id:
-            source = Source.objects.get(id=source_id)
-            source.fetch_status = source.FETCH_PENDING
-            source.save(update_fields=["fetch_status"])
+    def run(self, feed_id, *args, **kwargs):
+        if feed_id:
+            feed = Feed.objects.get(id=feed_id)
+            feed.fetch_status = feed.FETCH_PENDING
+            feed.save(update_fields=["fetch_status"])
             try:
-                with transaction.atomic():
-                    self.run_task_operations(source)
+                with profile_sampled(settings.FEEDS_PROFILE_FETCH_FRACTION, "fetch", feed.feed_url):
+                    with transaction.atomic():
+                        self.run_task_operations(feed)
             except (TypeError, URLError) as exc:
+                if self.max_retries is None or self.request.retries < self.max_retries:
+                    metrics.RETRIES.inc()
                 try:
-                    raise self.retry((source_id,), exc=exc)
+                    raise self.retry((feed_id,), exc=exc)
                 except MaxRetriesExceededError:
-                    source.fetch_status = source.FETCH_FAILED
-                    source.save(update_fields=["fetch_status"])
+                    self.mark_failed(feed)
                     return False
+            except Exception:
+                logger.exception("Feed %s could not be refreshed", feed.feed_url)
+                self.mark_failed(feed)
+                return False
             return True
+
+
+class FetchFeedsBatchTask(FetchFeedTask):
+    """
+    Refresh many feeds at once, downloading them concurrently in a single worker process.
+    If FEEDS_PARSE_QUEUE is set, downloaded bodies are parsed and persisted by ParseFeedTask on that queue,
+    so download and parse workers can be sized separately. Otherwise they are parsed here.
+    Feeds which could not be downloaded or mapped are handed over to FetchFeedTask and its retries,
+    feeds which failed for any other reason, e.g. a field too long for its column, are marked failed.
+    Each feed is persisted in its own savepoint, so a failure never stops the rest of the batch.
+    """
+
+    def run(self, feed_ids, *args, **kwargs):
+        feeds = Feed.objects.filter(id__in=feed_ids)
+        feeds.update(fetch_status=Feed.FETCH_PENDING)
+        if settings.FEEDS_PARSE_QUEUE:
+            return self.hand_over_to_parse_queue(AsyncFeedFetcher().download_many(feeds))
+
+        done_count = 0
+        for feed, fetch_result in AsyncFeedFetcher().fetch_many(feeds):
+            try:
+                if isinstance(fetch_result, Exception):
+                    raise fetch_result
+                with transaction.atomic():
+                    self.run_task_operations(feed, fetch_result)
+            except (TypeError, URLError):
+                metrics.RETRIES.inc()
+                FetchFeedTask().apply_async((feed.id,), countdown=self.default_retry_delay)
+            except Exception:
+                logger.exception("Feed %s could not be refreshed", feed.feed_url)
+                self.mark_failed(feed)
+            else:
+                done_count += 1
+        return done_count
+
+    def hand_over_to_parse_queue(self, responses):
+        queued_count = 0
+        for feed, response in responses:
+            if isinstance(response, URLError):
+                metrics.RETRIES.inc()
+                FetchFeedTask().apply_async((feed.id,), countdown=self.default_retry_delay)
+                continue
+            status, headers, body = response
+            # bodies are base64 encoded, as the default json serializer can not carry bytes
+            ParseFeedTask().apply_async(
+                (feed.id, status, headers, base64.b64encode(body).decode("ascii")),
+                queue=settings.FEEDS_PARSE_QUEUE,
+            )
+            queued_count += 1
+        return queued_count
+
+
+class ParseFeedTask(FetchFeedTask):
+    """
+    Parse stage of FetchFeedsBatchTask, parses and persists a single downloaded body.
+    The feed is marked failed instead of left pending if it can not be persisted.
+    """
+
+    def run(self, feed_id, status, headers, body, *args, **kwargs):
+        feed = Feed.objects.get(id=feed_id)
+        try:
+            fetch_result = parse_response(status, headers, base64.b64decode(body))
+            with transaction.atomic():
+                self.run_task_operations(feed, fetch_result)
+        except TypeError:
+            metrics.RETRIES.inc()
+            FetchFeedTask().apply_async((feed.id,), countdown=self.default_retry_delay)
+            return False
+        except Exception:
+            logger.exception("Feed %s could not be refreshed", feed.feed_url)
+            self.mark_failed(feed)
+            return False
+        return True
+
+
+class DispatchDueSourcesTask(task.Task):
+    """
+    Single periodic sweeper which replaces per-source periodic tasks.
+    Claims feeds due for a refresh in batches and dispatches each batch to FetchFeedsBatchTask.
+    A feed is claimed once, no matter how many sources subscribe to it.
+    Locked rows are skipped, so several sweepers may run at once without dispatching a feed twice.
+    """
+
+    def claim_due_feeds(self, batch_size) -> list:
+        """
+        @param batch_size: maximum number of feeds to claim
+        @return: list of claimed feed ids, their next fetch is moved forward by their fetch interval
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            feeds = list(
+                Feed.objects.select_for_update(skip_locked=True)
+                .only("id", "fetch_interval", "adaptive_fetch_interval", "computed_fetch_interval")
+                .filter(next_fetch_at__lte=now)
+                .order_by("next_fetch_at")[:batch_size]
+            )
+            for feed in feeds:
+                feed.schedule_next_fetch(now)
+            Feed.objects.bulk_update(feeds, ["next_fetch_at"])
+        return [feed.id for feed in feeds]
+
+    def run(self, *args, **kwargs):
+        dispatched_count = 0
+        while dispatched_count < settings.FEEDS_SWEEP_MAX_SOURCES:
+            feed_ids = self.claim_due_feeds(settings.FEEDS_SWEEP_BATCH_SIZE)
+            if not feed_ids:
+                break
+            FetchFeedsBatchTask().apply_async((feed_ids,))
+            dispatched_count += len(feed_ids)
+        return dispatched_count
@@ -1,15 +1,37 @@
 from unittest import mock
 
+import fakeredis
 import pytz
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.utils import timezone
 from django_celery_beat.models import IntervalSchedule
+from django_redis.pool import ConnectionFactory
 
 from django_rss_scraper.celery import app
 from feeds.parsers import RssAggregator
 
 
+def run_on_commit_immediately():
+    """
+    TestCase never commits its transaction, so run transaction.on_commit callbacks right away instead.
+    """
+    return mock.patch("django.db.transaction.on_commit", side_effect=lambda func: func())
+
+
+class FakeRedisConnectionFactory(ConnectionFactory):
+    """
+    connects the shared cache to an in-process stand-in for redis, common to the whole test run.
+    """
+
+    server = fakeredis.FakeServer()
+
+    def get_connection(self, params):
+        return fakeredis.FakeStrictRedis(server=self.server)
+
+
 class FeedsTestHelper(object):
     def create_source_data(self, **kwargs):
         data = {
@@ -21,12 +43,18 @@ class FeedsTestHelper(object):
         return data
 
 
+@override_settings(CACHES=settings.CACHES, DJANGO_REDIS_CONNECTION_FACTORY="feeds.tests.FakeRedisConnectionFactory")
 class BaseTestCase(TestCase, FeedsTestHelper):
+    def setUp(self) -> None:
+        super(BaseTestCase, self).setUp()
+        cache.clear()
+
     @classmethod
     @mock.patch("django.utils.timezone.now")
     def setUpTestData(cls, mock_timezone):
         # set Celery tasks to be synchronous
         app.conf.task_always_eager = True
+        app.conf.task_eager_propagates = True
         cls.fixture_path = "feeds/tests/fixtures/Algemeen.xml"
         # mock timezone.now
         target = timezone.datetime(2010, 1, 1).replace(tzinfo=pytz.UTC)
@@ -0,0 +1,52 @@
+"""
+Benchmarks, skipped unless FEEDS_BENCHMARK is set:
+
+    FEEDS_BENCHMARK=1 python manage.py test feeds.tests.benchmarks
+
+Results of each benchmark are merged into the JSON file at FEEDS_BENCHMARK_OUTPUT, benchmark-results.json by default,
+together with versions of the environment, so runs of different releases can be compared.
+"""
+
+import json
+import os
+import platform
+import resource
+import sys
+import unittest
+from datetime import datetime
+
+import django
+import feedparser
+
+benchmark = unittest.skipUnless(os.environ.get("FEEDS_BENCHMARK"), "set FEEDS_BENCHMARK=1 to run benchmarks")
+
+
+def get_peak_rss() -> int:
+    """
+    @return: highest resident set size of this process so far, in bytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def record_results(name, results):
+    """
+    @param name: name of the benchmark, its previous results in the output file are replaced
+    @param results: json serializable results
+    """
+    path = os.environ.get("FEEDS_BENCHMARK_OUTPUT", "benchmark-results.json")
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data["environment"] = {
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "feedparser": feedparser.__version__,
+        "platform": platform.platform(),
+    }
+    data.setdefault("benchmarks", {})[name] = {"recorded_at": datetime.utcnow().isoformat(), "results": results}
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
@@ -0,0 +1,73 @@
+import random
+from datetime import datetime, timedelta
+from email.utils import format_datetime
+from xml.sax.saxutils import escape
+
+import pytz
+
+WORDS = "feed entry news world market sport weather science policy travel music film city report".split()
+
+
+def _text(rng, words_count) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words_count))
+
+
+def generate_entries(entries_count, seed=0, summary_words=60) -> list:
+    """
+    @param entries_count: number of entries
+    @param seed: entries of the same seed are the same, so refetched feeds are unchanged
+    @param summary_words: length of summaries, which carry a bit of html like real feeds do
+    @return: list of dicts of entry fields, newest first
+    """
+    rng = random.Random(seed)
+    published = datetime(2020, 1, 1, tzinfo=pytz.UTC)
+    entries = []
+    for num in range(entries_count):
+        entries.append(
+            {
+                "guid": f"https://example.com/{seed}/entries/{num}",
+                "title": _text(rng, 8).capitalize(),
+                "summary": f"<p>{_text(rng, summary_words)}</p><p><a href='https://example.com/'>more</a></p>",
+                "author": f"{_text(rng, 1)}@example.com",
+                "published": published - timedelta(minutes=30 * num),
+            }
+        )
+    return entries
+
+
+def generate_rss(entries_count, seed=0, summary_words=60) -> bytes:
+    """
+    @return: RSS 2.0 document
+    """
+    items = "".join(
+        f"<item><title>{escape(entry['title'])}</title><link>{entry['guid']}</link>"
+        f"<guid>{entry['guid']}</guid><description>{escape(entry['summary'])}</description>"
+        f"<author>{entry['author']}</author><pubDate>{format_datetime(entry['published'])}</pubDate></item>"
+        for entry in generate_entries(entries_count, seed, summary_words)
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+        f"<title>Synthetic feed {seed}</title><link>https://example.com/{seed}</link>"
+        f"<description>{entries_count} synthetic entries</description>{items}</channel></rss>"
+    ).encode("utf-8")
+
+
+def generate_atom(entries_count, seed=0, summary_words=60) -> bytes:
+    """
+    @return: Atom 1.0 document
+    """
+    entries = "".join(
+        f"<entry><title>{escape(entry['title'])}</title><link href='{entry['guid']}'/><id>{entry['guid']}</id>"
+        f"<summary type='html'>{escape(entry['summary'])}</summary><author><email>{entry['author']}</email></author>"
+        f"<published>{entry['published'].isoformat()}</published><updated>{entry['published'].isoformat()}</updated>"
+        "</entry>"
+        for entry in generate_entries(entries_count, seed, summary_words)
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?><feed xmlns="http://www.w3.org/2005/Atom">'
+        f"<title>Synthetic feed {seed}</title><link href='https://example.com/{seed}'/><id>urn:synthetic:{seed}</id>"
+        f"<updated>2020-01-01T00:00:00+00:00</updated>{entries}</feed>"
+    ).encode("utf-8")
+
+
+GENERATORS = {"rss": generate_rss, "atom": generate_atom}
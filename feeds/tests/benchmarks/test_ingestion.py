@@ -0,0 +1,149 @@
+import functools
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from urllib.error import URLError
+
+from django.db import connection
+
+from feeds.models import Feed, FeedEntry
+from feeds.parsers import RssAggregator
+from feeds.tasks import FetchFeedTask
+from feeds.tests import BaseTestCase
+from feeds.tests.benchmarks import benchmark, get_peak_rss, record_results
+from feeds.tests.benchmarks.synthetic import GENERATORS, generate_rss
+from feeds.tests.server import FeedServer
+
+
+class StageTimer(object):
+    """
+    time spent in stages of FetchFeedTask: download and feedparser in RssAggregator.parse, mapping of the feed and
+    its entries, and execution of SQL statements. Time left is spent in the ORM and the task itself.
+    """
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.queries_count = 0
+
+    def timed(self, stage, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.seconds[stage] += time.perf_counter() - start
+
+        return wrapper
+
+    def execute(self, execute, sql, params, many, context):
+        self.queries_count += 1
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds["db"] += time.perf_counter() - start
+
+    @contextmanager
+    def measure(self):
+        parse, set_properties, create_entry_data = (
+            RssAggregator.parse,
+            RssAggregator.set_properties,
+            Feed._create_entry_data,
+        )
+        RssAggregator.parse = staticmethod(self.timed("parse", parse))
+        RssAggregator.set_properties = self.timed("map", set_properties)
+        Feed._create_entry_data = self.timed("map", create_entry_data)
+        try:
+            with connection.execute_wrapper(self.execute):
+                yield self
+        finally:
+            RssAggregator.parse = staticmethod(parse)
+            RssAggregator.set_properties = set_properties
+            Feed._create_entry_data = create_entry_data
+
+
+@benchmark
+class IngestionBenchmark(BaseTestCase):
+    """
+    full FetchFeedTask path against synthetic feeds served by a local http server.
+    Every size and format is fetched twice, the second pass finds the same entries and writes nothing new.
+    Validated and failing fetches are measured separately.
+
+    FEEDS_BENCHMARK_FEEDS: feeds fetched per scenario, 20 by default
+    FEEDS_BENCHMARK_SIZES: comma separated entries counts per feed, 10,100,1000 by default
+    FEEDS_BENCHMARK_LATENCY: seconds the server waits before each response, 0 by default
+
+    Peak RSS is the high-water mark of the test process, so scenarios go from the smallest feeds to the largest.
+    """
+
+    FEEDS = int(os.environ.get("FEEDS_BENCHMARK_FEEDS", 20))
+    SIZES = [int(size) for size in os.environ.get("FEEDS_BENCHMARK_SIZES", "10,100,1000").split(",")]
+    LATENCY = float(os.environ.get("FEEDS_BENCHMARK_LATENCY", 0))
+
+    def create_feeds(self, server, paths) -> list:
+        Feed.objects.all().delete()
+        feeds = Feed.objects.bulk_create(Feed(feed_url=server.url(path.lstrip("/"))) for path in paths)
+        return [feed.id for feed in feeds]
+
+    def run_scenario(self, name, feed_ids, bytes_count):
+        """
+        @param bytes_count: bytes of documents served to all feeds of the scenario
+        @return: dict of measurements
+        """
+        timer = StageTimer()
+        entries_count = FeedEntry.objects.count()
+        failed = 0
+        start = time.perf_counter()
+        with timer.measure():
+            for feed_id in feed_ids:
+                # tasks called directly raise errors instead of retrying them
+                try:
+                    FetchFeedTask().run(feed_id)
+                except URLError:
+                    failed += 1
+        elapsed = time.perf_counter() - start
+        stages = {stage: round(seconds, 6) for stage, seconds in timer.seconds.items()}
+        stages["other"] = round(elapsed - sum(timer.seconds.values()), 6)
+        result = {
+            "scenario": name,
+            "feeds": len(feed_ids),
+            "failed": failed,
+            "seconds": round(elapsed, 6),
+            "feeds_per_second": round(len(feed_ids) / elapsed, 2),
+            "bytes": bytes_count,
+            "entries_inserted": FeedEntry.objects.count() - entries_count,
+            "stages_seconds": stages,
+            "queries_per_fetch": round(timer.queries_count / len(feed_ids), 2),
+            "peak_rss_bytes": get_peak_rss(),
+        }
+        print(
+            f"\n{name}: {result['feeds_per_second']} feeds/s, {result['queries_per_fetch']} queries per fetch, "
+            f"stages {stages}"
+        )
+        return result
+
+    def test_ingestion(self):
+        results = []
+        for size in self.SIZES:
+            for feed_format, generate in GENERATORS.items():
+                bodies = {f"/{feed_format}/{size}/{num}.xml": generate(size, seed=num) for num in range(self.FEEDS)}
+                bytes_count = sum(len(body) for body in bodies.values())
+                with FeedServer(bodies.get, latency=self.LATENCY) as server:
+                    feed_ids = self.create_feeds(server, bodies)
+                    results.append(self.run_scenario(f"{feed_format}-{size}-new", feed_ids, bytes_count))
+                    results.append(self.run_scenario(f"{feed_format}-{size}-unchanged", feed_ids, bytes_count))
+                self.assertEqual(results[-2]["entries_inserted"], self.FEEDS * size)
+                self.assertEqual(results[-1]["entries_inserted"], 0)
+
+        with FeedServer(generate_rss(self.SIZES[0]), latency=self.LATENCY, etag='"v1"') as server:
+            feed_ids = self.create_feeds(server, [f"{num}.xml" for num in range(self.FEEDS)])
+            self.run_scenario("warm-up", feed_ids, 0)
+            results.append(self.run_scenario("not-modified", feed_ids, 0))
+        with FeedServer(b"", latency=self.LATENCY, status=500) as server:
+            feed_ids = self.create_feeds(server, [f"{num}.xml" for num in range(self.FEEDS)])
+            results.append(self.run_scenario("error", feed_ids, 0))
+        self.assertEqual(results[-1]["failed"], self.FEEDS)
+
+        record_results("ingestion", results)
@@ -0,0 +1,91 @@
+import time
+
+from django.db.models import F
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.renderers import CompactJSONRenderer
+from api.serializers import FeedEntriesSetSerializer
+from feeds.models import Feed, FeedEntry, ReadMark, Source
+from feeds.tests import BaseTestCase
+from feeds.tests.benchmarks import benchmark, record_results
+from feeds.views import FeedEntryViewSet
+
+
+@benchmark
+class SerializerBenchmark(BaseTestCase):
+    """
+    rows/sec of a page of entries, from the query to rendered bytes, in the default and the compact format.
+    """
+
+    ROWS = 10000
+    ROUNDS = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        feed = Feed.objects.create(feed_url="https://google.com/", title="benchmark")
+        source = Source.objects.create(
+            name="benchmark", url=feed.feed_url, fetch_interval=cls.first_interval, user=cls.user
+        )
+        entries = FeedEntry.objects.bulk_create(
+            FeedEntry(
+                feed=feed,
+                guid_hash=FeedEntry.hash_values(num),
+                title=f"entry {num}",
+                link=f"https://google.com/{num}",
+                summary="summary " * 20,
+                author="author",
+            )
+            for num in range(cls.ROWS)
+        )
+        ReadMark.objects.bulk_create(ReadMark(source=source, entry=entry) for entry in entries[::2])
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.request = Request(APIRequestFactory().get("/api/feed-entries/"))
+        self.queryset = (
+            FeedEntry.objects.defer("search_vector")
+            .filter(feed__sources__user_id=self.user.id)
+            .annotate(subscription_id=F("feed__sources__id"), read=ReadMark.is_read())
+            .order_by("-published", "-id")
+        )
+
+    def render_serializer(self) -> bytes:
+        page = list(self.queryset[: self.ROWS])
+        data = FeedEntriesSetSerializer(page, many=True, context={"request": self.request}).data
+        return JSONRenderer().render(data)
+
+    def render_compact(self) -> bytes:
+        names, lookups = zip(*FeedEntryViewSet.compact_fields)
+        page = self.queryset.values_list(*lookups)[: self.ROWS]
+        return CompactJSONRenderer().render([dict(zip(names, row)) for row in page])
+
+    def measure(self, render) -> float:
+        """
+        @return: rows per second of the best round
+        """
+        timings = []
+        for _ in range(self.ROUNDS):
+            start = time.perf_counter()
+            render()
+            timings.append(time.perf_counter() - start)
+        return self.ROWS / min(timings)
+
+    def test_rows_per_second(self):
+        serializer_rate = self.measure(self.render_serializer)
+        compact_rate = self.measure(self.render_compact)
+        print(
+            f"\n{self.ROWS} entries: serializer {serializer_rate:.0f} rows/s, compact {compact_rate:.0f} rows/s, "
+            f"{compact_rate / serializer_rate:.1f}x"
+        )
+        self.assertGreater(compact_rate, serializer_rate)
+        record_results(
+            "serializers",
+            {
+                "rows": self.ROWS,
+                "serializer_rows_per_second": round(serializer_rate),
+                "compact_rows_per_second": round(compact_rate),
+            },
+        )
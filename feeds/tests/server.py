@@ -0,0 +1,72 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FeedServer(object):
+    """
+    local http stand-in for remote rss sources, serving the same document under every path.
+    Supports ETag validation, artificial latency and tracks how many requests were in flight at once.
+
+    @param body: bytes of the served document, or callable returning bytes of the document for a request path
+    @param latency: seconds to wait before responding
+    @param etag: ETag header value, requests with matching If-None-Match get 304
+    @param status: status code of responses other than 304
+    """
+
+    def __init__(self, body, latency=0, etag=None, status=200):
+        self.body = body
+        self.latency = latency
+        self.etag = etag
+        self.status = status
+        self.requests_count = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def url(self, path="feed.xml"):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/{path}"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.requests_count += 1
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    if server.latency:
+                        time.sleep(server.latency)
+                    if server.etag and self.headers.get("If-None-Match") == server.etag:
+                        self.send_response(304)
+                        self.end_headers()
+                        return
+                    body = server.body(self.path) if callable(server.body) else server.body
+                    self.send_response(server.status)
+                    self.send_header("Content-Type", "application/rss+xml; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    if server.etag:
+                        self.send_header("ETag", server.etag)
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
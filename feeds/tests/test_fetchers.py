@@ -0,0 +1,183 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+from unittest import mock
+from urllib.error import URLError
+
+from django.core.management import call_command
+
+from feeds.fetchers import AsyncFeedFetcher, download_feed
+from feeds.models import Feed, FeedEntry, Source
+from feeds.tasks import FetchFeedsBatchTask, ParseFeedTask
+from feeds.tests import BaseTestCase
+from feeds.tests.server import FeedServer
+
+
+class FeedServerTestCase(BaseTestCase):
+    def setUp(self) -> None:
+        super(FeedServerTestCase, self).setUp()
+        with open(self.fixture_path, "rb") as f:
+            self.body = f.read()
+
+    def create_sources(self, server, count):
+        sources = []
+        for num in range(count):
+            source_data = self.create_source_data(
+                name=f"source_{num}", fetch_interval=self.first_interval, url=server.url(f"feed_{num}.xml")
+            )
+            sources.append(Source.objects.create(**source_data))
+        return sources
+
+
+class AsyncFeedFetcherTestCase(FeedServerTestCase):
+    def test_fetch_many_concurrently(self):
+        with FeedServer(self.body, latency=0.1) as server:
+            feeds = [Feed(feed_url=server.url(f"feed_{num}.xml")) for num in range(20)]
+            fetcher = AsyncFeedFetcher(concurrency=10, per_host_concurrency=5)
+            start = time.monotonic()
+            results = fetcher.fetch_many(feeds)
+            elapsed = time.monotonic() - start
+
+        self.assertEqual(server.requests_count, 20)
+        self.assertLessEqual(server.max_in_flight, 5)
+        # 20 downloads of 0.1s each, 5 at a time
+        self.assertLess(elapsed, 20 * 0.1 / 2)
+        for feed, fetch_result in results:
+            self.assertEqual(fetch_result.status, 200)
+            self.assertEqual(len(fetch_result.aggregated_data.items), 10)
+
+    def test_fetch_many_parse_executor(self):
+        with FeedServer(self.body, latency=0.05) as server, ProcessPoolExecutor(2) as executor:
+            feeds = [Feed(feed_url=server.url(f"feed_{num}.xml")) for num in range(10)]
+            results = AsyncFeedFetcher(concurrency=5).fetch_many(feeds, parse_executor=executor)
+        for feed, fetch_result in results:
+            self.assertEqual(fetch_result.aggregated_data.title, self.aggregated_data.title)
+            self.assertEqual(len(fetch_result.aggregated_data.items), 10)
+
+    def test_fetch_many_errors(self):
+        with FeedServer(self.body, status=500) as server:
+            results = AsyncFeedFetcher().fetch_many([Feed(feed_url=server.url())])
+        self.assertIsInstance(results[0][1], URLError)
+
+    def test_fetch_many_not_a_feed(self):
+        def body(path):
+            return b"<html><body>Log in</body></html>" if path.endswith("feed_1.xml") else self.body
+
+        with FeedServer(body) as server, ProcessPoolExecutor(2) as executor:
+            feeds = [Feed(feed_url=server.url(f"feed_{num}.xml")) for num in range(3)]
+            for parse_executor in [None, executor]:
+                with self.subTest(parse_executor=parse_executor):
+                    results = AsyncFeedFetcher().fetch_many(feeds, parse_executor=parse_executor)
+                    self.assertIsInstance(results[1][1], Exception)
+                    self.assertEqual([len(results[num][1].aggregated_data.items) for num in [0, 2]], [10, 10])
+
+    def test_batch_task(self):
+        with FeedServer(self.body, etag='"v1"') as server:
+            sources = self.create_sources(server, 5)
+            self.assertEqual(FetchFeedsBatchTask().run([source.feed_id for source in sources]), 5)
+            self.assertEqual(FeedEntry.objects.count(), 5 * 10)
+            self.assertFalse(Feed.objects.exclude(fetch_status=Feed.FETCH_DONE).exists())
+
+            # validators are sent, unchanged feeds are not rewritten
+            requests_count = server.requests_count
+            FeedEntry.objects.all().delete()
+            self.assertEqual(FetchFeedsBatchTask().run([source.feed_id for source in sources]), 5)
+            self.assertEqual(server.requests_count, requests_count + 5)
+            self.assertFalse(FeedEntry.objects.exists())
+
+    def test_batch_task_feed_errors(self):
+        # an entry title too long for its column fails only the feed it belongs to
+        too_long = self.body.replace(b"Shell schrapt 7.000 tot 9.000 banen", b"x" * 300, 1)
+
+        def body(path):
+            return too_long if path.endswith("feed_1.xml") else self.body
+
+        for parse_queue in [None, "feeds.parse"]:
+            with self.subTest(parse_queue=parse_queue), self.settings(FEEDS_PARSE_QUEUE=parse_queue):
+                Source.objects.all().delete()
+                Feed.objects.all().delete()
+                with FeedServer(body) as server, mock.patch(
+                    "feeds.tasks.ParseFeedTask.apply_async", side_effect=ParseFeedTask().apply_async
+                ):
+                    sources = self.create_sources(server, 3)
+                    FetchFeedsBatchTask().run([source.feed_id for source in sources])
+                statuses = {source.feed_id: Feed.objects.get(id=source.feed_id).fetch_status for source in sources}
+                self.assertEqual(
+                    [statuses[source.feed_id] for source in sources],
+                    [Feed.FETCH_DONE, Feed.FETCH_FAILED, Feed.FETCH_DONE],
+                )
+                self.assertEqual(FeedEntry.objects.count(), 2 * 10)
+
+    @mock.patch("feeds.tasks.ParseFeedTask.apply_async", side_effect=ParseFeedTask().apply_async)
+    def test_batch_task_parse_queue(self, mock_apply_async):
+        with FeedServer(self.body) as server, self.settings(FEEDS_PARSE_QUEUE="feeds.parse"):
+            sources = self.create_sources(server, 3)
+            self.assertEqual(FetchFeedsBatchTask().run([source.feed_id for source in sources]), 3)
+        self.assertEqual(mock_apply_async.call_count, 3)
+        self.assertEqual(mock_apply_async.call_args[1]["queue"], "feeds.parse")
+        self.assertEqual(FeedEntry.objects.count(), 3 * 10)
+        self.assertFalse(Feed.objects.exclude(fetch_status=Feed.FETCH_DONE).exists())
+
+    def test_download_feed(self):
+        with FeedServer(self.body, etag='"v1"') as server:
+            status, headers, body = download_feed(Feed(feed_url=server.url()))
+            self.assertEqual((status, headers["ETag"], body), (200, '"v1"', self.body))
+            status, headers, body = download_feed(Feed(feed_url=server.url(), etag='"v1"'))
+            self.assertEqual((status, body), (304, b""))
+        with FeedServer(self.body, status=500) as server, self.assertRaises(URLError):
+            download_feed(Feed(feed_url=server.url()))
+
+
+class FetchFeedsCommandTestCase(FeedServerTestCase):
+    def test_fetch_feeds(self):
+        for mode in ["async", "threads"]:
+            with self.subTest(mode=mode), FeedServer(self.body, etag='"v1"') as server:
+                sources = self.create_sources(server, 4)
+                stdout = StringIO()
+                call_command("fetch_feeds", mode=mode, concurrency=2, batch_size=3, stdout=stdout)
+                report = stdout.getvalue()
+                self.assertEqual(server.requests_count, 4)
+                self.assertEqual(FeedEntry.objects.count(), 4 * 10)
+                self.assertFalse(Feed.objects.exclude(fetch_status=Feed.FETCH_DONE).exists())
+                self.assertIn("Fetched 4 feeds", report)
+                self.assertIn(f"Downloaded {4 * len(self.body)} bytes", report)
+                self.assertIn("Entries inserted: 40, updated: 0", report)
+                self.assertIn("Latency per feed: p50", report)
+
+                # only the selected feed, which has not changed since
+                call_command("fetch_feeds", feed_ids=[sources[0].feed_id], mode=mode, stdout=stdout)
+                self.assertEqual(server.requests_count, 5)
+                self.assertIn("Feeds not modified: 1, failed: 0", stdout.getvalue())
+                Source.objects.all().delete()
+                Feed.objects.all().delete()
+
+    def test_fetch_feeds_failed(self):
+        with FeedServer(self.body, status=500) as server:
+            self.create_sources(server, 2)
+            stdout = StringIO()
+            call_command("fetch_feeds", "--due", stdout=stdout)
+            self.assertEqual(server.requests_count, 0)
+            call_command("fetch_feeds", stdout=stdout)
+        self.assertIn("Fetched 2 feeds", stdout.getvalue())
+        self.assertIn("failed: 2", stdout.getvalue())
+        self.assertFalse(Feed.objects.filter(fetch_status=Feed.FETCH_DONE).exists())
+
+    def test_fetch_feeds_not_persisted(self):
+        bodies = {
+            "feed_0.xml": b"<html><body>Log in</body></html>",
+            "feed_1.xml": self.body.replace(b"Shell schrapt 7.000 tot 9.000 banen", b"x" * 300, 1),
+        }
+
+        def body(path):
+            return bodies.get(path.rsplit("/", 1)[-1], self.body)
+
+        for mode in ["async", "threads"]:
+            with self.subTest(mode=mode), FeedServer(body) as server:
+                self.create_sources(server, 3)
+                stdout = StringIO()
+                call_command("fetch_feeds", mode=mode, stdout=stdout)
+                self.assertIn("Fetched 3 feeds", stdout.getvalue())
+                self.assertIn("failed: 2", stdout.getvalue())
+                self.assertEqual(FeedEntry.objects.count(), 10)
+                Source.objects.all().delete()
+                Feed.objects.all().delete()
@@ -0,0 +1,126 @@
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from django.utils import timezone
+
+from feeds.importers import SubscriptionsImport, parse_csv, parse_opml, parse_subscriptions
+from feeds.models import Feed, Source
+from feeds.tests import BaseTestCase
+
+OPML = """<?xml version="1.0" encoding="UTF-8"?>
+<opml version="1.0">
+  <head><title>subscriptions</title></head>
+  <body>
+    <outline text="News" title="News">
+      <outline type="rss" text="First" title="First feed" xmlUrl="https://google.com/first.xml"/>
+      <outline type="rss" text="Second" xmlUrl="https://google.com/second.xml"/>
+    </outline>
+    <outline text="no feed" htmlUrl="https://google.com/"/>
+  </body>
+</opml>
+"""
+
+
+class ParseSubscriptionsTestCase(BaseTestCase):
+    def test_opml(self):
+        expected = [("First feed", "https://google.com/first.xml"), ("Second", "https://google.com/second.xml")]
+        self.assertEqual(parse_opml(OPML.encode("utf-8")), expected)
+        self.assertEqual(parse_subscriptions(f"\n{OPML}"), expected)
+        with self.assertRaises(ValueError):
+            parse_opml("<opml><body>")
+
+    def test_csv(self):
+        content = "﻿Name,URL\nfirst,https://google.com/first.xml\n,https://google.com/second.xml\nempty,\n"
+        expected = [("first", "https://google.com/first.xml"), ("", "https://google.com/second.xml")]
+        self.assertEqual(parse_csv(content.encode("utf-8")), expected)
+        self.assertEqual(parse_subscriptions(content.encode("utf-8")), expected)
+        self.assertEqual(parse_csv("url\nhttps://google.com/\n"), [(None, "https://google.com/")])
+        with self.assertRaises(ValueError):
+            parse_csv("name,link\nfirst,https://google.com/\n")
+
+
+class SubscriptionsImportTestCase(BaseTestCase):
+    def test_import(self):
+        shared = Source.objects.create(
+            **self.create_source_data(
+                url="https://google.com/shared", fetch_interval=self.first_interval, user=self.user_second
+            )
+        )
+        Source.objects.create(
+            **self.create_source_data(url="https://google.com/own", user=self.user, fetch_interval=self.first_interval)
+        )
+        Feed.objects.filter(id=shared.feed_id).update(
+            fetch_interval=timedelta(days=1), adaptive_fetch_interval=True, max_entries=5, next_fetch_at=None
+        )
+        failed = Source.objects.create(
+            **self.create_source_data(
+                url="https://google.com/failed", fetch_interval=self.first_interval, user=self.user_second
+            )
+        )
+        Feed.objects.filter(id=failed.feed_id).update(
+            fetch_status=Feed.FETCH_FAILED, next_fetch_at=timezone.now() + timedelta(days=1)
+        )
+        items = [
+            ("first", "https://google.com/1"),
+            ("first again", "HTTPS://google.com:443/1"),
+            ("", "https://google.com/2"),
+            ("own", "https://google.com/own"),
+            ("shared", "https://google.com/shared"),
+            ("failed", "https://google.com/failed"),
+            ("invalid", "not a url"),
+        ]
+        now = timezone.now()
+        with override_settings(FEEDS_IMPORT_STAGGER=timedelta(minutes=10)):
+            result = SubscriptionsImport(self.user, self.first_interval).run(items)
+        self.assertEqual(result, {"created": 4, "duplicates": 1, "already_subscribed": 1, "invalid": ["not a url"]})
+        sources = Source.objects.filter(user=self.user).select_related("feed").order_by("id")
+        self.assertEqual(
+            [(source.name, source.feed.feed_url) for source in sources[1:]],
+            [
+                ("first", "https://google.com/1"),
+                ("https://google.com/2", "https://google.com/2"),
+                ("shared", "https://google.com/shared"),
+                ("failed", "https://google.com/failed"),
+            ],
+        )
+        # new feeds are pending, their first fetches are spread over the stagger window
+        new_feeds = [source.feed for source in sources[1:3]]
+        self.assertEqual({feed.fetch_status for feed in new_feeds}, {Feed.FETCH_PENDING})
+        self.assertLess(new_feeds[0].next_fetch_at, now + timedelta(minutes=1))
+        self.assertEqual(new_feeds[1].next_fetch_at - new_feeds[0].next_fetch_at, timedelta(minutes=5))
+        # shared feed follows the policy of the new subscription
+        shared_feed = Feed.objects.get(id=shared.feed_id)
+        self.assertEqual(shared_feed.fetch_interval, self.first_interval.schedule.run_every)
+        self.assertFalse(shared_feed.adaptive_fetch_interval)
+        self.assertIsNone(shared_feed.max_entries)
+        self.assertIsNotNone(shared_feed.next_fetch_at)
+        # backed off failed feed is fetched right away for the new subscriber
+        self.assertLessEqual(Feed.objects.get(id=failed.feed_id).next_fetch_at, timezone.now())
+
+    def test_queries(self):
+        items = [(f"feed {num}", f"https://google.com/{num}") for num in range(2000)]
+        # subscribed, existing feeds, feeds insert, feed ids and sources insert, in a savepoint
+        with self.assertNumQueries(7), override_settings(FEEDS_IMPORT_BATCH_SIZE=2000):
+            result = SubscriptionsImport(self.user, self.first_interval).run(items)
+        self.assertEqual(result["created"], 2000)
+        self.assertEqual(Feed.objects.filter(fetch_status=Feed.FETCH_PENDING).count(), 2000)
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".opml", delete=False) as document:
+            document.write(OPML)
+        self.addCleanup(os.remove, document.name)
+        stdout = StringIO()
+        call_command(
+            "import_sources", document.name, user=self.user.username, every=30, period="minutes", stdout=stdout
+        )
+        self.assertIn("Created 2 sources", stdout.getvalue())
+        self.assertEqual(
+            set(Source.objects.filter(user=self.user).values_list("fetch_interval__every", "fetch_interval__period")),
+            {(30, "minutes")},
+        )
+        with self.assertRaises(CommandError):
+            call_command("import_sources", document.name, user="nobody")
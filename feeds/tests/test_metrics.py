@@ -0,0 +1,101 @@
+import os
+import tempfile
+from unittest import mock
+from urllib.error import URLError
+
+from celery.exceptions import MaxRetriesExceededError, Retry
+from prometheus_client import REGISTRY
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from feeds import metrics
+from feeds.models import Feed, Source
+from feeds.tasks import FetchFeedsBatchTask, FetchFeedTask
+from feeds.tests import BaseTestCase
+from feeds.tests.server import FeedServer
+
+
+class MetricsTestCase(APITestCase, BaseTestCase):
+    def setUp(self) -> None:
+        super(MetricsTestCase, self).setUp()
+        source_data = self.create_source_data(fetch_interval=self.first_interval, url=self.fixture_path)
+        self.feed = Source.objects.create(**source_data).feed
+
+    def get_samples(self, *samples) -> list:
+        """
+        @param samples: tuples of sample name and labels
+        @return: current values of samples, 0 for samples not observed yet
+        """
+        return [REGISTRY.get_sample_value(name, labels) or 0 for name, labels in samples]
+
+    def assertIncreased(self, samples, increments, func):
+        before = self.get_samples(*samples)
+        func()
+        after = self.get_samples(*samples)
+        self.assertEqual([value - previous for value, previous in zip(after, before)], increments)
+
+    def test_fetch_feed(self):
+        ok = {"outcome": metrics.OK}
+        samples = [
+            ("feeds_fetch_download_seconds_count", ok),
+            ("feeds_fetch_map_seconds_count", ok),
+            ("feeds_fetch_db_seconds_count", ok),
+            ("feeds_fetches_total", ok),
+            ("feeds_fetch_entries_total", {"state": "seen"}),
+            ("feeds_fetch_entries_total", {"state": "inserted"}),
+            ("feeds_fetch_entries_total", {"state": "updated"}),
+        ]
+        self.assertIncreased(samples, [1, 1, 1, 1, 10, 10, 0], lambda: FetchFeedTask().run(self.feed.id))
+        self.assertIncreased(samples, [1, 1, 1, 1, 10, 0, 0], lambda: FetchFeedTask().run(self.feed.id))
+
+    @mock.patch("feeds.parsers.RssAggregator.parse", side_effect=URLError("down"))
+    def test_fetch_feed_retries(self, mock_parse):
+        samples = [
+            ("feeds_fetch_download_seconds_count", {"outcome": metrics.ERROR}),
+            ("feeds_fetch_retries_total", {}),
+            ("feeds_fetch_failures_total", {}),
+        ]
+
+        def fetch():
+            with self.assertRaises(Retry):
+                FetchFeedTask().run(self.feed.id)
+
+        with mock.patch.object(FetchFeedTask, "retry", side_effect=Retry):
+            self.assertIncreased(samples, [1, 1, 0], fetch)
+
+        # the last retry
+        task = FetchFeedTask()
+        task.push_request(retries=task.max_retries)
+        self.addCleanup(task.pop_request)
+        with mock.patch.object(FetchFeedTask, "retry", side_effect=MaxRetriesExceededError):
+            self.assertIncreased(samples, [1, 0, 1], lambda: task.run(self.feed.id))
+        self.assertEqual(Feed.objects.get(id=self.feed.id).fetch_status, Feed.FETCH_FAILED)
+
+    def test_batch_task(self):
+        with open(self.fixture_path, "rb") as f:
+            body = f.read()
+        with FeedServer(body, etag='"v1"') as server:
+            Feed.objects.filter(id=self.feed.id).update(feed_url=server.url())
+            samples = [
+                ("feeds_fetch_download_seconds_count", {"outcome": metrics.OK}),
+                ("feeds_fetch_body_bytes_sum", {"outcome": metrics.OK}),
+                ("feeds_fetch_parse_seconds_count", {"outcome": metrics.OK}),
+                ("feeds_fetch_download_seconds_count", {"outcome": metrics.NOT_MODIFIED}),
+                ("feeds_fetches_total", {"outcome": metrics.NOT_MODIFIED}),
+            ]
+            self.assertIncreased(samples, [1, len(body), 1, 0, 0], lambda: FetchFeedsBatchTask().run([self.feed.id]))
+            self.assertIncreased(samples, [0, 0, 0, 1, 1], lambda: FetchFeedsBatchTask().run([self.feed.id]))
+
+    def test_metrics_view(self):
+        FetchFeedTask().run(self.feed.id)
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(b'feeds_fetches_total{outcome="ok"}', response.content)
+
+        # metrics of all processes are read from the shared directory
+        with tempfile.TemporaryDirectory() as directory, mock.patch.dict(
+            os.environ, {"PROMETHEUS_MULTIPROC_DIR": directory}
+        ):
+            self.assertIsNot(metrics.get_registry(), REGISTRY)
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
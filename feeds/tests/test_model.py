@@ -1,8 +1,14 @@
+from datetime import timedelta
 from unittest import mock
 
-from django_celery_beat.models import PeriodicTask
+import feedparser
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils import timezone
+from django_celery_beat.models import IntervalSchedule, PeriodicTask
 
-from feeds.models import Feed, Source
+from feeds.models import Feed, FeedEntry, FeedPayload, ReadMark, Source
+from feeds.operations import pg_trgm_installed
 from feeds.tests import BaseTestCase
 
 
@@ -11,32 +17,213 @@ class ModelTestCase(BaseTestCase):
         super(ModelTestCase, self).setUp()
         self.source_data = self.create_source_data(fetch_interval=self.first_interval, url=self.fixture_path)
 
-    @mock.patch("feeds.models.Source.update_or_create_feed")
-    def test_source_model_creation(self, mocked):
-        mocked.return_value = True
+    @mock.patch("feeds.parsers.RssAggregator.parse")
+    def test_source_model_creation(self, mock_parse):
         self.source = Source.objects.create(**self.source_data)
         self.assertEqual(Source.objects.count(), 1)
+        # saving subscribes to the feed without fetching it
+        mock_parse.assert_not_called()
+        self.assertEqual(self.source.feed.fetch_status, Feed.FETCH_PENDING)
+        self.assertFalse(FeedEntry.objects.exists())
 
     def test_source_model_chain_creation(self):
         self.source = Source.objects.create(**self.source_data)
+        self.source.feed.refresh()
         self.assertEqual(Source.objects.count(), 1)
         self.assertEqual(Feed.objects.count(), 1)
         self.assertEqual(Feed.objects.first().feedentry_set.count(), 10)
 
-    @mock.patch("feeds.signals.save_source")
-    @mock.patch("feeds.models.Source.update_or_create_feed")
-    def test_source_post_save_signal(self, mocked, mocked_signal):
-        mocked.return_value = True
+    @mock.patch("feeds.parsers.RssAggregator.parse")
+    def test_source_model_single_download(self, mock_parse):
+        mock_parse.return_value = self.parsed_data
         source = Source.objects.create(**self.source_data)
-        self.assertEqual(Source.objects.count(), 1)
+        source.feed.refresh()
+        self.assertEqual(mock_parse.call_count, 1)
+        self.assertEqual(source.feed.feedentry_set.count(), 10)
+
+        # persisting an already fetched result does not download the feed again
+        source.feed.refresh(source.feed.fetch())
+        self.assertEqual(mock_parse.call_count, 2)
+
+    def test_source_next_fetch_scheduling(self):
+        source = Source.objects.create(**self.source_data)
+        feed = source.feed
+        self.assertAlmostEqual(feed.next_fetch_at, source.updated_at + timedelta(hours=1), delta=timedelta(seconds=5))
+
+        # status updates done by fetches do not move the schedule
+        next_fetch_at = feed.next_fetch_at
+        feed.fetch_status = feed.FETCH_PENDING
+        feed.save(update_fields=["fetch_status"])
+        feed.refresh_from_db()
+        self.assertEqual(feed.next_fetch_at, next_fetch_at)
+        self.assertFalse(PeriodicTask.objects.filter(task="feeds.tasks.FetchFeedTask").exists())
+
+    def test_source_model_idempotent_entries(self):
+        source = Source.objects.create(**self.source_data)
+        feed = source.feed
+        feed.refresh()
+        self.assertEqual(FeedEntry.objects.filter(feed=feed).count(), 10)
+        ReadMark.objects.bulk_create(ReadMark(source=source, entry=entry) for entry in feed.feedentry_set.all())
+
+        # unchanged document neither inserts nor updates anything
+        self.assertEqual(feed.refresh(), (0, 0))
+        self.assertEqual(FeedEntry.objects.filter(feed=feed).count(), 10)
+
+        # only changed entries are updated, read state is preserved
+        parsed_data = feedparser.parse(self.fixture_path)
+        parsed_data.entries[0]["title"] = "changed title"
+        aggregated_data = Source.get_aggregated_data(parsed_data=parsed_data)
+        self.assertEqual(feed.update_or_create_entries(aggregated_data), (0, 1))
+        entry = FeedEntry.objects.get(feed=feed, title="changed title")
+        self.assertTrue(entry.read_marks.filter(source=source).exists())
+        self.assertEqual(FeedEntry.objects.filter(feed=feed).count(), 10)
+
+    def test_concurrently_inserted_entries_not_counted(self):
+        feed = Source.objects.create(**self.source_data).feed
+        fetch_result = feed.fetch()
+        existing = FeedEntry.objects.filter
+
+        # entries inserted by a concurrent fetch are not visible yet when existing entries are read
+        with mock.patch.object(FeedEntry.objects, "filter", side_effect=lambda **kwargs: existing(**kwargs).none()):
+            Feed.objects.get(id=feed.id).refresh(fetch_result)
+            self.assertEqual(feed.refresh(fetch_result), (0, 0))
+        self.assertEqual(FeedEntry.objects.filter(feed=feed).count(), 10)
+
+    def test_feed_compute_fetch_interval(self):
+        feed = Source.objects.create(**self.source_data).feed
+        now = timezone.now()
+
+        # a post every 12 hours is fetched every 6 hours
+        published_dates = [now - timedelta(hours=12 * num) for num in range(5)]
+        self.assertEqual(feed.compute_fetch_interval(published_dates), timedelta(hours=6))
+        # fetches with nothing new back off
+        feed.empty_fetches_count = 2
+        self.assertEqual(feed.compute_fetch_interval(published_dates), timedelta(hours=24))
+        # interval is kept between fetch_interval and the ceiling
+        with self.settings(FEEDS_ADAPTIVE_FETCH_INTERVAL_CEILING=timedelta(hours=10)):
+            self.assertEqual(feed.compute_fetch_interval(published_dates), timedelta(hours=10))
+        feed.empty_fetches_count = 0
+        self.assertEqual(feed.compute_fetch_interval([now, now - timedelta(minutes=10)]), timedelta(hours=1))
+        self.assertEqual(feed.compute_fetch_interval([]), timedelta(hours=1))
+
+    def test_source_model_max_entries(self):
+        source = Source.objects.create(**self.source_data, max_entries=4)
+        feed = source.feed
+        with self.settings(FEEDS_ENTRIES_BATCH_SIZE=3):
+            self.assertEqual(feed.refresh(), (4, 0))
+        self.assertEqual(FeedEntry.objects.filter(feed=feed).count(), 4)
+        self.assertEqual(len(feed.get_raw_entries()), 4)
+
+    def test_feed_raw_payload(self):
+        feed = Source.objects.create(**self.source_data).feed
+        feed.refresh()
+        payload = feed.raw_payload
+        self.assertEqual(payload.entries_count, 10)
+        self.assertEqual(len(feed.get_raw_entries()), 10)
 
-        # Test result of post_save signal.
-        periodic_task = PeriodicTask.objects.get(name="_".join([source.name, str(source.id)]))
-        self.assertTrue(str(source.id) in periodic_task.args)
-        self.assertTrue(source.fetch_interval == periodic_task.interval)
+        # unchanged entries are not written again
+        with self.assertNumQueries(1):
+            feed.store_raw_entries(feed.get_raw_entries())
+
+        # changed entries replace the payload, which is deleted once it is not used anymore
+        feed.store_raw_entries(feed.get_raw_entries()[:5])
+        feed.refresh_from_db()
+        self.assertEqual(feed.raw_payload.entries_count, 5)
+        self.assertFalse(FeedPayload.objects.filter(id=payload.id).exists())
+
+        # payload shared with another feed is kept until the last of them is deleted
+        other_feed = Feed.objects.create(feed_url="https://google.com/other", raw_payload=feed.raw_payload)
+        Source.objects.all().delete()
+        feed.delete()
+        self.assertTrue(FeedPayload.objects.filter(id=other_feed.raw_payload_id).exists())
+        Feed.objects.all().delete()
+        self.assertFalse(FeedPayload.objects.exists())
+
+
+class SharedFeedTestCase(BaseTestCase):
+    def setUp(self) -> None:
+        super(SharedFeedTestCase, self).setUp()
+        self.hourly = self.first_interval
+        self.daily = IntervalSchedule.objects.create(every=1, period=IntervalSchedule.DAYS)
+
+    def test_normalize_url(self):
+        self.assertEqual(Feed.normalize_url(" HTTP://Example.COM:80/rss?a=1#top "), "http://example.com/rss?a=1")
+        self.assertEqual(Feed.normalize_url("https://example.com:8443"), "https://example.com:8443/")
+        self.assertEqual(Feed.normalize_url(self.fixture_path), self.fixture_path)
+
+    @mock.patch("feeds.parsers.RssAggregator.parse")
+    def test_subscriptions_share_feed(self, mock_parse):
+        mock_parse.return_value = self.parsed_data
+        first = Source.objects.create(
+            **self.create_source_data(url="https://example.com/rss", fetch_interval=self.daily, user=self.user)
+        )
+        second = Source.objects.create(
+            **self.create_source_data(
+                url="HTTPS://example.com:443/rss#latest", fetch_interval=self.hourly, user=self.user_second
+            ),
+            max_entries=5,
+        )
+        self.assertEqual(first.feed, second.feed)
+        feed = Feed.objects.get()
+        # shortest interval wins, entries are not limited as long as a subscriber wants them all
+        self.assertEqual(feed.fetch_interval, timedelta(hours=1))
+        self.assertIsNone(feed.max_entries)
+
+        # one download serves all subscribers, read state is kept per subscription
+        self.assertEqual(feed.refresh(), (10, 0))
+        self.assertEqual(mock_parse.call_count, 1)
+        entry = feed.feedentry_set.first()
+        ReadMark.objects.create(source=first, entry=entry)
+        self.assertFalse(entry.read_marks.filter(source=second).exists())
+
+        # moving to another url leaves the shared feed, the last subscriber to leave deletes it
+        second.url = "https://example.org/rss"
+        second.save()
+        self.assertNotEqual(second.feed, feed)
+        feed.refresh_from_db()
+        self.assertEqual(feed.fetch_interval, timedelta(days=1))
+        first.delete()
+        self.assertFalse(Feed.objects.filter(id=feed.id).exists())
+        self.assertFalse(FeedEntry.objects.filter(feed_id=feed.id).exists())
+
+    def test_bulk_and_cascade_unsubscribe(self):
+        Source.objects.create(
+            **self.create_source_data(url="https://example.com/rss", fetch_interval=self.daily, user=self.user)
+        )
+        Source.objects.create(
+            **self.create_source_data(url="https://example.com/own", fetch_interval=self.daily, user=self.user)
+        )
+        shared = Source.objects.create(
+            **self.create_source_data(url="https://example.com/rss", fetch_interval=self.hourly, user=self.user_second)
+        )
+        self.assertEqual(shared.feed.fetch_interval, timedelta(hours=1))
+
+        # subscriptions deleted with their user leave shared feeds
+        User.objects.filter(id=self.user_second.id).delete()
+        self.assertEqual(Feed.objects.get(id=shared.feed_id).fetch_interval, timedelta(days=1))
+
+        # feeds are deleted with their last subscriptions, also if they are deleted together
+        Source.objects.filter(user=self.user).delete()
+        self.assertFalse(Feed.objects.exists())
+
+
+class TrigramIndexTestCase(BaseTestCase):
+    def setUp(self) -> None:
+        super(TrigramIndexTestCase, self).setUp()
+        if not pg_trgm_installed(connection):
+            self.skipTest("pg_trgm extension is not available, trigram indexes are not created")
 
-        # Test result of post_delete signal.
-        source.delete()
-        periodic_task_qs = PeriodicTask.objects.filter(name="_".join([source.name, str(source.id)]))
-        self.assertFalse(periodic_task_qs.exists())
-        self.assertFalse(Source.objects.exists())
+    def test_icontains_uses_trigram_index(self):
+        feeds = Feed.objects.bulk_create(
+            Feed(feed_url=f"https://google.com/{num}", title=f"source_{num}", summary=f"source_{num}")
+            for num in range(1000)
+        )
+        Source.objects.bulk_create(
+            Source(name=feed.title, url=feed.feed_url, feed=feed, fetch_interval=self.first_interval) for feed in feeds
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE feeds_source")
+            cursor.execute("ANALYZE feeds_feed")
+        self.assertIn("feeds_source_name_trgm_idx", Source.objects.filter(name__icontains="rce_12").explain())
+        self.assertIn("feeds_feed_title_trgm_idx", Feed.objects.filter(title__icontains="rce_12").explain())
+        self.assertIn("feeds_feed_summary_trgm_idx", Feed.objects.filter(summary__icontains="rce_12").explain())
@@ -1,7 +1,10 @@
 from urllib.error import URLError
 
-from feeds.parsers import RssAggregator
+import feedparser
+
+from feeds.parsers import FetchResult, RssAggregator, StreamingFeedParser
 from feeds.tests import BaseTestCase
+from feeds.tests.server import FeedServer
 
 
 class ParsersTestCase(BaseTestCase):
@@ -12,6 +15,58 @@ class ParsersTestCase(BaseTestCase):
         with self.assertRaises(URLError):
             RssAggregator.parse("https://localhost:8000")
 
+    def test_FetchResult_fetch_error_status(self):
+        with open(self.fixture_path, "rb") as f:
+            body = f.read()
+        with FeedServer(body, status=500) as server, self.assertRaises(URLError):
+            FetchResult.fetch(server.url())
+
     def test_RssAggregator_serialize_datetime_fail(self):
         with self.assertRaises(TypeError):
             RssAggregator.serialize_datetime("teststing")
+
+    def test_StreamingFeedParser_parse(self):
+        with open(self.fixture_path, "rb") as f:
+            body = f.read()
+        parsed_data = StreamingFeedParser(body).parse()
+        aggregated_data = RssAggregator(parsed_data)
+        self.assertEqual(aggregated_data.title, self.aggregated_data.title)
+        self.assertEqual(aggregated_data.tagline, self.aggregated_data.tagline)
+
+        fields = ["title", "link", "description", "guid", "issued_parsed", "author"]
+        entries = [RssAggregator(entry) for entry in aggregated_data.items]
+        expected_entries = [RssAggregator(entry) for entry in self.aggregated_data.items]
+        self.assertEqual(len(entries), len(expected_entries))
+        for entry, expected_entry in zip(entries, expected_entries):
+            for field in fields:
+                self.assertEqual(getattr(entry, field), getattr(expected_entry, field))
+
+        # large bodies are streamed
+        with self.settings(FEEDS_STREAMING_THRESHOLD=0):
+            fetch_result = FetchResult.from_response(200, {}, body)
+        self.assertIsInstance(fetch_result.parsed_data.entries, StreamingFeedParser)
+
+    def test_StreamingFeedParser_malformed(self):
+        body = b"<rss><channel><title>feed</title><item><title>first</title></item><item><title>second</ti"
+        entries = list(StreamingFeedParser(body).parse().entries)
+        self.assertEqual([entry.title for entry in entries], ["first"])
+
+    def test_StreamingFeedParser_nested_elements(self):
+        documents = [
+            b"""<rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/"><channel><title>feed</title>
+            <item><media:content url="https://example.com/1.jpg"/><description>hello world</description>
+            <media:group><media:title>media title</media:title><media:description>media</media:description>
+            </media:group><source url="https://example.com/rss">source title</source><title>first</title></item>
+            </channel></rss>""",
+            b"""<feed xmlns="http://www.w3.org/2005/Atom"><title>feed</title>
+            <entry><source><title>source title</title><author><name>source author</name></author></source>
+            <title>first</title><author><name>entry author</name></author><summary>hello world</summary></entry>
+            </feed>""",
+        ]
+        for body in documents:
+            with self.subTest(body=body[:20]):
+                entries = list(StreamingFeedParser(body).parse().entries)
+                expected_entries = feedparser.parse(body).entries
+                self.assertEqual(entries[0].summary, "hello world")
+                for key in ["title", "summary", "author"]:
+                    self.assertEqual(entries[0].get(key), expected_entries[0].get(key))
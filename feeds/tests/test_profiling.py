@@ -0,0 +1,136 @@
+import pstats
+import tempfile
+from unittest import mock
+from urllib.error import URLError
+
+from celery.exceptions import Retry
+from django.contrib.auth.models import User
+from django.test import override_settings
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from feeds.models import Source
+from feeds.profiling import ProfileStore, profile, profile_sampled
+from feeds.tasks import FetchFeedTask
+from feeds.tests import BaseTestCase
+
+
+class ProfilingTestCase(APITestCase, BaseTestCase):
+    def setUp(self) -> None:
+        super(ProfilingTestCase, self).setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings_override = override_settings(PROFILE_DIR=self.directory.name, PROFILE_MAX_FILES=3)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        source_data = self.create_source_data(fetch_interval=self.first_interval, url=self.fixture_path)
+        self.source = Source.objects.create(**source_data)
+
+    def test_profile(self):
+        with profile("fetch", "test") as run:
+            list(Source.objects.all())
+            list(Source.objects.all())
+        profiles = ProfileStore().list()
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(profiles[0]["id"], run.id)
+        self.assertEqual((profiles[0]["kind"], profiles[0]["name"], profiles[0]["queries"]), ("fetch", "test", 2))
+        self.assertGreater(profiles[0]["sql_seconds"], 0)
+        self.assertGreaterEqual(profiles[0]["seconds"], profiles[0]["sql_seconds"])
+        stats = pstats.Stats(ProfileStore().get_path(run.id)).stats
+        self.assertIn("_fetch_all", {function_name for path, line, function_name in stats})
+
+    def test_profile_saved_if_block_raises(self):
+        with self.assertRaises(ValueError):
+            with profile("fetch", "test"):
+                raise ValueError
+        self.assertEqual(len(ProfileStore().list()), 1)
+
+    def test_ring_buffer(self):
+        ids = []
+        for i in range(5):
+            with profile("fetch", str(i)) as run:
+                pass
+            ids.append(run.id)
+        self.assertEqual([item["id"] for item in ProfileStore().list()], ids[:1:-1])
+        with self.assertRaises(FileNotFoundError):
+            open(ProfileStore().get_path(ids[0]))
+
+    def test_get_path(self):
+        for profile_id in ["../settings", "1-1-fetch/..", ""]:
+            with self.subTest(profile_id=profile_id), self.assertRaises(ValueError):
+                ProfileStore().get_path(profile_id)
+
+    def test_profile_sampled(self):
+        with profile_sampled(0, "fetch", "test") as run:
+            self.assertIsNone(run)
+        with mock.patch("feeds.profiling.random.random", return_value=0.5):
+            with profile_sampled(0.4, "fetch", "test") as run:
+                self.assertIsNone(run)
+            with profile_sampled(0.6, "fetch", "test") as run:
+                self.assertIsNotNone(run)
+        self.assertEqual(len(ProfileStore().list()), 1)
+
+    def test_fetch_feed_task(self):
+        with override_settings(FEEDS_PROFILE_FETCH_FRACTION=1):
+            FetchFeedTask().run(self.source.feed_id)
+        profiles = ProfileStore().list()
+        self.assertEqual([(item["kind"], item["name"]) for item in profiles], [("fetch", self.fixture_path)])
+        self.assertGreater(profiles[0]["queries"], 0)
+
+        # fetches which are retried are profiled too
+        with override_settings(FEEDS_PROFILE_FETCH_FRACTION=1):
+            with mock.patch("feeds.parsers.RssAggregator.parse", side_effect=URLError("down")):
+                with mock.patch.object(FetchFeedTask, "retry", side_effect=Retry), self.assertRaises(Retry):
+                    FetchFeedTask().run(self.source.feed_id)
+        self.assertEqual(len(ProfileStore().list()), 2)
+
+        FetchFeedTask().run(self.source.feed_id)
+        self.assertEqual(len(ProfileStore().list()), 2)
+
+    def test_middleware(self):
+        self.client.force_authenticate(self.user)
+        url = reverse("feeds-list")
+        with override_settings(API_PROFILE_TOKEN="secret"):
+            response = self.client.get(url, HTTP_X_PROFILE="secret")
+        self.assertEqual(response.status_code, 200)
+        profiles = ProfileStore().list()
+        self.assertEqual([item["id"] for item in profiles], [response["X-Profile-Id"]])
+        self.assertEqual(profiles[0]["name"], f"GET {url}")
+        self.assertGreater(profiles[0]["queries"], 0)
+
+        response = self.client.get(url)
+        self.assertNotIn("X-Profile-Id", response)
+        with override_settings(API_PROFILE_TOKEN="secret"):
+            response = self.client.get(url, HTTP_X_PROFILE="wrong")
+            self.assertNotIn("X-Profile-Id", response)
+        with override_settings(API_PROFILE_FRACTION=1):
+            response = self.client.get(url)
+            self.assertIn("X-Profile-Id", response)
+            # only API requests are profiled
+            self.client.get("/admin/login/")
+        self.assertEqual(len(ProfileStore().list()), 2)
+
+    def test_profiles_view(self):
+        with profile("fetch", "test") as run:
+            pass
+        list_url = reverse("profiles-list")
+        detail_url = reverse("profiles-detail", args=[run.id])
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(list_url).status_code, 403)
+        self.assertEqual(self.client.get(detail_url).status_code, 403)
+
+        self.client.force_authenticate(User.objects.create(username="staff", is_staff=True))
+        response = self.client.get(list_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["id"] for item in response.json()], [run.id])
+
+        response = self.client.get(detail_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Disposition"], f'attachment; filename="{run.id}.prof"')
+        with open(ProfileStore().get_path(run.id), "rb") as f:
+            self.assertEqual(b"".join(response.streaming_content), f.read())
+
+        for profile_id in [f"{run.id}0", "..%2Fsettings"]:
+            with self.subTest(profile_id=profile_id):
+                self.assertEqual(self.client.get(f"{list_url}{profile_id}/").status_code, 404)
@@ -0,0 +1,99 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from feeds.models import Feed, FeedEntry, FeedPayload, ReadMark, Source
+from feeds.tests import BaseTestCase
+
+
+class QueryBudgetTestCase(APITestCase, BaseTestCase):
+    """
+    Each endpoint runs at most its budget of queries, no matter how many rows the user has.
+    """
+
+    SIZES = [1, 100, 1000]
+
+    def setUp(self) -> None:
+        super(QueryBudgetTestCase, self).setUp()
+        self.client.force_authenticate(self.user)
+
+    def create_rows(self, count):
+        """
+        @param count: number of sources of the user, each with a feed and an entry read by the user
+        @return: first entry of the user
+        """
+        # feeds are deleted in bulk, instead of one by one with their last subscription
+        with mock.patch("feeds.models.Feed.update_subscriptions"):
+            Source.objects.all().delete()
+        Feed.objects.all().delete()
+        # rows are created in bulk, which does not invalidate cached responses
+        cache.clear()
+        payload = FeedPayload.store([{"title": "entry"}])
+        feeds = Feed.objects.bulk_create(
+            Feed(feed_url=f"https://google.com/{num}", title=f"source_{num}", raw_payload=payload)
+            for num in range(count)
+        )
+        sources = Source.objects.bulk_create(
+            Source(name=feed.title, url=feed.feed_url, feed=feed, fetch_interval=self.first_interval, user=self.user)
+            for feed in feeds
+        )
+        entries = FeedEntry.objects.bulk_create(
+            FeedEntry(feed=feed, title=feed.title, guid_hash=FeedEntry.hash_values(feed.title)) for feed in feeds
+        )
+        ReadMark.objects.bulk_create(ReadMark(source=source, entry=entry) for source, entry in zip(sources, entries))
+        FeedEntry.objects.update(search_vector=FeedEntry.get_search_vector())
+        return FeedEntry.objects.order_by("id").first()
+
+    def assertQueryBudget(self, budget, get_url, rows_count=None, cached=False):
+        """
+        @param budget: maximum number of queries of a single request
+        @param get_url: callable returning url of the endpoint, for the first entry of the user
+        @param rows_count: callable returning number of rows expected in the response for given size, if it is a list
+        @param cached: if True, repeated request is served from the cache without any query
+        """
+        queries_counts = set()
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                entry = self.create_rows(size)
+                url = get_url(entry)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertLess(response.status_code, 400)
+                if rows_count:
+                    results = response.data["results"] if isinstance(response.data, dict) else response.data
+                    self.assertEqual(len(results), rows_count(size))
+                self.assertLessEqual(len(queries), budget, [query["sql"] for query in queries])
+                queries_counts.add(len(queries))
+                if cached:
+                    with self.assertNumQueries(0):
+                        self.assertEqual(self.client.get(url).data, response.data)
+        self.assertEqual(len(queries_counts), 1, "number of queries grows with number of rows")
+
+    def test_sources(self):
+        self.assertQueryBudget(1, lambda entry: reverse("sources-list"), lambda size: size)
+        self.assertQueryBudget(1, lambda entry: reverse("sources-detail", args=[entry.read_marks.get().source_id]))
+        self.assertQueryBudget(
+            1, lambda entry: reverse("sources-fetch-status", args=[entry.read_marks.get().source_id])
+        )
+        with mock.patch("feeds.tasks.FetchFeedTask.apply_async"):
+            self.assertQueryBudget(1, lambda entry: reverse("sources-fetch", args=[entry.read_marks.get().source_id]))
+
+    def test_feeds(self):
+        url = f"{reverse('feeds-list')}?page_size=500"
+        # besides the feeds, the first request reads feed ids of the user into the cache
+        self.assertQueryBudget(2, lambda entry: url, lambda size: min(size, 500), cached=True)
+        self.assertQueryBudget(2, lambda entry: reverse("feeds-detail", args=[entry.feed_id]), cached=True)
+        # payload data is deferred, it is read only by the first request, which decodes entries into the cache
+        self.assertQueryBudget(2, lambda entry: reverse("feeds-entries", args=[entry.feed_id]), lambda size: 1)
+
+    def test_feed_entries(self):
+        url = f"{reverse('feed-entries-list')}?page_size=500"
+        self.assertQueryBudget(2, lambda entry: url, lambda size: min(size, 500), cached=True)
+        self.assertQueryBudget(2, lambda entry: f"{url}&search=source_0", lambda size: 1, cached=True)
+        self.assertQueryBudget(2, lambda entry: reverse("feed-entries-detail", args=[entry.id]), cached=True)
+        self.assertQueryBudget(1, lambda entry: reverse("feed-entries-read", args=[entry.id]))
+        self.assertQueryBudget(2, lambda entry: reverse("feed-entries-unread", args=[entry.id]))
@@ -0,0 +1,124 @@
+from datetime import timedelta
+from unittest import mock
+from urllib.error import URLError
+
+import feedparser
+from celery.exceptions import MaxRetriesExceededError
+from django.utils import timezone
+
+from feeds.models import Feed, FeedEntry, Source
+from feeds.tasks import DispatchDueSourcesTask, FetchFeedTask
+from feeds.tests import BaseTestCase
+from feeds.tests.server import FeedServer
+
+
+class FetchFeedTaskTestCase(BaseTestCase):
+    def setUp(self) -> None:
+        super(FetchFeedTaskTestCase, self).setUp()
+        self.source_data = self.create_source_data(fetch_interval=self.first_interval, url=self.fixture_path)
+
+    @mock.patch("feeds.parsers.RssAggregator.parse")
+    def test_fetch_not_modified(self, mock_parse):
+        parsed_data = feedparser.FeedParserDict(self.parsed_data)
+        parsed_data.update({"etag": '"first-etag"', "modified": "Wed, 30 Sep 2020 09:36:17 GMT"})
+        mock_parse.return_value = parsed_data
+        feed = Source.objects.create(**self.source_data).feed
+        self.assertTrue(FetchFeedTask().run(feed.id))
+        feed.refresh_from_db()
+        self.assertEqual(feed.etag, '"first-etag"')
+        self.assertEqual(feed.last_modified, "Wed, 30 Sep 2020 09:36:17 GMT")
+        feed_updated_at = feed.updated_at
+        entries_count = FeedEntry.objects.count()
+
+        # feed has not changed since the previous fetch
+        mock_parse.return_value = feedparser.FeedParserDict(status=304, entries=[])
+        self.assertTrue(FetchFeedTask().run(feed.id))
+        mock_parse.assert_called_with(feed.feed_url, etag='"first-etag"', modified="Wed, 30 Sep 2020 09:36:17 GMT")
+        feed.refresh_from_db()
+        self.assertEqual(feed.fetch_status, feed.FETCH_DONE)
+        self.assertEqual(feed.updated_at, feed_updated_at)
+        self.assertEqual(FeedEntry.objects.count(), entries_count)
+
+    def test_fetch_adaptive_interval(self):
+        source = Source.objects.create(**self.source_data, adaptive_fetch_interval=True)
+        feed = source.feed
+        feed.refresh()
+        self.assertTrue(FetchFeedTask().run(feed.id))
+        feed.refresh_from_db()
+        # fixture entries were all fetched before, so nothing new has been found
+        self.assertEqual(feed.empty_fetches_count, 1)
+        self.assertIsNotNone(feed.computed_fetch_interval)
+        self.assertGreaterEqual(feed.computed_fetch_interval, source.get_fetch_interval())
+        self.assertAlmostEqual(
+            feed.next_fetch_at, timezone.now() + feed.computed_fetch_interval, delta=timedelta(seconds=5)
+        )
+
+    @mock.patch("feeds.parsers.RssAggregator.parse", side_effect=URLError("down"))
+    def test_fetch_failed_backoff(self, mock_parse):
+        feed = Source.objects.create(**self.source_data).feed
+        task = FetchFeedTask()
+        task.push_request(retries=task.max_retries)
+        self.addCleanup(task.pop_request)
+        # fetch interval is doubled for each consecutive failure, up to the ceiling
+        for expected_interval in [timedelta(hours=2), timedelta(hours=4), timedelta(hours=5)]:
+            with self.settings(FEEDS_ADAPTIVE_FETCH_INTERVAL_CEILING=timedelta(hours=5)), mock.patch.object(
+                FetchFeedTask, "retry", side_effect=MaxRetriesExceededError
+            ):
+                self.assertFalse(task.run(feed.id))
+            feed.refresh_from_db()
+            self.assertEqual(feed.fetch_status, Feed.FETCH_FAILED)
+            self.assertAlmostEqual(feed.next_fetch_at, timezone.now() + expected_interval, delta=timedelta(seconds=5))
+
+        # a successful fetch ends the backoff
+        mock_parse.side_effect = None
+        mock_parse.return_value = self.parsed_data
+        self.assertTrue(task.run(feed.id))
+        feed.refresh_from_db()
+        self.assertEqual((feed.fetch_status, feed.empty_fetches_count), (Feed.FETCH_DONE, 0))
+
+    def test_fetch_not_a_feed(self):
+        with FeedServer(b"<html><body>Log in</body></html>") as server:
+            self.source_data["url"] = server.url("feed.xml")
+            feed = Source.objects.create(**self.source_data).feed
+            with mock.patch.object(FetchFeedTask, "retry") as mock_retry:
+                self.assertFalse(FetchFeedTask().run(feed.id))
+        # a body which is not a feed is not retried, the feed is fetched again later
+        mock_retry.assert_not_called()
+        feed.refresh_from_db()
+        self.assertEqual((feed.fetch_status, feed.empty_fetches_count), (Feed.FETCH_FAILED, 1))
+        self.assertFalse(FeedEntry.objects.exists())
+
+
+class DispatchDueSourcesTaskTestCase(BaseTestCase):
+    def setUp(self) -> None:
+        super(DispatchDueSourcesTaskTestCase, self).setUp()
+        self.sources = [
+            Source.objects.create(
+                **self.create_source_data(
+                    name=f"source_{num}", url=f"https://google.com/{num}", fetch_interval=self.first_interval
+                )
+            )
+            for num in range(5)
+        ]
+        # a feed is dispatched once for all its subscribers
+        Source.objects.create(
+            **self.create_source_data(url="https://google.com/0", fetch_interval=self.first_interval, user=self.user)
+        )
+
+    @mock.patch("feeds.tasks.FetchFeedsBatchTask.apply_async")
+    def test_dispatch_due_sources(self, mock_apply_async):
+        now = timezone.now()
+        due_ids = [source.feed_id for source in self.sources[:3]]
+        Feed.objects.filter(id__in=due_ids).update(next_fetch_at=now)
+        Feed.objects.filter(id=due_ids[2]).update(fetch_status=Feed.FETCH_FAILED)
+
+        # failed feeds are still fetched, so they recover once their host is back
+        with self.settings(FEEDS_SWEEP_BATCH_SIZE=1):
+            self.assertEqual(DispatchDueSourcesTask().run(), 3)
+        self.assertEqual(mock_apply_async.call_count, 3)
+        dispatched_ids = [call[0][0][0] for call in mock_apply_async.call_args_list]
+        self.assertCountEqual(dispatched_ids, [[feed_id] for feed_id in due_ids])
+
+        # claimed feeds are not due anymore
+        self.assertFalse(Feed.objects.filter(id__in=due_ids, next_fetch_at__lte=now).exists())
+        self.assertEqual(DispatchDueSourcesTask().run(), 0)
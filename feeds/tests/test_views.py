@@ -1,10 +1,20 @@
+import base64
+import csv
+import json
+from datetime import timedelta
 from unittest import mock
 
+import feedparser
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import F
+from django.utils import timezone
+
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase
 
-from feeds.models import Feed, FeedEntry, Source
-from feeds.tests import BaseTestCase
+from feeds.models import Feed, FeedEntry, ReadMark, Source
+from feeds.tasks import FetchFeedTask
+from feeds.tests import BaseTestCase, run_on_commit_immediately
 
 
 class ViewsTestCase(APITestCase, BaseTestCase):
@@ -58,10 +68,10 @@ class SourceViewsTestCase(APITestCase, BaseTestCase):
         self.source_data = self.create_source_data(fetch_interval=self.first_interval, url=self.fixture_path)
         self.source = Source.objects.create(**self.source_data)
 
-    @mock.patch("feeds.models.Source.aggregated_data", new_callable=mock.PropertyMock)
-    def test_source_view_users(self, mock_aggregated_data):
+    @mock.patch("feeds.parsers.RssAggregator.parse")
+    def test_source_view_users(self, mock_parse):
         # mock methods to accept data from file not from url
-        mock_aggregated_data.return_value = self.aggregated_data
+        mock_parse.return_value = self.parsed_data
         post_data = self.create_source_data(fetch_interval=self.first_interval.id, user="", name="different_name")
 
         # POST data to create new Source instance for first_user
@@ -78,11 +88,11 @@ class SourceViewsTestCase(APITestCase, BaseTestCase):
         self.assertContains(response_second, source_second.name, status_code=201)
         self.assertNotContains(response_second, source.name, status_code=201)
 
-    @mock.patch("feeds.models.Source.aggregated_data", new_callable=mock.PropertyMock)
-    def test_source_view_set_functional(self, mock_aggregated_data):
+    @mock.patch("feeds.parsers.RssAggregator.parse")
+    def test_source_view_set_functional(self, mock_parse):
 
         # mock methods to accept data from file not from url
-        mock_aggregated_data.return_value = self.aggregated_data
+        mock_parse.return_value = self.parsed_data
         post_data = self.create_source_data(fetch_interval=self.first_interval.id, user="", name="different_name")
 
         # POST data to create new Source instance
@@ -102,17 +112,67 @@ class SourceViewsTestCase(APITestCase, BaseTestCase):
         self.assertTrue(response_fetch.status_code == 202)
         # status of the feed re-fetching
         response_fetch_status = self.client.get(reverse("sources-fetch-status", args=[source.id]))
-        self.assertContains(response_fetch_status, source.fetch_status)
-        self.assertContains(response_fetch_status, source.get_fetch_status_display())
+        feed = source.feed
+        feed.refresh_from_db()
+        self.assertContains(response_fetch_status, feed.fetch_status)
+        self.assertContains(response_fetch_status, feed.get_fetch_status_display())
         self.assertEqual(
             response_fetch_status.data,
             {
-                "status_id": source.fetch_status,
-                "status_desc": source.get_fetch_status_display(),
-                "last_update": source.updated_at,
+                "status_id": feed.fetch_status,
+                "status_desc": feed.get_fetch_status_display(),
+                "last_update": feed.updated_at,
             },
         )
 
+    def test_source_view_duplicate_subscription(self):
+        post_data = self.create_source_data(fetch_interval=self.first_interval.id, user="", url="https://google.com/")
+        self.assertEqual(self.client.post(self.url_list, post_data).status_code, 201)
+        post_data["url"] = "HTTPS://GOOGLE.COM:443/#top"
+        response = self.client.post(self.url_list, post_data)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("url", response.data)
+
+    def test_source_view_create_queues_fetch(self):
+        shared = Source.objects.create(
+            **self.create_source_data(
+                url="https://google.com/shared", fetch_interval=self.first_interval, user=self.user_second
+            )
+        )
+        post_data = self.create_source_data(fetch_interval=self.first_interval.id, user="", url=shared.url)
+        # feeds fetched for other subscribers are not fetched again, unless their last fetch failed
+        for fetch_status, fetched in [(Feed.FETCH_DONE, False), (Feed.FETCH_FAILED, True)]:
+            with self.subTest(fetch_status=fetch_status):
+                Source.objects.filter(user=self.user).delete()
+                Feed.objects.filter(id=shared.feed_id).update(fetch_status=fetch_status)
+                with run_on_commit_immediately(), mock.patch("feeds.tasks.FetchFeedTask.apply_async") as mock_fetch:
+                    self.assertEqual(self.client.post(self.url_list, post_data).status_code, 201)
+                self.assertEqual(mock_fetch.called, fetched)
+
+    def test_source_view_import(self):
+        url = reverse("sources-import")
+        document = SimpleUploadedFile(
+            "subscriptions.csv", b"name,url\nfirst,https://google.com/1\nsecond,https://google.com/2\n,invalid\n"
+        )
+        # nothing is fetched right away, the sweeper picks new feeds up
+        with mock.patch("feeds.tasks.FetchFeedTask.apply_async") as mock_fetch:
+            response = self.client.post(url, {"file": document, "fetch_interval": self.first_interval.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            response.data, {"created": 2, "duplicates": 0, "already_subscribed": 0, "invalid": ["invalid"]}
+        )
+        mock_fetch.assert_not_called()
+        self.assertEqual(
+            list(Source.objects.filter(user=self.user).order_by("id").values_list("name", flat=True)),
+            ["first", "second"],
+        )
+
+        response = self.client.post(
+            url, {"file": SimpleUploadedFile("subscriptions.opml", b"<opml>"), "fetch_interval": self.first_interval.id}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("file", response.data)
+
 
 class FeedsViewsTestCase(APITestCase, BaseTestCase):
     def setUp(self) -> None:
@@ -121,23 +181,34 @@ class FeedsViewsTestCase(APITestCase, BaseTestCase):
 
         self.url_list = reverse("feeds-list")
 
-    @mock.patch("feeds.models.Source.aggregated_data", new_callable=mock.PropertyMock)
-    def test_feeds_view_users(self, mock_aggregated_data):
+    @mock.patch("feeds.parsers.RssAggregator.parse")
+    def test_feeds_view_users(self, mock_parse):
         # mock methods to accept data from file not from url
-        mock_aggregated_data.return_value = self.aggregated_data
+        mock_parse.return_value = self.parsed_data
         post_data = self.create_source_data(fetch_interval=self.first_interval.id, user="")
 
-        # POST data to create new Source instance
-        self.client.post(reverse("sources-list"), post_data)
+        # POST data to create new Source instance, its feed is fetched in the background
+        with run_on_commit_immediately():
+            self.client.post(reverse("sources-list"), post_data)
 
         response = self.client.get(self.url_list)
         self.assertEqual(response.status_code, 200)
-        feed = Feed.objects.get(source__user=self.user)
-        self.assertEqual(self.user, feed.source.user)
+        source = Source.objects.get(user=self.user)
+        feed = Feed.objects.get(sources__user=self.user)
+        # feed links to the subscription of the user
+        self.assertTrue(response.data["results"][0]["source"].endswith(reverse("sources-detail", args=[source.id])))
 
-        # GET raw data entries
+        # GET raw data entries, sliced on the server
+        raw_entries = feed.get_raw_entries()
+        self.assertEqual(len(raw_entries), 10)
         response_entries = self.client.get(reverse("feeds-entries", args=[feed.id]))
-        self.assertEqual(response_entries.data, feed.entries)
+        self.assertEqual(response_entries.data["count"], 10)
+        self.assertEqual(response_entries.data["results"], raw_entries)
+        # pages are sliced from entries decoded once, only session, user and feed are queried, not payload data
+        with mock.patch("feeds.models.FeedPayload.load") as mock_load, self.assertNumQueries(3):
+            response_page = self.client.get(reverse("feeds-entries", args=[feed.id]), {"limit": 3, "offset": 6})
+        mock_load.assert_not_called()
+        self.assertEqual(response_page.data["results"], raw_entries[6:9])
 
 
 class FeedsEntriesViewsTestCase(APITestCase, BaseTestCase):
@@ -146,34 +217,362 @@ class FeedsEntriesViewsTestCase(APITestCase, BaseTestCase):
         self.client.force_login(self.user)
         self.url_list = reverse("feed-entries-list")
 
-    @mock.patch("feeds.models.Source.aggregated_data", new_callable=mock.PropertyMock)
-    def test_feed_entries_view_users(self, mock_aggregated_data):
+    @staticmethod
+    def encode_cursor(position) -> str:
+        return base64.urlsafe_b64encode(json.dumps(position).encode("ascii")).decode("ascii")
+
+    @mock.patch("feeds.parsers.RssAggregator.parse")
+    def test_feed_entries_view_users(self, mock_parse):
         # mock methods to accept data from file not from url
-        mock_aggregated_data.return_value = self.aggregated_data
+        mock_parse.return_value = self.parsed_data
         post_data = self.create_source_data(fetch_interval=self.first_interval.id, user="")
 
-        # POST data to create new Source instance
-        self.client.post(reverse("sources-list"), post_data)
+        # POST data to create new Source instance, its feed is fetched in the background
+        with run_on_commit_immediately():
+            self.client.post(reverse("sources-list"), post_data)
 
         response = self.client.get(self.url_list)
         self.assertEqual(response.status_code, 200)
-        feed = Feed.objects.get(source__user=self.user)
-        qs_feed_entries = FeedEntry.objects.filter(feed=feed)
+        source = Source.objects.get(user=self.user)
+        qs_feed_entries = FeedEntry.objects.filter(feed=source.feed)
         feed_entry = qs_feed_entries.first()
-        self.assertTrue(
-            response.renderer_context["view"].get_queryset().count()
-            == qs_feed_entries.select_related("feed", "feed__source").count()
-        )
+        self.assertTrue(response.renderer_context["view"].get_queryset().count() == qs_feed_entries.count())
         # read entry
         response_read = self.client.get(reverse("feed-entries-read", args=[feed_entry.id]))
-        feed_entry.refresh_from_db()
-        self.assertTrue(feed_entry.read)
-        self.assertTrue(feed_entry.read == response_read.data["read"])
+        self.assertTrue(ReadMark.objects.filter(source=source, entry=feed_entry).exists())
+        self.assertTrue(response_read.data["read"])
         self.assertEqual(response_read.status_code, 202)
+        response_detail = self.client.get(reverse("feed-entries-detail", args=[feed_entry.id]))
+        self.assertTrue(response_detail.data["read"])
 
         # unread entry
         response_unread = self.client.get(reverse("feed-entries-unread", args=[feed_entry.id]))
-        feed_entry.refresh_from_db()
-        self.assertFalse(feed_entry.read)
-        self.assertTrue(feed_entry.read == response_unread.data["read"])
+        self.assertFalse(ReadMark.objects.filter(source=source, entry=feed_entry).exists())
+        self.assertFalse(response_unread.data["read"])
         self.assertEqual(response_unread.status_code, 202)
+
+    def test_feed_entries_keyset_pagination(self):
+        source = Source.objects.create(**self.create_source_data(fetch_interval=self.first_interval, user=self.user))
+        feed = source.feed
+        published = timezone.now()
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(
+                    feed=feed,
+                    guid_hash=FeedEntry.hash_values(num),
+                    # entries without date and entries published at the same time are paginated by id
+                    published=published - timedelta(hours=num // 3) if num % 5 else None,
+                )
+                for num in range(20)
+            ]
+        )
+        expected_ids = list(
+            FeedEntry.objects.filter(feed=feed)
+            .order_by(F("published").desc(nulls_first=True), "-id")
+            .values_list("id", flat=True)
+        )
+
+        ids = []
+        # next links keep the page size
+        url = f"{self.url_list}?page_size=3"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data["results"]), 3)
+            ids += [int(entry["id"].rstrip("/").rsplit("/", 1)[-1]) for entry in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(ids, expected_ids)
+
+        response = self.client.get(self.url_list, {"cursor": "invalid"})
+        self.assertEqual(response.status_code, 404)
+        # entries are ordered by date, so a rank is not a valid cursor value
+        response = self.client.get(self.url_list, {"cursor": self.encode_cursor([1.5, expected_ids[0]])})
+        self.assertEqual(response.status_code, 404)
+
+    def test_feed_entries_search(self):
+        for user in [self.user, self.user_second]:
+            source_data = self.create_source_data(fetch_interval=self.first_interval, url=self.fixture_path, user=user)
+            Source.objects.create(**source_data)
+        Feed.objects.get().refresh()
+
+        # ranked matches of user's own feeds only, paginated by rank
+        titles = []
+        url = f"{self.url_list}?search=trump&page_size=1"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            titles += [entry["title"] for entry in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(len(titles), 2)
+        self.assertTrue(all("Trump" in title for title in titles))
+
+        # search results are ordered by rank, so a date is not a valid cursor value
+        cursor = self.encode_cursor([timezone.now().isoformat(), FeedEntry.objects.first().id])
+        response = self.client.get(self.url_list, {"search": "trump", "cursor": cursor})
+        self.assertEqual(response.status_code, 404)
+
+        # search document follows changes of entries
+        FeedEntry.objects.filter(title__startswith="Shell").update(title="changed")
+        feed = Feed.objects.get()
+        feed.update_or_create_entries(feed.get_aggregated_data(self.fixture_path))
+        response = self.client.get(self.url_list, {"search": "shell"})
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_feed_entries_mark(self):
+        for user in [self.user, self.user_second]:
+            source_data = self.create_source_data(fetch_interval=self.first_interval, url=self.fixture_path, user=user)
+            Source.objects.create(**source_data)
+        feed = Feed.objects.get()
+        feed.refresh()
+        source = Source.objects.get(user=self.user)
+        entries = FeedEntry.objects.filter(feed=feed)
+        ids = list(entries.order_by("id").values_list("id", flat=True))
+        url = reverse("feed-entries-mark")
+
+        # single INSERT statement, besides the session
+        with self.assertNumQueries(3):
+            response = self.client.post(url, {"read": True, "ids": ids[:3]}, format="json")
+        self.assertEqual(response.data, {"updated": 3})
+        # entries already in the requested state are not counted
+        response = self.client.post(url, {"read": True, "ids": ids[:4]}, format="json")
+        self.assertEqual(response.data, {"updated": 1})
+
+        response = self.client.post(url, {"read": True, "feed": feed.id, "until_id": ids[6]}, format="json")
+        self.assertEqual(response.data, {"updated": 3})
+        published = entries.get(id=ids[7]).published
+        unread = entries.exclude(read_marks__source=source)
+        expected = unread.filter(published__lte=published).count()
+        response = self.client.post(url, {"read": True, "until_published": published.isoformat()}, format="json")
+        self.assertEqual(response.data, {"updated": expected})
+
+        # query parameters filter entries too, read state of other subscribers is never changed
+        expected = entries.filter(read_marks__source=source, title__icontains="trump").count()
+        with self.assertNumQueries(3):
+            response = self.client.post(f"{url}?search=trump", {"read": False}, format="json")
+        self.assertEqual(response.data, {"updated": expected})
+        expected = unread.count()
+        response = self.client.post(url, {"read": True}, format="json")
+        self.assertEqual(response.data, {"updated": expected})
+        self.assertFalse(unread.exists())
+        self.assertFalse(ReadMark.objects.filter(source__user=self.user_second).exists())
+        response = self.client.get(self.url_list, {"read": False})
+        self.assertEqual(response.data["results"], [])
+
+        response = self.client.post(url, {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class CompactFormatTestCase(APITestCase, BaseTestCase):
+    def setUp(self) -> None:
+        super(CompactFormatTestCase, self).setUp()
+        self.client.force_login(self.user)
+        for user in [self.user, self.user_second]:
+            source_data = self.create_source_data(fetch_interval=self.first_interval, url=self.fixture_path, user=user)
+            Source.objects.create(**source_data)
+        self.feed = Feed.objects.get()
+        self.feed.refresh()
+        self.source = Source.objects.get(user=self.user)
+
+    def get_rows(self, url, **kwargs):
+        """
+        @return: all rows of the compact list, following next links
+        """
+        rows = []
+        while url:
+            response = self.client.get(url, **kwargs)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Type"], "application/vnd.feeds.compact+json")
+            data = json.loads(response.content)
+            rows += data["results"]
+            url = data["next"]
+        return rows
+
+    def test_feed_entries(self):
+        entry = FeedEntry.objects.filter(feed=self.feed).order_by("id").first()
+        ReadMark.objects.create(source=self.source, entry=entry)
+        url = reverse("feed-entries-list")
+        expected = self.client.get(url, {"page_size": 500}).data["results"]
+
+        rows = self.get_rows(f"{url}?format=compact&page_size=3")
+        self.assertEqual(len(rows), len(expected))
+        for row, expected_row in zip(rows, expected):
+            self.assertEqual(set(row), set(expected_row))
+            # related objects are plain ids
+            self.assertTrue(expected_row["id"].endswith(reverse("feed-entries-detail", args=[row["id"]])))
+            self.assertEqual(row["feed"], self.feed.id)
+            self.assertEqual(row["read"], row["id"] == entry.id)
+            self.assertEqual(row["title"], expected_row["title"])
+        self.assertEqual(rows, self.get_rows(url, HTTP_ACCEPT="application/vnd.feeds.compact+json"))
+
+        # search results are paginated by rank, which is not a part of rows
+        rows = self.get_rows(f"{url}?format=compact&search=trump&page_size=1")
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(all("Trump" in row["title"] for row in rows))
+
+    def test_feeds(self):
+        rows = self.get_rows(f"{reverse('feeds-list')}?format=compact")
+        self.assertEqual([(row["id"], row["source"]) for row in rows], [(self.feed.id, self.source.id)])
+
+
+class ExportTestCase(APITestCase, BaseTestCase):
+    def setUp(self) -> None:
+        super(ExportTestCase, self).setUp()
+        self.client.force_login(self.user)
+        self.url = reverse("feed-entries-export")
+        for user in [self.user, self.user_second]:
+            source_data = self.create_source_data(fetch_interval=self.first_interval, url=self.fixture_path, user=user)
+            Source.objects.create(**source_data)
+        self.feed = Feed.objects.get()
+        self.feed.refresh()
+        self.entries = FeedEntry.objects.filter(feed=self.feed).order_by("id")
+
+    def test_ndjson(self):
+        ReadMark.objects.create(source=Source.objects.get(user=self.user), entry=self.entries[0])
+        # rows are read in chunks, exports do not go through the response cache
+        with mock.patch("feeds.views.FeedEntryViewSet.export_chunk_size", 2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["id"] for row in rows], list(self.entries.values_list("id", flat=True)))
+        self.assertEqual([row["read"] for row in rows], [True] + [False] * (len(rows) - 1))
+        self.assertEqual({row["feed"] for row in rows}, {self.feed.id})
+
+    def test_csv_filters(self):
+        published = self.entries[3].published
+        expected = self.entries.filter(published__gte=published)
+        response = self.client.get(
+            self.url, {"format": "csv", "feed": self.feed.id, "published_after": published.isoformat()}
+        )
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        header, rows = lines[0].split(","), list(csv.DictReader(lines))
+        self.assertEqual(header[:3], ["id", "feed", "read"])
+        self.assertEqual([int(row["id"]) for row in rows], list(expected.values_list("id", flat=True)))
+        self.assertEqual(rows[0]["published"], expected[0].published.isoformat())
+
+        response = self.client.get(self.url, {"format": "csv", "published_before": "2000-01-01T00:00:00Z"})
+        self.assertEqual(b"".join(response.streaming_content).decode("utf-8").splitlines(), [lines[0]])
+
+    def test_anonymous(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class ResponseCacheTestCase(APITestCase, BaseTestCase):
+    def setUp(self) -> None:
+        super(ResponseCacheTestCase, self).setUp()
+        self.client.force_authenticate(self.user)
+        self.url_list = reverse("feed-entries-list")
+        self.source = Source.objects.create(
+            **self.create_source_data(fetch_interval=self.first_interval, url=self.fixture_path, user=self.user)
+        )
+        with run_on_commit_immediately():
+            FetchFeedTask().run(self.source.feed_id)
+
+    def get_titles(self, queries_count):
+        with self.assertNumQueries(queries_count):
+            response = self.client.get(self.url_list)
+        self.assertEqual(response.status_code, 200)
+        return [entry["title"] for entry in response.data["results"]]
+
+    @mock.patch("feeds.parsers.RssAggregator.parse")
+    def test_refresh_invalidates_responses(self, mock_parse):
+        # feed ids of the user are read once, then kept in the cache until subscriptions change
+        titles = self.get_titles(2)
+        self.assertEqual(self.get_titles(0), titles)
+
+        # refresh which writes nothing keeps cached responses
+        mock_parse.return_value = self.parsed_data
+        with run_on_commit_immediately():
+            FetchFeedTask().run(self.source.feed_id)
+        self.assertEqual(self.get_titles(0), titles)
+
+        # changed entries invalidate responses of all subscribers of the feed
+        parsed_data = feedparser.parse(self.fixture_path)
+        parsed_data.entries[0]["title"] = "changed title"
+        mock_parse.return_value = parsed_data
+        with run_on_commit_immediately():
+            FetchFeedTask().run(self.source.feed_id)
+        self.assertIn("changed title", self.get_titles(1))
+
+    @mock.patch("feeds.parsers.RssAggregator.parse")
+    def test_feed_changes_invalidate_responses(self, mock_parse):
+        url = reverse("feeds-list")
+        response = self.client.get(url)
+        self.assertEqual(self.client.get(url).data, response.data)
+        updated_at = Feed.objects.get(id=self.source.feed_id).updated_at
+
+        # unchanged feed keeps its updated_at
+        mock_parse.return_value = self.parsed_data
+        with run_on_commit_immediately():
+            FetchFeedTask().run(self.source.feed_id)
+        self.assertEqual(Feed.objects.get(id=self.source.feed_id).updated_at, updated_at)
+
+        # changed title of the feed invalidates responses, even though its entries have not changed
+        parsed_data = feedparser.parse(self.fixture_path)
+        parsed_data.feed["title"] = "changed title"
+        mock_parse.return_value = parsed_data
+        with run_on_commit_immediately():
+            FetchFeedTask().run(self.source.feed_id)
+        self.assertEqual(self.client.get(url).data["results"][0]["title"], "changed title")
+        self.assertGreater(Feed.objects.get(id=self.source.feed_id).updated_at, updated_at)
+
+    def test_read_state_invalidates_responses(self):
+        entry_url = reverse("feed-entries-detail", args=[FeedEntry.objects.first().id])
+        self.assertFalse(self.client.get(entry_url).data["read"])
+        with run_on_commit_immediately():
+            self.client.get(reverse("feed-entries-read", args=[FeedEntry.objects.first().id]))
+        self.assertTrue(self.client.get(entry_url).data["read"])
+
+        # other users do not share cached responses
+        self.client.force_authenticate(self.user_second)
+        self.assertEqual(self.client.get(entry_url).status_code, 404)
+
+
+class ConditionalResponseTestCase(APITestCase, BaseTestCase):
+    def setUp(self) -> None:
+        super(ConditionalResponseTestCase, self).setUp()
+        self.client.force_authenticate(self.user)
+        self.source = Source.objects.create(
+            **self.create_source_data(fetch_interval=self.first_interval, url=self.fixture_path, user=self.user)
+        )
+        with run_on_commit_immediately():
+            FetchFeedTask().run(self.source.feed_id)
+
+    def test_list_not_modified(self):
+        for url in [reverse("feeds-list"), reverse("feed-entries-list")]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            etag = response["ETag"]
+            self.assertIn("no-cache", response["Cache-Control"])
+
+            # validated without building the response, nor querying the database
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b"")
+            self.assertEqual(response["ETag"], etag)
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+            self.assertEqual(response.status_code, 304)
+            # validators depend on query parameters
+            self.assertEqual(self.client.get(f"{url}?page_size=1", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # read state changes the entries
+        etag = self.client.get(reverse("feed-entries-list"))["ETag"]
+        with run_on_commit_immediately():
+            self.client.get(reverse("feed-entries-read", args=[FeedEntry.objects.first().id]))
+        response = self.client.get(reverse("feed-entries-list"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_status_not_modified(self):
+        url = reverse("sources-fetch-status", args=[self.source.id])
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Feed.objects.filter(id=self.source.feed_id).update(fetch_status=Feed.FETCH_PENDING)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status_id"], Feed.FETCH_PENDING)
@@ -1,24 +1,46 @@
+import hashlib
+
+from django.db.models import F
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
 from django.urls import reverse
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
+from api.cache import CachedResponseMixin, ConditionalResponseMixin
+from api.filters import FeedEntryFilter, FullTextSearchFilter
+from api.pagination import FeedEntryPagination, FeedPagination, RawEntriesPagination
 from api.permissions import IsOwnerOrReadOnly
-from api.serializers import FeedEntriesSetSerializer, FeedSetSerializer, RawEntriesSetSerializer, SourceSerializer
+from api.renderers import CompactListMixin, CSVRenderer, NDJSONRenderer
+from api.serializers import (
+    FeedEntriesSetSerializer,
+    FeedSetSerializer,
+    MarkEntriesSerializer,
+    SourceSerializer,
+    SourcesImportSerializer,
+)
 
-from .models import Feed, FeedEntry, Source
+from .cache import bump_user_generation
+from .importers import SubscriptionsImport
+from .metrics import render_metrics
+from .models import Feed, FeedEntry, ReadMark, Source
+from .profiling import ProfileStore
 from .tasks import FetchFeedTask
 
 
-class SourceViewSet(viewsets.ModelViewSet):
+class SourceViewSet(ConditionalResponseMixin, viewsets.ModelViewSet):
     """
     Sources of RSS feed. All actions available for logged in users.
     @ExtraActions:
         - status: check status of feed update
-        @status return: {status_id: 1, status_desc: pending, last_update: str(datetime.datetime)}
-        - fetch: fetch feed from the source.url
+        @status return: {status_id: 1, status_desc: pending, last_update: str(datetime.datetime)},
+        answered with 304 Not Modified if the ETag sent in If-None-Match still matches
+        - fetch: fetch feed from the source.url, the feed is shared by all sources with the same url
         @fetch: return: message for human :)
+        - import: subscribe to all feeds of an uploaded OPML or CSV document at once, new feeds are fetched gradually
+        @import return: {created, duplicates, already_subscribed: numbers of urls, invalid: list of urls}
     """
 
     queryset = Source.objects.all()
@@ -28,8 +50,20 @@ class SourceViewSet(viewsets.ModelViewSet):
         "name": ["icontains"],
     }
 
+    @action(detail=False, methods=["post"], name="Import sources", url_path="import", url_name="import")
+    def import_sources(self, request):
+        serializer = SourcesImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        subscriptions_import = SubscriptionsImport(request.user, serializer.validated_data["fetch_interval"])
+        return Response(subscriptions_import.run(serializer.validated_data["file"]), status=status.HTTP_201_CREATED)
+
+    def get_serializer_class(self):
+        if self.action == "import_sources":
+            return SourcesImportSerializer
+        return super().get_serializer_class()
+
     def get_queryset(self):
-        qs = super().get_queryset()
+        qs = super().get_queryset().select_related("feed")
         if self.request and self.request.user:
             return qs.filter(user_id=self.request.user.id)
         return qs.none()
@@ -39,65 +73,123 @@ class SourceViewSet(viewsets.ModelViewSet):
         obj = self.get_object()
         status_url = reverse("sources-fetch-status", args=[obj.id])
         if obj:
-            if obj.fetch_status == obj.FETCH_PENDING:
+            if obj.feed.fetch_status == obj.feed.FETCH_PENDING:
                 return Response(
                     f"Feed update has already been triggered. Try again later. Check status at {status_url}", status=202
                 )
-            elif obj.fetch_status != obj.FETCH_PENDING:
+            elif obj.feed.fetch_status != obj.feed.FETCH_PENDING:
                 task = FetchFeedTask()
-                task.apply_async((obj.id,))
+                task.apply_async((obj.feed_id,))
         return Response(f"Feed update has been triggered. Check status at {status_url}", status=202)
 
     @action(detail=True, methods=["get"], name="Re-fetching status", url_name="fetch-status")
     def status(self, request, pk=None):
-        obj = self.get_object()
-        return Response(
-            {
-                "status_id": obj.fetch_status,
-                "status_desc": obj.get_fetch_status_display(),
-                "last_update": obj.updated_at,
-            }
+        feed = self.get_object().feed
+        etag = hashlib.sha1(
+            f"{feed.id}|{feed.fetch_status}|{feed.updated_at.isoformat()}|{request.accepted_renderer.format}".encode()
+        ).hexdigest()
+        # status changes do not move updated_at, so Last-Modified would not validate the response
+        return self.conditional_response(
+            request,
+            etag,
+            None,
+            lambda: Response(
+                {
+                    "status_id": feed.fetch_status,
+                    "status_desc": feed.get_fetch_status_display(),
+                    "last_update": feed.updated_at,
+                }
+            ),
         )
 
 
-class FeedViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, GenericViewSet):
+class FeedViewSet(
+    CachedResponseMixin, CompactListMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, GenericViewSet
+):
+    """
+    Feeds the user is subscribed to, shared with other subscribers of the same url.
+    List and detail responses are cached until the user's feeds are refreshed.
+    @format compact: list with plain ids instead of hyperlinks, for clients polling many rows
+    """
+
     queryset = Feed.objects.all()
-    permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     serializer_class = FeedSetSerializer
+    pagination_class = FeedPagination
     filterset_fields = {
         "title": ["icontains"],
         "summary": ["icontains"],
     }
+    compact_fields = (
+        ("id", "id"),
+        ("source", "subscription_id"),
+        ("title", "title"),
+        ("link", "link"),
+        ("summary", "summary"),
+        ("tag_line", "tag_line"),
+        ("url", "url"),
+        ("published", "published"),
+    )
 
     @action(detail=True, methods=["get"], name="Feed entries raw data", url_name="entries")
     def entries(self, request, pk=None):
+        """
+        raw entries of the feed, paginated with limit and offset query parameters.
+        Entries are stored as a single compressed document, which is decoded once and cached by its digest,
+        so following pages are sliced from the cached list, see FeedPayload.load_cached.
+        """
         obj = self.get_object()
-        serializer = RawEntriesSetSerializer(data=request.data)
-        if serializer.is_valid():
-            return Response(obj.entries)
-        else:
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        paginator = RawEntriesPagination()
+        page = paginator.paginate_queryset(obj.get_raw_entries(), request, view=self)
+        return paginator.get_paginated_response(page)
 
     def get_queryset(self):
         qs = super().get_queryset()
+        if self.action == "entries":
+            qs = qs.select_related("raw_payload").defer("raw_payload__data")
         if self.request and self.request.user:
-            return qs.filter(source__user_id=self.request.user.id)
+            # filter and annotation share the join, so subscription_id is the one of the user
+            return qs.filter(sources__user_id=self.request.user.id).annotate(subscription_id=F("sources__id"))
         return qs.none()
 
 
-class FeedEntryViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, GenericViewSet):
-    queryset = FeedEntry.objects.all()
-    permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+class FeedEntryViewSet(
+    CachedResponseMixin, CompactListMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, GenericViewSet
+):
+    """
+    Entries of user's feeds, newest first. Read state is kept per source, so each subscriber has their own.
+    List and detail responses are cached until the user's feeds are refreshed or read state changes.
+    @search: full text search in title, summary and author, results are ordered by relevance
+    @format compact: list with plain ids instead of hyperlinks, for clients polling many rows
+    @ExtraActions:
+        - mark: mark entries selected by ids, feed and date, or query parameter filters read or unread at once
+        @mark return: {updated: number of entries which changed their state}
+        - export: stream all entries matching query parameter filters, as newline delimited JSON or ?format=csv
+    """
+
+    # search document is only used for filtering
+    queryset = FeedEntry.objects.defer("search_vector")
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     serializer_class = FeedEntriesSetSerializer
-    filterset_fields = {
-        "feed": ["exact"],
-        "read": ["exact"],
-        "feed__source__name": ["icontains"],
-        "title": ["icontains"],
-        "summary": ["icontains"],
-        "author": ["icontains"],
-    }
+    pagination_class = FeedEntryPagination
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
+    filterset_class = FeedEntryFilter
     ordering_fields = ["id"]
+    # rows fetched from the server side cursor at once by export
+    export_chunk_size = 2000
+    compact_fields = (
+        ("id", "id"),
+        ("feed", "feed_id"),
+        ("read", "read"),
+        ("title", "title"),
+        ("link", "link"),
+        ("summary", "summary"),
+        ("url", "url"),
+        ("published", "published"),
+        ("modified", "modified"),
+        ("author", "author"),
+        ("copyright", "copyright"),
+    )
 
     @action(detail=True, methods=["get"], name="Has been read", url_name="read")
     def read(self, request, pk=None):
@@ -106,8 +198,9 @@ class FeedEntryViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, Generic
         if serializer.is_valid():
             if obj.read:
                 return Response({"message": f"{obj} HAS ALREADY BEEN FLAGGED.", "read": obj.read}, status=202)
+            ReadMark.objects.bulk_create([ReadMark(source_id=obj.subscription_id, entry=obj)], ignore_conflicts=True)
+            bump_user_generation(request.user.id)
             obj.read = True
-            obj.save()
             return Response({"message": f"YOU FLAGGED {obj} as read.", "read": obj.read}, status=202)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -119,14 +212,96 @@ class FeedEntryViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, Generic
         if serializer.is_valid():
             if not obj.read:
                 return Response({"message": f"{obj} HAS ALREADY BEEN FLAGGED.", "read": obj.read}, status=202)
+            ReadMark.objects.filter(source_id=obj.subscription_id, entry=obj).delete()
+            bump_user_generation(request.user.id)
             obj.read = False
-            obj.save()
             return Response({"message": f"{obj} HAS BEEN RESTORED.", "read": obj.read}, status=202)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=["post"], name="Mark entries", url_name="mark")
+    def mark(self, request):
+        """
+        mark many entries read or unread with a single INSERT or DELETE statement of read marks.
+        @return: {"updated": number of entries which changed their state}
+        """
+        serializer = MarkEntriesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        queryset = serializer.filter_queryset(self.filter_queryset(self.get_queryset()))
+        if serializer.validated_data["read"]:
+            updated = ReadMark.mark_read(request.user.id, queryset)
+        else:
+            updated = ReadMark.mark_unread(request.user.id, queryset)
+        return Response({"updated": updated})
+
+    @action(
+        detail=False,
+        methods=["get"],
+        name="Export entries",
+        url_name="export",
+        renderer_classes=[NDJSONRenderer, CSVRenderer],
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def export(self, request):
+        """
+        every entry matching query parameter filters, e.g. feed, published_after and published_before, ordered by id.
+        Rows in the compact format are read from a server side cursor and streamed as they are rendered,
+        so memory use does not grow with the number of entries. Responses are not cached.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).order_by("id")
+        names, lookups = zip(*self.compact_fields)
+        rows = (
+            dict(zip(names, row)) for row in queryset.values_list(*lookups).iterator(chunk_size=self.export_chunk_size)
+        )
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f"{content_type}; charset={renderer.charset}"
+        response = StreamingHttpResponse(renderer.stream(rows, names), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="entries.{renderer.format}"'
+        return response
+
+    def get_serializer_class(self):
+        if self.action == "mark":
+            return MarkEntriesSerializer
+        return super().get_serializer_class()
+
     def get_queryset(self):
         qs = super().get_queryset()
+        if self.action in ["read", "unread"]:
+            # feed title is used by str() of the entry in responses
+            qs = qs.select_related("feed")
         if self.request and self.request.user:
-            return qs.filter(feed__source__user_id=self.request.user.id)
+            # filter and annotation share the join, so subscription_id is the one of the user
+            qs = qs.filter(feed__sources__user_id=self.request.user.id)
+            return qs.annotate(subscription_id=F("feed__sources__id"), read=ReadMark.is_read())
         return qs.none()
+
+
+class ProfileViewSet(viewsets.ViewSet):
+    """
+    Recent profiles of API requests and feed fetches, newest first. Available for staff users only.
+    Each profile lists what was profiled, its wall time, and number of queries and time spent in them.
+    Detail response is the profile itself, a pstats file, e.g. for python -m pstats or snakeviz.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+    lookup_value_regex = r"[^/]+"
+
+    def list(self, request):
+        return Response(ProfileStore().list())
+
+    def retrieve(self, request, pk=None):
+        try:
+            path = ProfileStore().get_path(pk)
+            return FileResponse(open(path, "rb"), as_attachment=True, filename=f"{pk}.prof")
+        except (ValueError, FileNotFoundError):
+            raise Http404
+
+
+def metrics_view(request):
+    """
+    fetch pipeline metrics in Prometheus text format, of all web and worker processes if PROMETHEUS_MULTIPROC_DIR is set
+    """
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)